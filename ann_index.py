@@ -0,0 +1,166 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains IvfIndex, an inverted file (IVF) index used by
+CategoryGraph.most_similar_restaurants for approximate search on large catalogs.
+
+The similarity score between two restaurants has two parts: the distance between their
+(category, price range, review rate) features, and the difference between their distances to
+the user. The second part changes with every user, so it cannot be indexed. The index clusters
+the restaurants on the first part only, with k-means, and keeps the rows of each cluster in an
+inverted list. A query scores only the restaurants in the nprobe lists whose centroids are
+closest to the features of the base restaurant, with the exact score (including the distance
+to the user), and returns the best of them.
+
+The first part alone is a lower bound on the score, so restaurants in far away clusters
+cannot be among the most similar ones; nprobe trades latency for recall. The recall of a
+setting is measured against the exact search by CategoryGraph.measure_ann_recall.
+
+Restaurants added to or changed in the catalog are put in the list of their closest centroid,
+and removed ones are taken out of theirs; the centroids themselves are only trained when the
+index is built.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import math
+
+import numpy as np
+
+from knn_build import BLOCK_SCORES
+
+# The number of k-means iterations used to place the centroids.
+KMEANS_ITERATIONS = 10
+
+# The number of points sampled per centroid to train k-means on.
+TRAINING_POINTS_PER_LIST = 32
+
+
+class IvfIndex:
+    """An inverted file index over points, in lists of the points closest to each centroid.
+
+    Instance Attributes:
+        - centroids: An (m, d) array of the centroid of each list.
+        - order: The indexed rows, sorted by list.
+        - offsets: The rows of list i are order[offsets[i]:offsets[i + 1]].
+
+    Representation Invariants:
+        - len(self.offsets) == self.centroids.shape[0] + 1
+        - len(self.order) == 0 or all(self.offsets[i] < self.offsets[i + 1] for i in range(len(self)))
+        - sorted(self.order.tolist()) == list(range(len(self.order)))
+    """
+    centroids: np.ndarray
+    order: np.ndarray
+    offsets: np.ndarray
+
+    def __init__(self, points: np.ndarray, n_lists: int | None = None, seed: int = 0) -> None:
+        """Initialize an index over the given (n, d) array of points, in n_lists lists, or
+        about the square root of n lists if n_lists is None.
+
+        The centroids are trained with k-means on a random sample of the points.
+
+        Preconditions:
+            - n_lists is None or n_lists >= 1
+        """
+        n = len(points)
+        if n_lists is None:
+            n_lists = max(1, math.isqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        sample = points[rng.choice(n, min(n, TRAINING_POINTS_PER_LIST * n_lists), replace=False)] if n else points
+        centroids = _kmeans(sample, n_lists, rng)
+
+        # Lists left empty (such as those of centroids on the same point) are dropped, so every
+        # list probed has candidates in it.
+        lists = _assign(points, centroids)
+        kept = np.bincount(lists, minlength=len(centroids)) > 0
+        if n:
+            self.centroids = centroids[kept]
+            lists = (np.cumsum(kept) - 1)[lists]
+        else:
+            self.centroids = centroids
+        self.order = np.argsort(lists, kind='stable')
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=len(self.centroids)), out=self.offsets[1:])
+
+    def __len__(self) -> int:
+        """Return the number of lists."""
+        return len(self.centroids)
+
+    def discard(self, rows: list[int]) -> None:
+        """Take the given rows out of their lists. A list left empty is dropped, unless every
+        list is.
+        """
+        lists = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        kept = ~np.isin(self.order, rows)
+        lists, self.order = lists[kept], self.order[kept]
+        counts = np.bincount(lists, minlength=len(self))
+        filled = counts > 0
+        if filled.any() and not filled.all():
+            self.centroids = self.centroids[filled]
+            counts = counts[filled]
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def renumber(self, new_rows: np.ndarray) -> None:
+        """Rename each row i to new_rows[i], after the rows where it is -1 were discarded."""
+        self.order = new_rows[self.order]
+
+    def add(self, rows: list[int], points: np.ndarray) -> None:
+        """Put each of the given rows, whose points are the rows of the given array, in the list
+        of the centroid closest to its point.
+
+        Preconditions:
+            - points.shape == (len(rows), self.centroids.shape[1])
+        """
+        lists = _assign(points, self.centroids)
+        self.order = np.insert(self.order, self.offsets[lists + 1], rows)
+        self.offsets[1:] += np.cumsum(np.bincount(lists, minlength=len(self)))
+
+    def candidates(self, point: np.ndarray, nprobe: int) -> np.ndarray:
+        """Return the rows in the nprobe lists whose centroids are closest to point."""
+        diff = self.centroids - point
+        distances = np.einsum('ij,ij->i', diff, diff)
+        if nprobe < len(distances):
+            probed = np.argpartition(distances, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(len(distances))
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probed.tolist()])
+
+
+def _assign(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the closest centroid to each point, computing the distances in
+    blocks of about BLOCK_SCORES.
+    """
+    lists = np.empty(len(points), dtype=np.intp)
+    squared_norms = np.einsum('ij,ij->i', centroids, centroids)
+    block_size = max(1, BLOCK_SCORES // max(len(centroids), 1))
+    for start in range(0, len(points), block_size):
+        block = points[start:start + block_size]
+        # The squared norm of each point is the same for every centroid, so it is left out.
+        lists[start:start + block_size] = np.argmin(squared_norms[None, :] - 2.0 * (block @ centroids.T), axis=1)
+    return lists
+
+
+def _kmeans(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Return k centroids for the given points, placed by KMEANS_ITERATIONS iterations of
+    Lloyd's algorithm from k distinct random points. A centroid that loses all its points is
+    moved to a random point.
+    """
+    if len(points) == 0:
+        return np.zeros((1, points.shape[1]))
+    centroids = points[rng.choice(len(points), k, replace=False)].astype(np.float64)
+    for _ in range(KMEANS_ITERATIONS):
+        lists = _assign(points, centroids)
+        counts = np.bincount(lists, minlength=k)
+        sums = np.stack([np.bincount(lists, points[:, i], k) for i in range(points.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        centroids[empty] = points[rng.choice(len(points), len(empty))]
+    return centroids
@@ -0,0 +1,71 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module measures how many bytes each restaurant costs in memory, for the
+object-per-vertex CategoryGraph and for the column-based CompactCategoryGraph.
+
+Run it from the project directory:
+
+    python bench_memory.py [restaurant CSV file] [k]
+
+If k is given, k-nearest-neighbour edges are built as well, so the cost of edges is included.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import gc
+import sys
+import tracemalloc
+from typing import Callable
+
+from compact_graph import CompactCategoryGraph
+from recommender_4d_ver import CategoryGraph, load_graph
+
+
+def bytes_per_restaurant(build: Callable[[], CategoryGraph]) -> float:
+    """Return the memory still allocated after build() returns, divided by the number of
+    restaurants in the graph it returns.
+
+    Memory freed during the build (such as parsed CSV rows) is not counted.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    graph = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(graph.get_all_vertices())
+
+
+def build_object_graph(rest_file: str, k: int) -> CategoryGraph:
+    """Return the object-per-vertex graph of the given file, with its feature table built."""
+    graph = load_graph(rest_file)
+    if k > 0:
+        graph.build_knn_edges(k)
+    graph.get_table()
+    return graph
+
+
+def build_compact_graph(rest_file: str, k: int) -> CompactCategoryGraph:
+    """Return the compact graph of the given file."""
+    graph = CompactCategoryGraph.from_graph(load_graph(rest_file))
+    if k > 0:
+        graph.build_knn_edges(k)
+    return graph
+
+
+if __name__ == '__main__':
+    file_name = sys.argv[1] if len(sys.argv) > 1 else 'filtered_restaurant_dt_4d.csv'
+    knn = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    object_bytes = bytes_per_restaurant(lambda: build_object_graph(file_name, knn))
+    compact_bytes = bytes_per_restaurant(lambda: build_compact_graph(file_name, knn))
+    print(f'CategoryGraph:        {object_bytes:8.1f} bytes per restaurant')
+    print(f'CompactCategoryGraph: {compact_bytes:8.1f} bytes per restaurant')
+    print(f'Ratio:                {object_bytes / compact_bytes:8.2f}x')
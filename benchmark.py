@@ -0,0 +1,276 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module benchmarks the hot paths of FOODER: loading the graph, finding similar
+restaurants, recommending restaurants, picking random restaurants and recording feedback.
+
+Each dataset is the bundled CSV file or a synthetic one (see synthetic_data.py). For each
+dataset, the benchmark records how long load_graph takes, the peak memory used while loading
+it, the latency distribution of every query, and the recall and latency of approximate search
+against exact search. Queries are timed with the memo of most_similar_restaurants turned off,
+so each one does its full work; the memoized latency and the hit rate of the memo are reported
+separately, under most_similar_restaurants_memoized and similar_memo. The results are printed (or written) as
+JSON, so that runs on different commits can be compared:
+
+    python benchmark.py --sizes 10000 100000 --output before.json
+    ... change the code ...
+    python benchmark.py --sizes 10000 100000 --output after.json --compare before.json
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import numpy as np
+
+import synthetic_data
+from recommender_4d_ver import ANN_NPROBE, SIMILAR_MEMO_SIZE, CategoryGraph, User, load_graph
+
+DEFAULT_CSV = 'filtered_restaurant_dt_4d.csv'
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# The number of restaurants each warm user has liked.
+HISTORY_LENGTH = 100
+
+
+def latency_stats(seconds: list[float]) -> dict[str, float]:
+    """Return the summary statistics, in milliseconds, of the given latencies in seconds.
+
+    Preconditions:
+        - seconds != []
+    """
+    ms = np.array(seconds) * 1000
+    return {'count': len(seconds),
+            'mean_ms': float(ms.mean()),
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'max_ms': float(ms.max())}
+
+
+def time_calls(function: Callable[..., Any], arguments: list[tuple]) -> dict[str, float]:
+    """Call function once with each tuple of arguments and return the latency statistics."""
+    latencies = []
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies)
+
+
+def peak_load_memory(rest_file: str) -> float:
+    """Return the peak memory, in megabytes, allocated while loading the given file into a
+    graph and building its feature table.
+    """
+    gc.collect()
+    tracemalloc.start()
+    graph = load_graph(rest_file)
+    graph.get_table()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del graph
+    return peak / 2 ** 20
+
+
+def make_users(graph: CategoryGraph, count: int, rng: random.Random, warm: bool) -> list[User]:
+    """Return count users. Warm users have liked HISTORY_LENGTH restaurants, the last of which
+    they visited last; cold users have not, but dislike a few restaurants.
+    """
+    restaurants = graph.get_all_restaurants()
+    users = []
+    for i in range(count):
+        user = User(f'benchmark-user-{i}')
+        if warm:
+            for restaurant in rng.sample(restaurants, min(HISTORY_LENGTH, len(restaurants))):
+                user.like(restaurant)
+        else:
+            user.disliked_restaurants.update(rng.sample(restaurants, min(3, len(restaurants))))
+        users.append(user)
+    return users
+
+
+def time_diverse(graph: CategoryGraph, calls: list[tuple]) -> dict[str, float]:
+    """Return the latency statistics of most_similar_restaurants with the given arguments,
+    re-ranking for diversity.
+    """
+    graph.configure_diversity()
+    try:
+        return time_calls(graph.most_similar_restaurants, calls)
+    finally:
+        graph.configure_diversity(0)
+
+
+def time_memoized(graph: CategoryGraph, calls: list[tuple]) -> tuple[dict[str, float], dict[str, float]]:
+    """Return the latency statistics of most_similar_restaurants with the given arguments,
+    each asked twice with a fresh memo of SIMILAR_MEMO_SIZE results, and the statistics of the
+    memo afterwards. The memo is turned off again before returning.
+    """
+    graph.configure_similarity_memo(SIMILAR_MEMO_SIZE)
+    try:
+        return time_calls(graph.most_similar_restaurants, calls + calls), graph.similarity_memo_stats()
+    finally:
+        graph.configure_similarity_memo(0)
+
+
+def benchmark_graph(graph: CategoryGraph, queries: int, seed: int) -> dict[str, dict[str, float]]:
+    """Return the latency statistics of each query on the given graph, running each one the
+    given number of times with random restaurants and user locations, and the statistics of
+    the memo of most_similar_restaurants under similar_memo.
+
+    The memo of most_similar_restaurants is turned off, so that no query reuses the results of
+    an earlier one, except for most_similar_restaurants_memoized, which is timed with it on.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)
+    names = [v.name for v in graph.get_all_restaurants()]
+    # Users stand near a random restaurant, as they would when using FOODER.
+    locations = [(lat + rng.gauss(0.0, 0.01), lon + rng.gauss(0.0, 0.01))
+                 for lat, lon in (graph.get_vertex(rng.choice(names)).location for _ in range(queries))]
+    bases = [rng.choice(names) for _ in range(queries)]
+    warm = make_users(graph, queries, rng, warm=True)
+    cold = make_users(graph, queries, rng, warm=False)
+    graph.configure_similarity_memo(0)
+    memoized, memo_stats = time_memoized(graph, list(zip(bases, locations)))
+
+    return {
+        'most_similar_restaurants': time_calls(graph.most_similar_restaurants, list(zip(bases, locations))),
+        'most_similar_restaurants_memoized': memoized,
+        'similar_memo': memo_stats,
+        'get_sim_rest': time_calls(graph.get_sim_rest, list(zip(bases, locations))),
+        'recommend_restaurants_warm': time_calls(lambda u, ip: u.recommend_restaurants(graph, ip),
+                                                 list(zip(warm, locations))),
+        'recommend_restaurants_cold': time_calls(lambda u, ip: u.recommend_restaurants(graph, ip),
+                                                 list(zip(cold, locations))),
+        'recommend_from_history_mean': time_calls(lambda u, ip: u.recommend_from_history(graph, ip),
+                                                  list(zip(warm, locations))),
+        'recommend_from_history_max': time_calls(lambda u, ip: u.recommend_from_history(graph, ip, aggregate='max'),
+                                                 list(zip(warm, locations))),
+        'most_similar_restaurants_diverse': time_diverse(graph, list(zip(bases, locations))),
+        'get_random_restaurant': time_calls(graph.get_random_restaurant, [()] * queries),
+        'record_feedback': time_calls(graph.record_feedback,
+                                      [(name, rng.choice(['yes', 'no']), user.name)
+                                       for name, user in zip(bases, warm)])
+    }
+
+
+def benchmark_dataset(rest_file: str, queries: int, seed: int, memory: bool) -> dict[str, Any]:
+    """Return the benchmark results for the given restaurant CSV file."""
+    gc.collect()
+    start = time.perf_counter()
+    graph = load_graph(rest_file)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.get_table()
+    table_seconds = time.perf_counter() - start
+
+    result = {'file': os.path.basename(rest_file),
+              'restaurants': len(graph.get_all_restaurants()),
+              'load_graph_seconds': load_seconds,
+              'table_build_seconds': table_seconds,
+              'queries': benchmark_graph(graph, queries, seed)}
+    graph.configure_approximate_search(ANN_NPROBE)
+    result['approximate_search'] = graph.measure_ann_recall(queries, seed=seed)
+    del graph
+    if memory:
+        result['peak_load_memory_mb'] = peak_load_memory(rest_file)
+    return result
+
+
+def git_revision() -> str:
+    """Return the current git commit of the project, or '' if it is not known."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_benchmarks(rest_file: str, sizes: list[int], queries: int, seed: int, memory: bool = True,
+                   data_dir: str | None = None) -> dict[str, Any]:
+    """Return the benchmark results for rest_file and for synthetic datasets of the given sizes.
+
+    The synthetic datasets are written to data_dir, where they are reused by later runs with
+    the same seed, or to a temporary directory if data_dir is None.
+    """
+    results = {'meta': {'revision': git_revision(),
+                        'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'machine': platform.machine(),
+                        'cpus': os.cpu_count(),
+                        'timestamp': time.time(),
+                        'queries': queries,
+                        'seed': seed},
+               'datasets': {'csv': benchmark_dataset(rest_file, queries, seed, memory)}}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = data_dir if data_dir is not None else temp_dir
+        for size in sizes:
+            path = os.path.join(directory, f'synthetic_{size}_{seed}.csv')
+            if not os.path.exists(path):
+                synthetic_data.write_synthetic_csv(rest_file, path, size, seed)
+            results['datasets'][str(size)] = benchmark_dataset(path, queries, seed, memory)
+    return results
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    """Return one line per measurement in both results, giving the ratio of the current value
+    to the baseline value (above 1 means slower or larger).
+    """
+    lines = []
+    for label, dataset in current['datasets'].items():
+        old = baseline['datasets'].get(label)
+        if old is None:
+            continue
+        pairs = [(key, dataset[key], old[key]) for key in
+                 ('load_graph_seconds', 'table_build_seconds', 'peak_load_memory_mb') if key in dataset and key in old]
+        pairs.extend((f'{query} p50', stats['p50_ms'], old['queries'][query]['p50_ms'])
+                     for query, stats in dataset['queries'].items() if 'p50_ms' in stats and query in old['queries'])
+        for key, new_value, old_value in pairs:
+            ratio = new_value / old_value if old_value else float('inf')
+            lines.append(f'{label:>8} {key:<32} {old_value:12.4f} -> {new_value:12.4f}  ({ratio:.2f}x)')
+    return lines
+
+
+def main() -> None:
+    """Run the benchmarks with the command-line options and report the results."""
+    parser = argparse.ArgumentParser(description='Benchmark the FOODER hot paths.')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='the restaurant CSV file')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES,
+                        help='the sizes of the synthetic datasets')
+    parser.add_argument('--queries', type=int, default=200, help='the number of times each query is run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    parser.add_argument('--data-dir', help='where to keep the synthetic datasets between runs')
+    parser.add_argument('--output', help='write the JSON results to this file instead of printing them')
+    parser.add_argument('--compare', help='a JSON results file to compare these results with')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.csv, args.sizes, args.queries, args.seed, not args.no_memory, args.data_dir)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as file:
+            print('\n'.join(compare(results, json.load(file))))
+
+
+if __name__ == '__main__':
+    main()
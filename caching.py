@@ -0,0 +1,113 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains LRUCache, a dictionary with a maximum size that forgets its
+least recently used entry when it is full, and counts its hits and misses. It is safe to
+share between threads.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+import threading
+from typing import Any, Hashable
+
+from instrumentation import METRICS
+
+
+class LRUCache:
+    """A size-bounded cache that evicts its least recently used entry.
+
+    Instance Attributes:
+        - capacity: The maximum number of entries in the cache.
+        - name: The name the cache's hits and misses are counted under in instrumentation.METRICS.
+        - hits: The number of calls to get that found their key.
+        - misses: The number of calls to get that did not find their key.
+
+    Representation Invariants:
+        - self.capacity >= 1
+        - len(self) <= self.capacity
+    """
+    capacity: int
+    name: str
+    hits: int
+    misses: int
+    # Private Instance Attributes:
+    #     - _entries: The entries of the cache, from the least to the most recently used.
+    #     - _lock: Guards _entries and the hit and miss counts.
+    _entries: OrderedDict[Hashable, Any]
+    _lock: threading.Lock
+
+    def __init__(self, capacity: int, name: str = 'cache') -> None:
+        """Initialize an empty cache holding at most capacity entries, with the given name.
+
+        Preconditions:
+            - capacity >= 1
+        """
+        self.capacity = capacity
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of entries in the cache."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether key is in the cache. This does not count as a use of the key."""
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value of key and mark it as the most recently used, or return default if
+        key is not in the cache.
+        """
+        with self._lock:
+            found = key in self._entries
+            if found:
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+                self.hits += 1
+            else:
+                value = default
+                self.misses += 1
+        METRICS.count('fooder_cache_hits_total' if found else 'fooder_cache_misses_total', cache=self.name)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value under key as the most recently used entry, evicting the least recently
+        used entry if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key from the cache and return its value, or return default if it is absent."""
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """Return a list of the entries of the cache, from the least to the most recently used.
+        This does not count as a use of the keys.
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self) -> None:
+        """Remove every entry from the cache. The hit and miss counts are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        """Return the fraction of calls to get that found their key, or 0.0 if there were none."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,486 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains CompactCategoryGraph, a CategoryGraph that stores its
+restaurants as typed columns (a struct of arrays) instead of one Python object per
+restaurant. A restaurant is just a row number: its features live in the graph's
+RestaurantTable, its address in one array of UTF-8 bytes, and its edges in compressed
+sparse row (CSR) arrays.
+
+Vertices are only created on demand, as lightweight views of one row, so get_vertex,
+get_all_restaurants and the rest of the CategoryGraph interface keep working.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections.abc import Iterator, Mapping
+import copy
+from typing import Any
+
+import numpy as np
+
+import ingest
+import snapshot
+from instrumentation import METRICS
+from knn_build import KnnBuildReport, compute_knn
+from recommender_4d_ver import CategoryGraph, _CategoryVertex
+from restaurant_table import RestaurantTable
+
+
+class _RestaurantView(_CategoryVertex):
+    """A vertex that reads the row of one restaurant of a CompactCategoryGraph.
+
+    A view follows its restaurant by name, so it stays valid when removing other restaurants
+    moves the restaurant's row. Two views are equal if and only if they are views of the same
+    restaurant of the same graph, so views can be stored in sets (such as
+    User.disliked_restaurants) like vertices.
+    """
+    __slots__ = ('_graph', '_name')
+    _graph: CompactCategoryGraph
+    _name: Any
+
+    def __init__(self, graph: CompactCategoryGraph, row: int) -> None:
+        """Initialize a view of the restaurant in the given row of the given graph."""
+        # The attribute slots inherited from _CategoryVertex are deliberately left unset:
+        # every attribute is read from the graph's columns instead.
+        self._graph = graph
+        self._name = graph.get_table().names[row]
+
+    def __eq__(self, other: Any) -> bool:
+        """Return whether other is a view of the same restaurant of the same graph."""
+        return isinstance(other, _RestaurantView) and self._graph is other._graph and self._name == other._name
+
+    def __hash__(self) -> int:
+        """Return a hash of the graph and restaurant of this view."""
+        return hash((id(self._graph), self._name))
+
+    @property
+    def _row(self) -> int:
+        """The current row of the restaurant."""
+        return self._graph.get_table().rows[self._name]
+
+    @property
+    def name(self) -> Any:
+        """The name of the restaurant."""
+        return self._name
+
+    @property
+    def category(self) -> int:
+        """The category of the restaurant."""
+        return int(self._graph.get_table().features[self._row, 0])
+
+    @property
+    def price_range(self) -> int:
+        """The price range of the restaurant."""
+        return int(self._graph.get_table().features[self._row, 1])
+
+    @property
+    def review_rate(self) -> float:
+        """The base review rate of the restaurant."""
+        return float(self._graph.get_table().base_review_rates[self._row])
+
+    @property
+    def location(self) -> tuple[float, float]:
+        """The (latitude, longitude) of the restaurant."""
+        lat, lon = self._graph.get_table().locations[self._row].tolist()
+        return lat, lon
+
+    @property
+    def address(self) -> str:
+        """The address of the restaurant."""
+        return self._graph.get_address(self._row)
+
+    @property
+    def neighbours(self) -> dict[_CategoryVertex, float]:
+        """A new dictionary mapping each neighbour of the restaurant to the edge's weight."""
+        return {self._graph.view(row): weight for row, weight in self._graph.edges_of(self._row).items()}
+
+
+class _VertexViews(Mapping):
+    """A read-only mapping from restaurant name to a view of its row, used in place of the
+    _vertices dictionary of a CategoryGraph.
+    """
+    # Private Instance Attributes:
+    #     - _graph: The graph whose rows are viewed.
+    _graph: CompactCategoryGraph
+
+    def __init__(self, graph: CompactCategoryGraph) -> None:
+        """Initialize the mapping of the given graph."""
+        self._graph = graph
+
+    def __getitem__(self, name: Any) -> _RestaurantView:
+        """Return a view of the row of the given restaurant."""
+        return self._graph.view(self._graph.get_table().rows[name])
+
+    def __contains__(self, name: Any) -> bool:
+        """Return whether the graph has a restaurant with the given name."""
+        return name in self._graph.get_table().rows
+
+    def __iter__(self) -> Iterator[Any]:
+        """Return an iterator over the restaurant names, in row order."""
+        return iter(self._graph.get_table().names)
+
+    def __len__(self) -> int:
+        """Return the number of restaurants."""
+        return len(self._graph.get_table())
+
+
+class CompactCategoryGraph(CategoryGraph):
+    """A CategoryGraph whose restaurants are stored as columns rather than vertex objects.
+
+    Edges built in bulk (by build_knn_edges or a snapshot) are kept in CSR arrays. Edges added
+    one at a time by add_edge are kept in a small dictionary on top of them.
+    """
+    # Private Instance Attributes:
+    #     - _address_bytes, _address_offsets:
+    #         The addresses of the restaurants, encoded by snapshot.encode_strings.
+    #     - _edge_indptr, _edge_indices, _edge_weights:
+    #         The bulk edges in CSR form: the neighbours of row i are
+    #         _edge_indices[_edge_indptr[i]:_edge_indptr[i + 1]].
+    #     - _extra_edges:
+    #         Maps a row to the {neighbour row: weight} of the edges added by add_edge. A weight
+    #         of None marks a bulk edge removed by remove_edge.
+    _address_bytes: np.ndarray
+    _address_offsets: np.ndarray
+    _edge_indptr: np.ndarray
+    _edge_indices: np.ndarray
+    _edge_weights: np.ndarray
+    _extra_edges: dict[int, dict[int, float | None]]
+
+    def __init__(self, table: RestaurantTable | None = None, addresses: list[str] | None = None) -> None:
+        """Initialize a graph with the restaurants in the given table and no edges.
+
+        Preconditions:
+            - (table is None) == (addresses is None)
+            - table is None or len(addresses) == len(table)
+        """
+        CategoryGraph.__init__(self)
+        if table is None:
+            table = RestaurantTable([])
+            addresses = []
+        self._table = table
+        self._vertices = _VertexViews(self)
+        self._address_bytes, self._address_offsets = snapshot.encode_strings(addresses)
+        self._set_edges(np.zeros(len(table) + 1, dtype=np.int64), np.empty(0, dtype=np.int64),
+                        np.empty(0, dtype=np.float64))
+
+    @staticmethod
+    def from_graph(graph: CategoryGraph) -> CompactCategoryGraph:
+        """Return a compact copy of the given graph, including its edges and feedback."""
+        table = graph.get_table()
+        compact = CompactCategoryGraph(
+            RestaurantTable.from_columns(list(table.names), table.features.copy(), table.locations.copy(),
+                                         table.base_review_rates.copy()),
+            [graph.get_vertex(name).address for name in table.names])
+        edges = graph._edge_columns()
+        compact._set_edges(edges['edge_indptr'], edges['edge_indices'], edges['edge_weights'])
+        compact._knn_k = graph.get_knn_k()
+        if table.knn_radii is not None:
+            compact._table.knn_radii = table.knn_radii.copy()
+        compact._feedback = copy.deepcopy(graph._feedback)
+        return compact
+
+    @staticmethod
+    def load_snapshot(path: str, source_hash: str | None = None) -> CompactCategoryGraph | None:
+        """Return the graph saved as a snapshot at path, keeping its columns memory-mapped.
+
+        Return None if there is no usable snapshot at path, or if source_hash is not None and
+        the snapshot was saved from a different CSV file.
+        """
+        meta = snapshot.read_meta(path)
+        if meta is None or (source_hash is not None and meta['source_hash'] != source_hash):
+            return None
+        columns = snapshot.read_columns(path, meta)
+        names = snapshot.decode_strings(columns['name_bytes'], columns['name_offsets'])
+        compact = CompactCategoryGraph()
+        compact._table = RestaurantTable.from_columns(names, columns['features'], columns['locations'])
+        compact._address_bytes = columns['address_bytes']
+        compact._address_offsets = columns['address_offsets']
+        compact._set_edges(columns['edge_indptr'], columns['edge_indices'], columns['edge_weights'])
+        compact._knn_k = meta['knn']
+        return compact
+
+    def _set_edges(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> None:
+        """Replace every edge of this graph with the given CSR arrays."""
+        self._edge_indptr = indptr
+        self._edge_indices = indices
+        self._edge_weights = weights
+        self._extra_edges = {}
+
+    def _clear_derived(self) -> None:
+        """Discard the structures derived from the columns. The table is the storage of this
+        graph, so it is never discarded.
+        """
+        with self._lock:
+            self._grid = None
+            self._rating_tree = None
+            self._filter_index = None
+            self._leaderboards = None
+            self._ann_index = None
+            self._walk_graph = None
+            self._walk_dirty.clear()
+            self._refresh_shards()
+            self._clear_results()
+
+    def get_table(self) -> RestaurantTable:
+        """Return the columns of this graph."""
+        return self._table
+
+    def view(self, row: int) -> _RestaurantView:
+        """Return a vertex view of the given row."""
+        return _RestaurantView(self, row)
+
+    def get_address(self, row: int) -> str:
+        """Return the address of the restaurant in the given row."""
+        start, end = int(self._address_offsets[row]), int(self._address_offsets[row + 1])
+        return self._address_bytes[start:end].tobytes().decode('utf-8')
+
+    def edges_of(self, row: int) -> dict[int, float]:
+        """Return a dictionary mapping each neighbour row of the given row to the edge's weight."""
+        start, end = int(self._edge_indptr[row]), int(self._edge_indptr[row + 1])
+        edges = dict(zip(self._edge_indices[start:end].tolist(), self._edge_weights[start:end].tolist()))
+        if row in self._extra_edges:
+            edges.update(self._extra_edges[row])
+            return {other: weight for other, weight in edges.items() if weight is not None}
+        return edges
+
+    def add_vertex(self, category: int, address: str, name: str, price_range: int,
+                   review_rate: float, location: tuple[float, float]) -> None:
+        """Add a row with the given attributes to this graph.
+
+        Do nothing if the given restaurant is already in this graph.
+        """
+        if name not in self._table.rows:
+            self._upsert_rows([(category, address, name, price_range, review_rate, location)])
+            self._clear_derived()
+
+    def add_whole_vertex(self, item: _CategoryVertex) -> None:
+        """Add a row with the attributes of the given vertex to this graph. The vertex's edges
+        are not copied.
+
+        Do nothing if the given restaurant is already in this graph.
+        """
+        self.add_vertex(item.category, item.address, item.name, item.price_range, item.review_rate,
+                        item.location)
+
+    def _remove_rows(self, names: list[Any]) -> np.ndarray | None:
+        """Remove the rows of the given restaurants, which have no edges, from every column of
+        this graph and the structures built from them, and return an array mapping each old row
+        to its new row (or -1 for a removed row), or None if nothing was removed. The other
+        rows keep their order.
+        """
+        if not names:
+            return None
+        table = self._table
+        removed = np.array([table.rows[name] for name in names], dtype=np.intp)
+        self._discard_rows(removed.tolist())
+        keep = np.ones(len(table), dtype=bool)
+        keep[removed] = False
+
+        lengths = np.diff(self._address_offsets)
+        self._address_bytes = self._address_bytes[np.repeat(keep, lengths)]
+        self._address_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=self._address_offsets[1:])
+
+        new_rows = table.delete_rows(removed)
+        sources = np.repeat(np.arange(len(keep)), np.diff(self._edge_indptr))
+        kept = (new_rows[sources] >= 0) & (new_rows[self._edge_indices] >= 0)
+        indptr = np.zeros(len(table) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(new_rows[sources[kept]], minlength=len(table)), out=indptr[1:])
+        extra_edges = {int(new_rows[row]): {int(new_rows[other]): weight for other, weight in edges.items()
+                                            if new_rows[other] >= 0}
+                       for row, edges in self._extra_edges.items() if new_rows[row] >= 0}
+        self._set_edges(indptr, new_rows[self._edge_indices[kept]].astype(np.int64), self._edge_weights[kept])
+        self._extra_edges = extra_edges
+        self._grid = None
+        self._renumber_rows(new_rows)
+        return new_rows
+
+    def _upsert_rows(self, upserts: list[tuple]) -> None:
+        """Add or update the given restaurants (tuples of the arguments of add_vertex) in every
+        column of this graph and the structures built from them. An updated restaurant keeps its
+        row, and new rows are appended.
+        """
+        table, grid = self._table, self._grid
+        added = []
+        updated = []
+        changed_addresses = {}
+        for category, address, name, price_range, review_rate, location in upserts:
+            row = table.rows.get(name)
+            if row is None:
+                added.append((category, address, name, price_range, review_rate, location))
+                continue
+            self._discard_rows([row])
+            updated.append(row)
+            if grid is not None:
+                lat, lon = table.locations[row].tolist()
+                grid.discard(row, (lat, lon))
+                grid.add(row, location)
+            table.update_row(row, np.array([float(category), float(price_range), float(review_rate)]), location)
+            table.set_review_rate(name, self._feedback.global_rating(name, float(review_rate)))
+            if self.get_address(row) != address:
+                changed_addresses[row] = address
+        if changed_addresses:
+            self._replace_addresses(changed_addresses)
+
+        first = len(table)
+        if added:
+            table.append_rows([change[2] for change in added],
+                              np.array([(float(change[0]), float(change[3]), float(change[4])) for change in added],
+                                       dtype=np.float64),
+                              np.array([change[5] for change in added], dtype=np.float64))
+            encoded = [change[1].encode('utf-8') for change in added]
+            lengths = np.cumsum([len(address) for address in encoded])
+            self._address_bytes = np.concatenate([self._address_bytes,
+                                                  np.frombuffer(b''.join(encoded), dtype=np.uint8)])
+            self._address_offsets = np.concatenate([self._address_offsets, self._address_offsets[-1] + lengths])
+            self._edge_indptr = np.concatenate([self._edge_indptr,
+                                                np.full(len(added), self._edge_indptr[-1], dtype=np.int64)])
+            for change in added:
+                row = table.rows[change[2]]
+                table.set_review_rate(change[2], self._feedback.global_rating(change[2], float(change[4])))
+                if grid is not None:
+                    grid.add(row, change[5])
+        if grid is not None:
+            grid.locations = table.locations
+        self._add_rows(updated + list(range(first, len(table))))
+
+    def _replace_addresses(self, addresses: dict[int, str]) -> None:
+        """Replace the address of each row in addresses with the address it maps to."""
+        rows = np.fromiter(addresses, dtype=np.intp, count=len(addresses))
+        encoded = [address.encode('utf-8') for address in addresses.values()]
+        lengths = np.diff(self._address_offsets)
+        new_lengths = lengths.copy()
+        new_lengths[rows] = [len(address) for address in encoded]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(new_lengths, out=offsets[1:])
+
+        unchanged = np.ones(len(lengths), dtype=bool)
+        unchanged[rows] = False
+        address_bytes = np.empty(int(offsets[-1]), dtype=np.uint8)
+        address_bytes[np.repeat(unchanged, new_lengths)] = self._address_bytes[np.repeat(unchanged, lengths)]
+        for row, address in zip(rows.tolist(), encoded):
+            address_bytes[offsets[row]:offsets[row + 1]] = np.frombuffer(address, dtype=np.uint8)
+        self._address_bytes, self._address_offsets = address_bytes, offsets
+
+    def add_edge(self, name1: Any, name2: Any, similarity_score: float = 1.0) -> None:
+        """Add an edge between the two restaurants with the given names, with the given
+        similarity score.
+
+        Raise a ValueError if name1 or name2 do not appear as vertices in this graph.
+
+        Preconditions:
+            - name1 != name2
+        """
+        rows = self._table.rows
+        if name1 in rows and name2 in rows:
+            row1, row2 = rows[name1], rows[name2]
+            if METRICS.enabled and row2 not in self.edges_of(row1):
+                METRICS.count('fooder_edges_added_total')
+            self._extra_edges.setdefault(row1, {})[row2] = similarity_score
+            self._extra_edges.setdefault(row2, {})[row1] = similarity_score
+            if self._walk_graph is not None:
+                self._walk_dirty.update((name1, name2))
+        else:
+            raise ValueError
+
+    def remove_edge(self, name1: Any, name2: Any) -> None:
+        """Remove the edge between the two restaurants with the given names, if there is one.
+
+        Raise a ValueError if name1 or name2 do not appear as vertices in this graph.
+        """
+        rows = self._table.rows
+        if name1 not in rows or name2 not in rows:
+            raise ValueError
+        row1, row2 = rows[name1], rows[name2]
+        for row, other in ((row1, row2), (row2, row1)):
+            extra = self._extra_edges.setdefault(row, {})
+            start, end = int(self._edge_indptr[row]), int(self._edge_indptr[row + 1])
+            if other in self._edge_indices[start:end]:
+                extra[other] = None
+            else:
+                extra.pop(other, None)
+        if self._walk_graph is not None:
+            self._walk_dirty.update((name1, name2))
+
+    def build_knn_edges(self, k: int = 10, processes: int = 1) -> KnnBuildReport:
+        """Replace the edges of this graph with an edge from every restaurant to each of its k
+        most similar restaurants (see CategoryGraph.build_knn_edges), stored directly in CSR
+        arrays, and return a report of the time and memory the build took.
+
+        Preconditions:
+            - 0 < k < len(self.get_all_restaurants())
+            - processes >= 1
+        """
+        with self._lock:
+            neighbours, distances, report = compute_knn(self._table.base_features(), k, processes)
+            n = len(self._table)
+            # Make the edges undirected, then drop the duplicates of mutual neighbours.
+            sources = np.concatenate([np.repeat(np.arange(n), k), neighbours.ravel()])
+            targets = np.concatenate([neighbours.ravel(), np.repeat(np.arange(n), k)])
+            weights = np.concatenate([distances.ravel(), distances.ravel()])
+            _, first = np.unique(sources * n + targets, return_index=True)
+            sources, targets, weights = sources[first], targets[first], weights[first]
+
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+            self._set_edges(indptr, targets.astype(np.int64), weights)
+            self._walk_graph = None
+            self._walk_dirty.clear()
+            self._knn_k = k
+            self._table.knn_radii = distances[:, -1].copy()
+            report.edges = len(targets) // 2
+            METRICS.count('fooder_edges_added_total', report.edges)
+            self._knn_report = report
+            return report
+
+    def _row_edges(self, row: int) -> tuple[list[int], list[float]]:
+        """Return the neighbour rows of the given row, and the weights of its edges to them."""
+        edges = self.edges_of(row)
+        return list(edges), list(edges.values())
+
+    def _address_columns(self) -> dict[str, np.ndarray]:
+        """Return the address columns of this graph."""
+        return {'address_bytes': self._address_bytes, 'address_offsets': self._address_offsets}
+
+    def _edge_columns(self) -> dict[str, np.ndarray]:
+        """Return the edges of this graph, including the ones added by add_edge, in CSR form."""
+        if not self._extra_edges:
+            return {'edge_indptr': self._edge_indptr, 'edge_indices': self._edge_indices,
+                    'edge_weights': self._edge_weights}
+        rows = [self.edges_of(row) for row in range(len(self._table))]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in rows], out=indptr[1:])
+        indices = np.array([other for edges in rows for other in edges], dtype=np.int64)
+        weights = np.array([w for edges in rows for w in edges.values()], dtype=np.float64)
+        return {'edge_indptr': indptr, 'edge_indices': indices, 'edge_weights': weights}
+
+
+def load_compact_graph(rest_file: Any, knn: int = 0, processes: int = 1,
+                       snapshot_path: str | None = None) -> CompactCategoryGraph:
+    """Return a compact restaurant graph corresponding to the given dataset.
+
+    The arguments mean the same as for load_graph. No vertex objects are created: the CSV file
+    is parsed straight into columns, and when a valid snapshot exists, its columns are
+    memory-mapped directly.
+    """
+    if snapshot_path is not None:
+        source_hash = snapshot.file_hash(rest_file)
+        graph = CompactCategoryGraph.load_snapshot(snapshot_path, source_hash)
+        if graph is not None and graph.get_knn_k() == knn:
+            return graph
+        graph = load_compact_graph(rest_file, knn, processes)
+        graph.save_snapshot(snapshot_path, source_hash)
+        return graph
+
+    columns = ingest.read_restaurants(rest_file, processes=processes)
+    graph = CompactCategoryGraph(RestaurantTable.from_columns(columns.names, columns.features(), columns.locations),
+                                 columns.addresses)
+    if knn > 0:
+        graph.build_knn_edges(knn, processes)
+    return graph
@@ -0,0 +1,56 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module re-ranks results by maximal marginal relevance (MMR), so that a list of
+similar restaurants is not filled with near-duplicates of each other (branches of the same
+chain, or restaurants on the same block with the same category and price range).
+
+The results are chosen one at a time from a larger pool of candidates. Each time, the
+candidate chosen is the one with the best trade-off between its relevance (its similarity
+score with the base restaurant) and its novelty (its similarity score with the most similar
+result already chosen). Every pairwise score of the pool is computed at once beforehand, so
+each choice is a few array operations over the pool.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+def mmr_order(relevance: np.ndarray, pairwise: np.ndarray, k: int, trade_off: float) -> np.ndarray:
+    """Return the indices of k of the candidates (or all of them, if there are fewer), in the
+    order maximal marginal relevance chooses them.
+
+    relevance[i] is the similarity score of candidate i with the base restaurant, and
+    pairwise[i, j] the similarity score between candidates i and j; both are distances, so
+    lower is more similar. The candidate chosen next is the one with the lowest
+        trade_off * relevance[i] - (1 - trade_off) * min(pairwise[i, j] for each chosen j),
+    so a trade_off of 1 keeps the order of relevance, and lower ones favour candidates unlike
+    the ones already chosen. Ties are broken by index.
+
+    Preconditions:
+        - pairwise.shape == (len(relevance), len(relevance))
+        - 0 <= trade_off <= 1
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    weighted = trade_off * relevance
+    chosen = [int(np.argmin(relevance))]
+    nearest = pairwise[chosen[0]].copy()
+    available = np.ones(len(relevance), dtype=bool)
+    available[chosen[0]] = False
+    for _ in range(k - 1):
+        penalty = weighted - (1.0 - trade_off) * nearest
+        penalty[~available] = np.inf
+        row = int(np.argmin(penalty))
+        chosen.append(row)
+        available[row] = False
+        np.minimum(nearest, pairwise[row], out=nearest)
+    return np.array(chosen, dtype=np.intp)
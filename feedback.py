@@ -0,0 +1,136 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module records users' feedback on restaurants. Feedback never changes the
+review rates stored in the graph's vertices. Instead, every piece of feedback is appended
+to a FeedbackLog, which keeps two overlays of effective review rates on top of the base
+ones:
+
+    - a global overlay, with everyone's feedback applied, and
+    - one overlay per user, with only that user's feedback applied.
+
+Each new piece of feedback is folded into the current effective rate of its restaurant,
+so recording feedback takes constant time no matter how long the log is.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+import time
+from typing import Any
+
+
+def adjusted_rating(review_rate: float, feedback: str) -> float:
+    """Return the review rate that results from applying the given feedback ('yes' or 'no')
+    to a restaurant with the given review rate.
+
+    >>> adjusted_rating(2.0, 'yes')
+    2.5
+    >>> adjusted_rating(0.4, 'no')
+    0.0
+    """
+    if 'yes' in feedback.lower():
+        if review_rate < 3.0:
+            return review_rate + 0.5
+        elif review_rate < 5.0:
+            return review_rate + 0.2
+        return review_rate
+    elif review_rate <= 0.5:
+        return 0.0
+    else:
+        return review_rate - 0.2
+
+
+@dataclass(frozen=True)
+class FeedbackEvent:
+    """One piece of feedback from a user on a restaurant.
+
+    Instance Attributes:
+        - user: The name of the user who gave the feedback, or None if unknown.
+        - restaurant: The name of the restaurant.
+        - feedback: The feedback, 'yes' or 'no'.
+        - timestamp: When the feedback was given, in seconds since the epoch.
+    """
+    user: str | None
+    restaurant: Any
+    feedback: str
+    timestamp: float
+
+
+class FeedbackLog:
+    """An append-only log of feedback, with the effective review rates it leads to.
+
+    Instance Attributes:
+        - events: Every piece of feedback recorded, oldest first.
+
+    Representation Invariants:
+        - self.version() == len(self.events)
+    """
+    events: list[FeedbackEvent]
+    # Private Instance Attributes:
+    #     - _global: Maps each restaurant with feedback to its effective review rate with
+    #       everyone's feedback applied.
+    #     - _per_user: Maps a user name to the effective review rates of the restaurants that
+    #       user gave feedback on, with only their own feedback applied.
+    #     - _volumes: Maps each restaurant with feedback to the number of pieces of feedback
+    #       it received.
+    _global: dict[Any, float]
+    _per_user: dict[str, dict[Any, float]]
+    _volumes: dict[Any, int]
+
+    def __init__(self) -> None:
+        """Initialize an empty log."""
+        self.events = []
+        self._global = {}
+        self._per_user = {}
+        self._volumes = {}
+
+    def version(self) -> int:
+        """Return a number that changes every time feedback is recorded."""
+        return len(self.events)
+
+    def record(self, user: str | None, restaurant: Any, feedback: str, base_rating: float) -> float:
+        """Append the given feedback to the log, and return the restaurant's new global
+        effective review rate.
+
+        base_rating is the restaurant's review rate before any feedback.
+        """
+        self.events.append(FeedbackEvent(user, restaurant, feedback, time.time()))
+        new_rating = adjusted_rating(self._global.get(restaurant, base_rating), feedback)
+        self._global[restaurant] = new_rating
+        self._volumes[restaurant] = self._volumes.get(restaurant, 0) + 1
+        if user is not None:
+            ratings = self._per_user.setdefault(user, {})
+            ratings[restaurant] = adjusted_rating(ratings.get(restaurant, base_rating), feedback)
+        return new_rating
+
+    def global_rating(self, restaurant: Any, base_rating: float) -> float:
+        """Return the effective review rate of the restaurant with everyone's feedback applied."""
+        return self._global.get(restaurant, base_rating)
+
+    def user_rating(self, user: str, restaurant: Any, base_rating: float) -> float:
+        """Return the effective review rate of the restaurant with only the given user's
+        feedback applied.
+        """
+        return self._per_user.get(user, {}).get(restaurant, base_rating)
+
+    def global_ratings(self) -> dict[Any, float]:
+        """Return a dictionary mapping each restaurant with feedback to its global effective
+        review rate.
+        """
+        return dict(self._global)
+
+    def volume(self, restaurant: Any) -> int:
+        """Return the number of pieces of feedback the restaurant received."""
+        return self._volumes.get(restaurant, 0)
+
+    def volumes(self) -> dict[Any, int]:
+        """Return a dictionary mapping each restaurant with feedback to the number of pieces of
+        feedback it received.
+        """
+        return dict(self._volumes)
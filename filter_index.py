@@ -0,0 +1,211 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains FilterIndex, an inverted index over the category, price range
+and effective review rate of the restaurants of a RestaurantTable, and RestaurantFilter, a
+query on those attributes such as "category 3 or 5, price range at most 2, rated 3.5 or more".
+
+Each distinct category and price range has a bitmap (a boolean array with one entry per row)
+of the rows that have it, and so does each band of review rates. A query is answered by
+combining the bitmaps of the values it accepts, instead of comparing every restaurant. Only
+the rows in the rating bands that a rating bound cuts through have their rating compared.
+
+When the rows of the table change, the index is patched rather than rebuilt: the bits of the
+rows removed or changed are cleared, and those of the rows added or changed are set. Each
+bitmap is a view of a larger buffer whose extra entries are all False, so adding rows only
+reallocates the bitmaps when their buffers are full, like a list.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+import math
+
+import numpy as np
+
+from restaurant_table import RestaurantTable
+
+# The width of the review rate bands of the index.
+RATING_BAND_WIDTH = 0.5
+
+
+@dataclass(frozen=True)
+class RestaurantFilter:
+    """A query on the attributes of restaurants. A restaurant matches when it satisfies every
+    condition that is not None.
+
+    Instance Attributes:
+        - categories: The categories accepted.
+        - min_price: The lowest price range accepted.
+        - max_price: The highest price range accepted.
+        - min_rating: The lowest effective review rate accepted.
+        - max_rating: The highest effective review rate accepted.
+    """
+    categories: frozenset[int] | None = None
+    min_price: int | None = None
+    max_price: int | None = None
+    min_rating: float | None = None
+    max_rating: float | None = None
+
+    def is_empty(self) -> bool:
+        """Return whether every restaurant matches this filter, since it has no conditions."""
+        return self == RestaurantFilter()
+
+
+class FilterIndex:
+    """Bitmaps of the rows of a RestaurantTable with each category, price range and band of
+    effective review rates.
+
+    Instance Attributes:
+        - table: The table indexed.
+        - categories: Maps each category to the bitmap of the rows with that category.
+        - price_ranges: Maps each price range to the bitmap of the rows with that price range.
+        - rating_bands: Maps each band b to the bitmap of the rows whose effective review rate
+        is in [b * RATING_BAND_WIDTH, (b + 1) * RATING_BAND_WIDTH).
+
+    Representation Invariants:
+        - every row is in exactly one bitmap of each of categories, price_ranges and rating_bands
+    """
+    table: RestaurantTable
+    categories: dict[int, np.ndarray]
+    price_ranges: dict[int, np.ndarray]
+    rating_bands: dict[int, np.ndarray]
+    # Private Instance Attributes:
+    #     - _bands: The rating band of each row.
+    _bands: np.ndarray
+
+    def __init__(self, table: RestaurantTable) -> None:
+        """Initialize an index over the rows of the given table."""
+        self.table = table
+        self.categories = _bitmaps(table.features[:, 0].astype(np.int64))
+        self.price_ranges = _bitmaps(table.features[:, 1].astype(np.int64))
+        self._bands = np.floor(table.features[:, 2] / RATING_BAND_WIDTH).astype(np.int64)
+        self.rating_bands = _bitmaps(self._bands)
+
+    def update_rating(self, row: int, rating: float) -> None:
+        """Move the given row to the band of its new effective review rate."""
+        band = math.floor(rating / RATING_BAND_WIDTH)
+        old_band = int(self._bands[row])
+        if band != old_band:
+            self.rating_bands[old_band][row] = False
+            if band not in self.rating_bands:
+                self.rating_bands[band] = np.zeros(len(self.table), dtype=bool)
+            self.rating_bands[band][row] = True
+            self._bands[row] = band
+
+    def discard(self, rows: list[int]) -> None:
+        """Clear the bits of the given rows, before they are removed or changed in the table."""
+        for row in rows:
+            category, price = self.table.features[row, :2].tolist()
+            self.categories[int(category)][row] = False
+            self.price_ranges[int(price)][row] = False
+            self.rating_bands[int(self._bands[row])][row] = False
+
+    def truncate(self, n: int) -> None:
+        """Drop every row from row n on, after they were discarded and removed from the table."""
+        for bitmaps in (self.categories, self.price_ranges, self.rating_bands):
+            for value, bitmap in bitmaps.items():
+                bitmaps[value] = bitmap[:n]
+        self._bands = self._bands[:n]
+
+    def renumber(self, new_rows: np.ndarray) -> None:
+        """Move each row i to row new_rows[i], dropping the rows where it is -1, after the rows
+        dropped were discarded and the table renumbered the same way.
+        """
+        kept = np.flatnonzero(new_rows >= 0)
+        targets = new_rows[kept]
+        for bitmaps in (self.categories, self.price_ranges, self.rating_bands):
+            for value, bitmap in bitmaps.items():
+                bitmaps[value] = np.zeros(len(kept), dtype=bool)
+                bitmaps[value][targets] = bitmap[kept]
+        bands = np.zeros(len(kept), dtype=np.int64)
+        bands[targets] = self._bands[kept]
+        self._bands = bands
+
+    def add(self, rows: list[int]) -> None:
+        """Set the bits of the given rows, after they were added or changed in the table."""
+        n = len(self.table)
+        for bitmaps in (self.categories, self.price_ranges, self.rating_bands):
+            for value, bitmap in bitmaps.items():
+                bitmaps[value] = _resized(bitmap, n)
+        self._bands = _resized(self._bands, n)
+        for row in rows:
+            category, price, rating = self.table.features[row].tolist()
+            band = math.floor(rating / RATING_BAND_WIDTH)
+            for bitmaps, value in ((self.categories, int(category)), (self.price_ranges, int(price)),
+                                   (self.rating_bands, band)):
+                if value not in bitmaps:
+                    bitmaps[value] = np.zeros(n, dtype=bool)
+                bitmaps[value][row] = True
+            self._bands[row] = band
+
+    def mask(self, query: RestaurantFilter) -> np.ndarray:
+        """Return the bitmap of the rows matching the given filter."""
+        mask = np.ones(len(self.table), dtype=bool)
+        if query.categories is not None:
+            mask &= _union([self.categories.get(category) for category in query.categories], len(mask))
+        if query.min_price is not None or query.max_price is not None:
+            low = -math.inf if query.min_price is None else query.min_price
+            high = math.inf if query.max_price is None else query.max_price
+            mask &= _union([bitmap for price, bitmap in self.price_ranges.items() if low <= price <= high], len(mask))
+        if query.min_rating is not None or query.max_rating is not None:
+            mask &= self._rating_mask(-math.inf if query.min_rating is None else query.min_rating,
+                                      math.inf if query.max_rating is None else query.max_rating)
+        return mask
+
+    def rows(self, query: RestaurantFilter) -> np.ndarray:
+        """Return the rows matching the given filter, in increasing order."""
+        return np.flatnonzero(self.mask(query))
+
+    def _rating_mask(self, low: float, high: float) -> np.ndarray:
+        """Return the bitmap of the rows whose effective review rate is in [low, high].
+
+        The bands entirely inside the interval are taken whole; only the rows of the bands
+        that contain an end of the interval are compared with it.
+        """
+        ratings = self.table.features[:, 2]
+        mask = np.zeros(len(self.table), dtype=bool)
+        for band, bitmap in self.rating_bands.items():
+            band_low, band_high = band * RATING_BAND_WIDTH, (band + 1) * RATING_BAND_WIDTH
+            if band_high <= low or band_low > high:
+                continue
+            if low <= band_low and band_high <= high:
+                mask |= bitmap
+            else:
+                rows = np.flatnonzero(bitmap)
+                mask[rows[(ratings[rows] >= low) & (ratings[rows] <= high)]] = True
+        return mask
+
+
+def _bitmaps(values: np.ndarray) -> dict[int, np.ndarray]:
+    """Return a dictionary mapping each distinct value of values to the bitmap of its positions."""
+    return {value: values == value for value in np.unique(values).tolist()}
+
+
+def _resized(array: np.ndarray, n: int) -> np.ndarray:
+    """Return a view of the first n entries of the buffer of the given array (the array itself,
+    or the array it is a view of), reallocating the buffer with twice the room if it is too
+    small. Entries past the end of the array are left as they are in the buffer, or 0 if new.
+
+    Preconditions:
+        - array.base is None or array is a prefix of array.base
+    """
+    buffer = array if array.base is None else array.base
+    if len(buffer) < n:
+        buffer = np.zeros(max(n, 2 * len(buffer)), dtype=array.dtype)
+        buffer[:len(array)] = array
+    return buffer[:n]
+
+
+def _union(bitmaps: list[np.ndarray | None], n: int) -> np.ndarray:
+    """Return the union of the given bitmaps of length n, skipping the ones that are None."""
+    mask = np.zeros(n, dtype=bool)
+    for bitmap in bitmaps:
+        if bitmap is not None:
+            mask |= bitmap
+    return mask
@@ -0,0 +1,121 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module computes distances, in kilometres, between (latitude, longitude) points,
+such as a user and the restaurants around them.
+
+Near a point, a degree of latitude is always about 111 km long, but a degree of longitude
+shrinks with the cosine of the latitude. Distances are therefore computed with an
+equirectangular projection around the user: the differences in latitude and longitude are
+scaled by the number of kilometres per degree at the user's latitude, and the distance is
+their hypotenuse. The projection is linear, so scaling the differences costs the same as
+storing projected copies of the locations, and a whole catalog is measured with a handful of
+array operations. It is accurate to a fraction of a percent within EQUIRECTANGULAR_LIMIT_KM of the user;
+points further away are measured with the haversine formula instead.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import math
+
+import numpy as np
+
+# The mean radius of the Earth, in kilometres.
+EARTH_RADIUS_KM = 6371.0088
+
+# The length of a degree of latitude (and of longitude at the equator), in kilometres.
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180.0
+
+# The distance beyond which the haversine formula is used instead of the equirectangular
+# projection, in kilometres.
+EQUIRECTANGULAR_LIMIT_KM = 25.0
+
+
+def local_scales(lat: float) -> tuple[float, float]:
+    """Return the length of a degree of latitude and of a degree of longitude, in kilometres,
+    at the given latitude.
+    """
+    return KM_PER_DEGREE, KM_PER_DEGREE * math.cos(math.radians(lat))
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the great-circle distance between the two given points, in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2.0) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat: float, lon: float, locations: np.ndarray) -> np.ndarray:
+    """Return the great-circle distance between the given point and each point of the given
+    (n, 2) array of latitudes and longitudes, in kilometres.
+    """
+    phi = math.radians(lat)
+    phis = np.radians(locations[:, 0])
+    a = (np.sin((phis - phi) / 2.0) ** 2
+         + math.cos(phi) * np.cos(phis) * np.sin(np.radians(locations[:, 1] - lon) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the distance between the two given points, in kilometres, as distances_km would
+    measure it from the first point.
+    """
+    km_lat, km_lon = local_scales(lat1)
+    distance = math.hypot((lat2 - lat1) * km_lat, (lon2 - lon1) * km_lon)
+    if distance > EQUIRECTANGULAR_LIMIT_KM:
+        return haversine_km(lat1, lon1, lat2, lon2)
+    return distance
+
+
+def distances_km(lat: float, lon: float, locations: np.ndarray) -> np.ndarray:
+    """Return the distance between the given point and each point of the given (n, 2) array of
+    latitudes and longitudes, in kilometres.
+
+    The distances are computed with the equirectangular projection around the given point,
+    and those longer than EQUIRECTANGULAR_LIMIT_KM again with the haversine formula.
+    """
+    km_lat, km_lon = local_scales(lat)
+    distances = np.hypot((locations[:, 0] - lat) * km_lat, (locations[:, 1] - lon) * km_lon)
+    far = np.flatnonzero(distances > EQUIRECTANGULAR_LIMIT_KM)
+    if len(far) > 0:
+        distances[far] = haversine_many(lat, lon, locations[far])
+    return distances
+
+
+def pairwise_distances_km(points: np.ndarray, locations: np.ndarray) -> np.ndarray:
+    """Return an (m, n) array whose entry [i, j] is distances_km(*points[i], locations)[j]
+    (up to rounding), the distance from the i-th of the given points to the j-th location.
+    """
+    km_lon = KM_PER_DEGREE * np.cos(np.radians(points[:, 0, None]))
+    distances = (points[:, 0, None] - locations[None, :, 0]) * KM_PER_DEGREE
+    np.square(distances, out=distances)
+    temp = (points[:, 1, None] - locations[None, :, 1]) * km_lon
+    np.square(temp, out=temp)
+    distances += temp
+    np.sqrt(distances, out=distances)
+    far_i, far_j = np.nonzero(distances > EQUIRECTANGULAR_LIMIT_KM)
+    for i in np.unique(far_i).tolist():
+        columns = far_j[far_i == i]
+        distances[i, columns] = haversine_many(float(points[i, 0]), float(points[i, 1]), locations[columns])
+    return distances
+
+
+def paired_distances_km(points: np.ndarray, locations: np.ndarray) -> np.ndarray:
+    """Return the distance from each of the given points to the location in the same row of
+    locations, in kilometres, as distances_km would measure it from the point (up to rounding).
+
+    Preconditions:
+        - points.shape == locations.shape
+    """
+    km_lon = KM_PER_DEGREE * np.cos(np.radians(points[:, 0]))
+    distances = np.hypot((locations[:, 0] - points[:, 0]) * KM_PER_DEGREE, (locations[:, 1] - points[:, 1]) * km_lon)
+    for i in np.flatnonzero(distances > EQUIRECTANGULAR_LIMIT_KM).tolist():
+        distances[i] = haversine_km(float(points[i, 0]), float(points[i, 1]),
+                                    float(locations[i, 0]), float(locations[i, 1]))
+    return distances
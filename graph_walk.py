@@ -0,0 +1,251 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module ranks the restaurants of a graph by personalized PageRank: the probability
+of reaching each restaurant by a random walk along the edges of the graph that, at every step,
+jumps back to one of the restaurants a user liked (the seeds) with probability
+RESTART_PROBABILITY. Restaurants close to many seeds, directly or through other restaurants,
+are reached most often.
+
+The walk follows the edges of a restaurant in proportion to their affinity, 1 / (1 + weight):
+the weights are similarity scores, so the walk prefers the most similar restaurants.
+Restaurants the user did not like are removed from the graph for the walk, so it never passes
+through them. A restaurant without edges (left) jumps back to the seeds.
+
+The probabilities are computed in one of two ways:
+    - personalized_pagerank runs a power iteration over the whole graph, in CSR form, until
+      the probabilities change by less than POWER_TOLERANCE.
+    - push_pagerank approximates them by pushing probability from the seeds to their
+      neighbours until every restaurant holds less than PUSH_TOLERANCE of unpushed probability
+      per edge. It only touches the restaurants near the seeds, and pushes at most
+      1 / (PUSH_TOLERANCE * RESTART_PROBABILITY) edges, so its cost does not grow with the size
+      of the graph.
+
+When edges change, the walk is patched rather than rebuilt from the graph: the CSR rows of the
+restaurants whose edges changed are spliced in, and the rest are copied over as arrays.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections import deque
+
+import numpy as np
+
+# The probability that the walk jumps back to the seeds at each step.
+RESTART_PROBABILITY = 0.15
+
+# The change in probability (summed over every restaurant) below which the power iteration stops.
+POWER_TOLERANCE = 1e-6
+
+# The maximum number of steps of the power iteration.
+MAX_ITERATIONS = 100
+
+# The unpushed probability per edge below which push_pagerank stops pushing from a restaurant.
+PUSH_TOLERANCE = 1e-5
+
+
+class WalkGraph:
+    """The transition probabilities of a random walk along the edges of a graph, in CSR form.
+
+    Instance Attributes:
+        - indptr: The edges of row i are indices[indptr[i]:indptr[i + 1]].
+        - indices: The row each edge leads to.
+        - sources: The row each edge leads from.
+        - affinities: The affinity of each edge, 1 / (1 + its weight).
+        - probabilities: The probability that the walk follows each edge from its source.
+
+    Representation Invariants:
+        - len(self.indices) == len(self.sources) == len(self.affinities) == len(self.probabilities)
+        - self.indptr[-1] == len(self.indices)
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    sources: np.ndarray
+    affinities: np.ndarray
+    probabilities: np.ndarray
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> None:
+        """Initialize the walk along the edges in the given CSR arrays (see
+        CategoryGraph._edge_columns).
+
+        Preconditions:
+            - all(weights >= 0)
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        self.affinities = 1.0 / (1.0 + np.asarray(weights, dtype=np.float64))
+        self.probabilities = _normalize(self.sources, self.affinities, len(self))
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.indptr) - 1
+
+    def edges(self) -> int:
+        """Return the number of (directed) edges."""
+        return len(self.indices)
+
+    def patched(self, new_rows: np.ndarray | None, n: int, rows: list[int],
+                edges: list[tuple[list[int], list[float]]]) -> WalkGraph:
+        """Return the walk over n rows where row i of this walk is row new_rows[i] (or is
+        dropped, if it is -1), keeping its edges, except that the edges of rows[j] are the
+        (neighbour rows, weights) in edges[j]. A new_rows of None keeps every row where it is.
+        Rows that are in neither have no edges.
+
+        Only the given rows are read edge by edge; the others are copied as slices of the CSR
+        arrays, with their neighbours renumbered.
+
+        Preconditions:
+            - len(rows) == len(edges)
+            - new_rows is None or len(new_rows) == len(self)
+            - every edge kept leads to a row that is kept
+        """
+        if new_rows is None:
+            new_rows = np.arange(len(self))
+        kept = np.flatnonzero(new_rows >= 0)
+        old_of = np.full(n, -1, dtype=np.int64)
+        old_of[new_rows[kept]] = kept
+        old_of[rows] = -1
+
+        copied = np.flatnonzero(old_of >= 0)
+        degrees = np.zeros(n, dtype=np.int64)
+        degrees[copied] = np.diff(self.indptr)[old_of[copied]]
+        degrees[rows] = [len(neighbours) for neighbours, _ in edges]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.empty(int(indptr[-1]), dtype=np.intp)
+        affinities = np.empty(int(indptr[-1]))
+
+        # The position of each copied edge within its row, then in the old and the new arrays.
+        lengths = degrees[copied]
+        within = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        sources = np.repeat(self.indptr[old_of[copied]], lengths) + within
+        targets = np.repeat(indptr[copied], lengths) + within
+        indices[targets] = new_rows[self.indices[sources]]
+        affinities[targets] = self.affinities[sources]
+        for row, (neighbours, weights) in zip(rows, edges):
+            indices[indptr[row]:indptr[row + 1]] = neighbours
+            affinities[indptr[row]:indptr[row + 1]] = 1.0 / (1.0 + np.asarray(weights, dtype=np.float64))
+
+        walk = WalkGraph(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.intp), np.empty(0))
+        walk.indptr, walk.indices, walk.affinities = indptr, indices, affinities
+        walk.sources = np.repeat(np.arange(n), degrees)
+        walk.probabilities = _normalize(walk.sources, affinities, n)
+        return walk
+
+
+def _normalize(sources: np.ndarray, affinities: np.ndarray, n: int) -> np.ndarray:
+    """Return the given affinities divided by the total affinity of the edges from their source."""
+    totals = np.bincount(sources, affinities, n)
+    return affinities / np.where(totals > 0.0, totals, 1.0)[sources]
+
+
+def _restart_vector(n: int, seeds: np.ndarray, excluded: np.ndarray) -> np.ndarray:
+    """Return the probability of jumping back to each of the n rows: the same for every seed
+    that is not excluded, and 0 for every other row.
+    """
+    restart = np.zeros(n)
+    restart[seeds] = 1.0
+    restart[excluded] = 0.0
+    total = restart.sum()
+    return restart / total if total > 0.0 else restart
+
+
+def personalized_pagerank(walk: WalkGraph, seeds: np.ndarray, exclude: np.ndarray,
+                          alpha: float = RESTART_PROBABILITY, tolerance: float = POWER_TOLERANCE,
+                          max_iterations: int = MAX_ITERATIONS) -> tuple[np.ndarray, int]:
+    """Return the personalized PageRank of every row of the given walk, restarting at the given
+    seed rows and never entering the rows in exclude, and the number of steps it took.
+
+    Each step of the power iteration moves the probability of every row along its edges at
+    once; it stops after max_iterations steps or when the probabilities changed by less than
+    tolerance. If every seed is excluded, every rank is 0.
+
+    Preconditions:
+        - 0 < alpha < 1
+    """
+    n = len(walk)
+    restart = _restart_vector(n, seeds, exclude)
+    if not restart.any():
+        return restart, 0
+    probabilities = walk.probabilities
+    if len(exclude) > 0:
+        allowed = np.ones(n, dtype=bool)
+        allowed[exclude] = False
+        kept = allowed[walk.sources] & allowed[walk.indices]
+        probabilities = np.where(kept, _normalize(walk.sources, np.where(kept, walk.affinities, 0.0), n), 0.0)
+    dangling = np.bincount(walk.sources, probabilities, n) == 0.0
+
+    ranks = restart.copy()
+    for iteration in range(1, max_iterations + 1):
+        moved = np.bincount(walk.indices, probabilities * ranks[walk.sources], n)
+        moved += ranks[dangling].sum() * restart
+        moved *= 1.0 - alpha
+        moved += alpha * restart
+        change = float(np.abs(moved - ranks).sum())
+        ranks = moved
+        if change < tolerance:
+            return ranks, iteration
+    return ranks, max_iterations
+
+
+def push_pagerank(walk: WalkGraph, seeds: np.ndarray, exclude: np.ndarray,
+                  alpha: float = RESTART_PROBABILITY, tolerance: float = PUSH_TOLERANCE) -> dict[int, float]:
+    """Return an approximation of personalized_pagerank(walk, seeds, exclude, alpha), as a
+    dictionary mapping the rows with a nonzero rank to their rank.
+
+    Probability starts at the seeds, unpushed. Pushing a row keeps alpha of its unpushed
+    probability as its rank and spreads the rest along its edges, as one step of the walk.
+    Rows are pushed until every row has less than tolerance unpushed probability per edge, so
+    only the rows near the seeds are ever visited, and each rank is below the exact one by at
+    most tolerance times the number of edges of its row. Each push of a row with d edges
+    turns at least alpha * tolerance * d of probability into rank, so at most
+    1 / (alpha * tolerance) edges are pushed along in total.
+
+    Preconditions:
+        - 0 < alpha < 1
+        - tolerance > 0
+    """
+    excluded = set(exclude.tolist())
+    seed_rows = [row for row in dict.fromkeys(seeds.tolist()) if row not in excluded]
+    if not seed_rows:
+        return {}
+    share = 1.0 / len(seed_rows)
+    restart = [(row, share) for row in seed_rows]
+
+    indptr, indices, affinities = walk.indptr, walk.indices, walk.affinities
+    # The (row, probability) of the edges of each row visited, without the excluded rows.
+    edges = {}
+    ranks = {}
+    residuals = dict(restart)
+    queue = deque(seed_rows)
+    queued = set(seed_rows)
+    while queue:
+        row = queue.popleft()
+        queued.discard(row)
+        if row not in edges:
+            start, end = int(indptr[row]), int(indptr[row + 1])
+            kept = [(other, affinity) for other, affinity
+                    in zip(indices[start:end].tolist(), affinities[start:end].tolist()) if other not in excluded]
+            total = sum(affinity for _, affinity in kept)
+            # A row without edges jumps back to the seeds.
+            edges[row] = [(other, affinity / total) for other, affinity in kept] if total > 0.0 else restart
+        row_edges = edges[row]
+        residual = residuals[row]
+        if residual < tolerance * len(row_edges):
+            continue
+        residuals[row] = 0.0
+        ranks[row] = ranks.get(row, 0.0) + alpha * residual
+        residual *= 1.0 - alpha
+        for other, probability in row_edges:
+            amount = residuals.get(other, 0.0) + residual * probability
+            residuals[other] = amount
+            if other not in queued and amount >= tolerance * max(1, int(indptr[other + 1] - indptr[other])):
+                queue.append(other)
+                queued.add(other)
+    return ranks
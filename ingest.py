@@ -0,0 +1,320 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module reads restaurant CSV files (in the format of filtered_restaurant_dt_4d.csv)
+into typed NumPy columns, in a streaming fashion.
+
+The input is read in blocks of bytes, which are cut into chunks of whole records. A record
+may span several lines, since addresses contain line breaks inside quotes, so a chunk is
+only cut at a line break that has an even number of quote characters before it (an escaped
+quote is written as two quotes, so it does not change the parity). Each chunk is parsed into
+columns on its own, so only one chunk per process is ever held as Python strings, and the
+chunks can be parsed by several processes at once.
+
+The input can be a file path, a file-like object (text or binary), or an iterable of strings
+or bytes, such as a generator of lines. Gzip-compressed input is detected and decompressed.
+
+A delta file lists changes to a catalog. It has the columns of the catalog, preceded by a
+'Change' column that is 'upsert' (add the restaurant, or replace the one with the same name)
+or 'remove' (remove the restaurant with that name; the other columns may be empty).
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import csv
+from dataclasses import dataclass
+import gc
+import io
+import os
+from typing import Any, Iterable, Iterator
+import zlib
+
+import numpy as np
+
+# The size, in bytes, of the blocks read from the input.
+READ_SIZE = 1 << 20
+
+# The approximate size, in bytes, of the chunks parsed at once.
+CHUNK_SIZE = 1 << 22
+
+# The actions of a delta file.
+DELTA_ACTIONS = ('upsert', 'remove')
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+@dataclass
+class RestaurantColumns:
+    """The restaurants of a CSV file, as columns. Row i of every column describes one
+    restaurant, in the order of the file.
+
+    Instance Attributes:
+        - names: The restaurant names.
+        - addresses: The restaurant addresses.
+        - categories: The category of each restaurant.
+        - price_ranges: The price range of each restaurant.
+        - review_rates: The review rate of each restaurant; 0.0 where the file says 'NA'.
+        - locations: An (n, 2) array of the latitude and longitude of each restaurant.
+
+    Representation Invariants:
+        - len(self.names) == len(self.addresses) == len(self.categories) == len(self.price_ranges)
+          == len(self.review_rates) == self.locations.shape[0]
+    """
+    names: list[str]
+    addresses: list[str]
+    categories: np.ndarray
+    price_ranges: np.ndarray
+    review_rates: np.ndarray
+    locations: np.ndarray
+
+    def __len__(self) -> int:
+        """Return the number of restaurants."""
+        return len(self.names)
+
+    @staticmethod
+    def concatenate(parts: list[RestaurantColumns]) -> RestaurantColumns:
+        """Return the restaurants of all the given parts, in order."""
+        return RestaurantColumns(
+            [name for part in parts for name in part.names],
+            [address for part in parts for address in part.addresses],
+            np.concatenate([part.categories for part in parts] or [np.empty(0, dtype=np.int64)]),
+            np.concatenate([part.price_ranges for part in parts] or [np.empty(0, dtype=np.int64)]),
+            np.concatenate([part.review_rates for part in parts] or [np.empty(0)]),
+            np.concatenate([part.locations for part in parts] or [np.empty((0, 2))]))
+
+    def deduplicated(self) -> RestaurantColumns:
+        """Return these restaurants with one row per name, as load_graph keeps them: each name
+        stays where it first appears, with the values of its last row.
+        """
+        last = {}
+        for i, name in enumerate(self.names):
+            last[name] = i
+        if len(last) == len(self.names):
+            return self
+        rows = np.fromiter(last.values(), dtype=np.intp, count=len(last))
+        return RestaurantColumns(list(last), [self.addresses[i] for i in rows.tolist()], self.categories[rows],
+                                 self.price_ranges[rows], self.review_rates[rows], self.locations[rows])
+
+    def features(self) -> np.ndarray:
+        """Return the (n, 3) array of the category, price range and review rate of each
+        restaurant, as used by restaurant_table.RestaurantTable.
+        """
+        return np.column_stack([self.categories, self.price_ranges, self.review_rates]).astype(np.float64)
+
+
+def read_blocks(source: Any) -> Iterator[bytes]:
+    """Yield the contents of source as blocks of bytes, decompressing it if it is gzipped.
+
+    source is a file path, a file-like object, or an iterable of strings or bytes.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            yield from _decompressed(_file_blocks(file))
+    elif hasattr(source, 'read'):
+        yield from _decompressed(_file_blocks(source))
+    else:
+        yield from _decompressed(piece.encode('utf-8') if isinstance(piece, str) else piece for piece in source)
+
+
+def _file_blocks(file: Any) -> Iterator[bytes]:
+    """Yield the contents of the given file-like object, text or binary, as blocks of bytes."""
+    while True:
+        block = file.read(READ_SIZE)
+        if not block:
+            return
+        yield block.encode('utf-8') if isinstance(block, str) else block
+
+
+def _decompressed(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """Yield the given blocks, decompressed if the first one starts like a gzip stream."""
+    blocks = iter(blocks)
+    first = next((block for block in blocks if block), b'')
+    if not first.startswith(GZIP_MAGIC):
+        if first:
+            yield first
+        yield from blocks
+        return
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending = first
+    while True:
+        while pending:
+            yield decompressor.decompress(pending)
+            if decompressor.eof:
+                # A gzip file may hold several members one after the other.
+                pending = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                pending = b''
+        pending = next(blocks, None)
+        if pending is None:
+            yield decompressor.flush()
+            return
+
+
+def read_chunks(blocks: Iterable[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the given blocks regrouped into chunks of whole CSV records, each about
+    chunk_size bytes or more.
+    """
+    buffer = bytearray()
+    for block in blocks:
+        buffer += block
+        if len(buffer) >= chunk_size:
+            cut = _record_boundary(buffer)
+            if cut > 0:
+                yield bytes(buffer[:cut])
+                del buffer[:cut]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _record_boundary(buffer: bytearray) -> int:
+    """Return the position just after the last line break of buffer that ends a record, or 0 if
+    no line break does.
+
+    buffer starts at the beginning of a record, so a line break ends a record exactly when an
+    even number of quote characters comes before it.
+    """
+    quotes = buffer.count(b'"')
+    end = len(buffer)
+    while True:
+        newline = buffer.rfind(b'\n', 0, end)
+        if newline < 0:
+            return 0
+        quotes -= buffer.count(b'"', newline, end)
+        if quotes % 2 == 0:
+            return newline + 1
+        end = newline
+
+
+def parse_chunk(data: bytes, skip_header: bool = False) -> RestaurantColumns:
+    """Return the restaurants in the given chunk of whole CSV records, skipping its first
+    record if skip_header is True.
+
+    Raise a ValueError if a record does not have the expected six fields, or a number in it
+    cannot be parsed.
+    """
+    reader = csv.reader(io.StringIO(data.decode('utf-8')))
+    if skip_header:
+        next(reader, None)
+    return parse_records([row for row in reader if row])
+
+
+def parse_records(rows: list[list[str]]) -> RestaurantColumns:
+    """Return the restaurants in the given CSV records, each a list of fields.
+
+    Raise a ValueError if a record does not have the expected six fields, or a number in it
+    cannot be parsed.
+    """
+    if any(len(row) != 6 for row in rows):
+        bad = next(row for row in rows if len(row) != 6)
+        raise ValueError(f'expected 6 fields, got {len(bad)}: {bad}')
+
+    columns = [[row[i] for row in rows] for i in range(6)]
+    # Joining a column into one string and parsing it with NumPy is much faster than
+    # converting the values one at a time.
+    locations = _parse_numbers(columns[5], np.float64, 2).reshape(-1, 2)
+    return RestaurantColumns(
+        columns[2],
+        columns[1],
+        _parse_numbers(columns[0], np.int64),
+        _parse_numbers(columns[3], np.int64),
+        _parse_numbers(['0' if rate == 'NA' else rate for rate in columns[4]], np.float64),
+        locations)
+
+
+def _parse_numbers(values: list[str], dtype: type, per_value: int = 1) -> np.ndarray:
+    """Return the numbers written in values, each of which holds per_value numbers separated
+    by commas, as an array of the given type.
+
+    Raise a ValueError if they cannot all be parsed.
+    """
+    if not values:
+        return np.empty(0, dtype=dtype)
+    numbers = np.fromstring(','.join(values), dtype=dtype, sep=',')
+    if len(numbers) != len(values) * per_value:
+        raise ValueError(f'expected {per_value} number(s) in each of {values[:3]}...')
+    return numbers
+
+
+def iter_columns(source: Any, chunk_size: int = CHUNK_SIZE, processes: int = 1,
+                 header: bool = True) -> Iterator[RestaurantColumns]:
+    """Yield the restaurants of source (see read_blocks) one chunk at a time, in order.
+
+    With more than one process, the chunks are parsed in a process pool, with at most two
+    chunks per process in flight, so memory stays bounded however large the input is.
+    """
+    chunks = read_chunks(read_blocks(source), chunk_size)
+    if processes == 1:
+        for i, chunk in enumerate(chunks):
+            yield parse_chunk(chunk, header and i == 0)
+        return
+
+    with ProcessPoolExecutor(processes) as pool:
+        in_flight = deque()
+        for i, chunk in enumerate(chunks):
+            in_flight.append(pool.submit(parse_chunk, chunk, header and i == 0))
+            if len(in_flight) >= 2 * processes:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def read_delta(source: Any) -> tuple[RestaurantColumns, list[str]]:
+    """Return the restaurants to upsert and the names of the restaurants to remove listed in
+    the delta file source (see read_blocks). When a name has several changes, only the last
+    one is kept.
+
+    A delta file is expected to be small, so it is read in one piece.
+
+    Raise a ValueError if a change is not in DELTA_ACTIONS, or an upserted restaurant cannot
+    be parsed as parse_records would.
+    """
+    reader = csv.reader(io.StringIO(b''.join(read_blocks(source)).decode('utf-8')))
+    next(reader, None)
+    changes = {}
+    for row in reader:
+        if not row:
+            continue
+        action = row[0].strip().lower()
+        if action not in DELTA_ACTIONS or len(row) < 4:
+            raise ValueError(f'invalid change: {row}')
+        # Moving a name to the end keeps the changes in the order of their last occurrence.
+        changes.pop(row[3], None)
+        changes[row[3]] = row[1:] if action == 'upsert' else None
+    upserts = parse_records([fields for fields in changes.values() if fields is not None])
+    return upserts, [name for name, fields in changes.items() if fields is None]
+
+
+@contextlib.contextmanager
+def gc_paused() -> Iterator[None]:
+    """Pause the cyclic garbage collector in the with block.
+
+    Building millions of long-lived objects (parsed rows, vertices) triggers many full
+    collections, each of which walks every object built so far; none of them finds garbage.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_restaurants(source: Any, chunk_size: int = CHUNK_SIZE, processes: int = 1,
+                     header: bool = True) -> RestaurantColumns:
+    """Return the restaurants of source (see read_blocks), with one row per name (see
+    RestaurantColumns.deduplicated).
+    """
+    with gc_paused():
+        parts = list(iter_columns(source, chunk_size, processes, header))
+        return RestaurantColumns.concatenate(parts).deduplicated()
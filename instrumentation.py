@@ -0,0 +1,311 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains opt-in instrumentation for FOODER: counters and latency
+histograms for the hot paths, and a hook that profiles a session.
+
+Everything is recorded in the module-level Metrics object METRICS, which is disabled by
+default. While it is disabled, an instrumented call costs one attribute check, and nothing is
+recorded. To turn it on and export what was recorded in the Prometheus text format:
+
+    import instrumentation
+    instrumentation.METRICS.enable()
+    ...
+    instrumentation.METRICS.write_prometheus('fooder_metrics.prom')
+
+To profile a session with cProfile, or with a sampling profiler that is cheaper on long
+sessions:
+
+    with instrumentation.profile_session('session.prof'):
+        ...
+    with instrumentation.profile_session('session.folded', sampling=True):
+        ...
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import bisect
+import contextlib
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, TypeVar
+
+# The upper bounds, in seconds, of the buckets of every latency histogram.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# The time, in seconds, between two samples of the sampling profiler.
+SAMPLE_INTERVAL = 0.001
+
+_F = TypeVar('_F', bound=Callable[..., Any])
+
+# A metric name together with its labels, as sorted (label, value) pairs.
+_Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class Histogram:
+    """A histogram of observed values, with fixed bucket bounds.
+
+    Instance Attributes:
+        - bounds: The upper bounds of the buckets, in increasing order.
+        - counts: counts[i] is the number of observations in bucket i, that is, greater than
+          bounds[i - 1] and at most bounds[i]. The last count is of values above every bound.
+        - total: The sum of all observations.
+
+    Representation Invariants:
+        - len(self.counts) == len(self.bounds) + 1
+    """
+    bounds: tuple[float, ...]
+    counts: list[int]
+    total: float
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram with the given bucket bounds."""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation of value."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def count(self) -> int:
+        """Return the number of observations."""
+        return sum(self.counts)
+
+
+class Metrics:
+    """Counters and histograms, recorded only while enabled.
+
+    Instance Attributes:
+        - enabled: Whether anything is recorded.
+    """
+    enabled: bool
+    # Private Instance Attributes:
+    #     - _counters: Maps a metric name and labels to the value of that counter.
+    #     - _histograms: Maps a metric name and labels to that histogram.
+    #     - _lock: Guards _counters and _histograms, which may be updated from many threads.
+    _counters: dict[_Key, float]
+    _histograms: dict[_Key, Histogram]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        """Initialize disabled metrics with nothing recorded."""
+        self.enabled = False
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        """Start recording."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording. What was recorded is kept."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Forget everything recorded."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def count(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Add amount to the counter with the given name and labels, if enabled."""
+        if self.enabled:
+            key = (name, tuple(sorted(labels.items())))
+            with self._lock:
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record value in the histogram with the given name and labels, if enabled."""
+        if self.enabled:
+            key = (name, tuple(sorted(labels.items())))
+            with self._lock:
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram()
+                self._histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Record the time spent in the with block, in seconds, in the histogram with the given
+        name and labels, if enabled.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        """Return the value of the counter with the given name and labels (0 if never counted)."""
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels: str) -> Histogram | None:
+        """Return the histogram with the given name and labels, or None if nothing was observed."""
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def to_prometheus(self) -> str:
+        """Return everything recorded in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_format_labels(labels)} {float(value)!r}')
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram.total!r}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """Write everything recorded to the file at path, in the Prometheus text format.
+
+        The file is replaced atomically, so a collector reading it never sees half of it.
+        """
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    """Return the given labels in the Prometheus text format, or '' if there are none."""
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+METRICS = Metrics()
+
+
+def timed(name: str) -> Callable[[_F], _F]:
+    """Return a decorator that records the latency of every call to the decorated function,
+    in seconds, in the histogram with the given name, while METRICS is enabled. The count of
+    the histogram is the number of calls.
+    """
+    def decorator(function: _F) -> _F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+class SamplingProfiler:
+    """A profiler that records the call stack of one thread at regular intervals.
+
+    Unlike cProfile, it does not slow down every function call, so it can be left running
+    on a long session. Its output is in the "folded" format read by flame graph tools: one
+    line per distinct stack, with the frames separated by semicolons, then the number of
+    samples with that stack.
+
+    Instance Attributes:
+        - interval: The time between samples, in seconds.
+        - stacks: Maps each stack sampled, outermost frame first, to its number of samples.
+    """
+    interval: float
+    stacks: dict[tuple[str, ...], int]
+    # Private Instance Attributes:
+    #     - _thread_id: The id of the thread being sampled.
+    #     - _stop: Set when sampling should stop.
+    #     - _sampler: The thread taking the samples, or None if not started.
+    _thread_id: int
+    _stop: threading.Event
+    _sampler: threading.Thread | None
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        """Initialize a profiler that samples the calling thread every interval seconds."""
+        self.interval = interval
+        self.stacks = {}
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _run(self) -> None:
+        """Take samples until stopped."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write_folded(self, path: str) -> None:
+        """Write the samples to the file at path, in the folded stack format."""
+        with open(path, 'w') as file:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                file.write(f'{";".join(stack)} {count}\n')
+
+
+@contextlib.contextmanager
+def profile_session(path: str, sampling: bool = False, interval: float = SAMPLE_INTERVAL) -> Iterator[None]:
+    """Profile the with block and write the results to the file at path.
+
+    With cProfile (the default), the file can be read with pstats or snakeviz. With the
+    sampling profiler, the calling thread is sampled every interval seconds and the file is in
+    the folded stack format.
+    """
+    if sampling:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            profiler.write_folded(path)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
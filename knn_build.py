@@ -0,0 +1,194 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module computes, for every restaurant, its k most similar restaurants using
+only the features that do not depend on where the user is (category, price range and
+review rate). CategoryGraph.build_knn_edges uses the result to store these neighbours as
+weighted edges ahead of time, so similar restaurants can be looked up instead of searched.
+
+The rows are split into blocks and each block is ranked against the whole catalog with
+NumPy. With more than one process, the blocks are shared out to a process pool.
+
+knn_rows and reverse_neighbours rank only some of the rows, so that the edges can be patched
+when restaurants are added, changed or removed, instead of being built again.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+# The number of pairwise scores computed at once by one worker. This bounds the memory
+# used by each block to about 8 bytes times this number.
+BLOCK_SCORES = 1 << 22
+
+# The features of the catalog being ranked, set once in each worker process.
+_worker_features = np.empty((0, 3))
+
+
+@dataclass
+class KnnBuildReport:
+    """The cost of building the k-nearest-neighbour edges of a graph.
+
+    Instance Attributes:
+        - k: The number of neighbours computed for each restaurant.
+        - processes: The number of processes that computed the neighbours.
+        - restaurants: The number of restaurants in the graph.
+        - edges: The number of edges in the graph after the build.
+        - seconds: The wall-clock time of the build.
+        - peak_memory_mb: The peak memory allocated by this process during the build.
+        - worker_max_rss_mb: The largest resident set size of any worker process, or 0.0
+        if the build ran in this process.
+    """
+    k: int
+    processes: int
+    restaurants: int
+    edges: int = 0
+    seconds: float = 0.0
+    peak_memory_mb: float = 0.0
+    worker_max_rss_mb: float = 0.0
+
+    def __str__(self) -> str:
+        """Return a one-line summary of this report."""
+        return (f'Built {self.k}-NN edges for {self.restaurants} restaurants ({self.edges} edges) '
+                f'in {self.seconds:.2f}s with {self.processes} process(es); '
+                f'peak memory {self.peak_memory_mb:.1f} MB, worker max RSS {self.worker_max_rss_mb:.1f} MB')
+
+
+def _init_worker(features: np.ndarray) -> None:
+    """Store the catalog features in this worker process."""
+    global _worker_features
+    _worker_features = features
+
+
+def _rank_block(bounds: tuple[int, int], k: int) -> tuple[int, np.ndarray, np.ndarray]:
+    """Return the start of the block and the rows and distances of the k nearest neighbours
+    of each row in range(*bounds) of the worker's features.
+    """
+    start, stop = bounds
+    return (start,) + knn_block(_worker_features, start, stop, k)
+
+
+def knn_block(features: np.ndarray, start: int, stop: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return two (stop - start, k) arrays: the rows of the k nearest neighbours of each of
+    the rows in range(start, stop), closest first, and the distances to those neighbours.
+
+    A row is never its own neighbour.
+
+    Preconditions:
+        - 0 < k < features.shape[0]
+    """
+    return knn_rows(features, np.arange(start, stop), k)
+
+
+def knn_rows(features: np.ndarray, rows: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return two (len(rows), k) arrays: the rows of the k nearest neighbours of each of the
+    given rows, closest first, and the distances to those neighbours.
+
+    A row is never its own neighbour. The rows are ranked in blocks of about BLOCK_SCORES
+    scores.
+
+    Preconditions:
+        - 0 < k < features.shape[0]
+    """
+    squared_norms = np.einsum('ij,ij->i', features, features)
+    block_size = max(1, BLOCK_SCORES // max(features.shape[0], 1))
+    found_rows, found_distances = [], []
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        block = features[block_rows]
+        squared = squared_norms[block_rows, None] + squared_norms[None, :] - 2.0 * (block @ features.T)
+        np.maximum(squared, 0.0, out=squared)
+        squared[np.arange(len(block_rows)), block_rows] = np.inf
+
+        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        # Recompute the chosen distances directly, since the expansion above loses precision
+        # when two restaurants are close.
+        nearest_distances = np.linalg.norm(features[nearest] - block[:, None, :], axis=2)
+        order = np.lexsort((nearest, nearest_distances), axis=1)
+        found_rows.append(np.take_along_axis(nearest, order, axis=1))
+        found_distances.append(np.take_along_axis(nearest_distances, order, axis=1))
+    if not found_rows:
+        return np.empty((0, k), dtype=np.intp), np.empty((0, k))
+    return np.concatenate(found_rows), np.concatenate(found_distances)
+
+
+def reverse_neighbours(features: np.ndarray, rows: np.ndarray, radii: np.ndarray) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the pairs (rows[i], j) such that row j is not rows[i] and rows[i] is closer to
+    row j than radii[j], as three arrays: the indices i, the rows j and the distances.
+
+    With radii[j] the distance from row j to its k-th nearest neighbour, these are the rows
+    that would gain rows[i] as one of their k nearest neighbours.
+    """
+    block_size = max(1, BLOCK_SCORES // max(features.shape[0], 1))
+    found_i, found_j, found_d = [], [], []
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        distances = np.zeros((len(block), features.shape[0]))
+        for column in range(features.shape[1]):
+            diff = features[None, :, column] - features[block, column, None]
+            distances += diff * diff
+        np.sqrt(distances, out=distances)
+        distances[np.arange(len(block)), block] = np.inf
+        i, j = np.nonzero(distances < radii[None, :])
+        found_i.append(i + start)
+        found_j.append(j)
+        found_d.append(distances[i, j])
+    if not found_i:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_d)
+
+
+def compute_knn(features: np.ndarray, k: int, processes: int = 1) \
+        -> tuple[np.ndarray, np.ndarray, KnnBuildReport]:
+    """Return the rows and distances of the k nearest neighbours of every row of features,
+    as computed by knn_block, along with a report of the time and memory used.
+
+    Preconditions:
+        - 0 < k < features.shape[0]
+        - processes >= 1
+    """
+    n = features.shape[0]
+    report = KnnBuildReport(k=k, processes=processes, restaurants=n)
+    block_size = max(1, BLOCK_SCORES // n)
+    blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+    neighbours = np.empty((n, k), dtype=np.intp)
+    distances = np.empty((n, k), dtype=np.float64)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+
+    if processes == 1:
+        _init_worker(features)
+        results = (_rank_block(bounds, k) for bounds in blocks)
+        for start, rows, dists in results:
+            neighbours[start:start + len(rows)] = rows
+            distances[start:start + len(rows)] = dists
+        _init_worker(np.empty((0, 3)))
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(features,)) as pool:
+            for start, rows, dists in pool.map(_rank_block, blocks, [k] * len(blocks)):
+                neighbours[start:start + len(rows)] = rows
+                distances[start:start + len(rows)] = dists
+        # ru_maxrss is reported in kilobytes on Linux.
+        report.worker_max_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    report.seconds = time.perf_counter() - start_time
+    report.peak_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    if not tracing:
+        tracemalloc.stop()
+    return neighbours, distances, report
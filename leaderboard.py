@@ -0,0 +1,274 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains Leaderboards, the top restaurants of a RestaurantTable by each
+ranking of RANKINGS (effective review rate, or number of pieces of feedback received), overall
+and within each category, each price range and each geographic cell.
+
+Each leaderboard keeps a sorted list of the LEADERBOARD_SIZE best restaurants of its partition,
+so the k best restaurants (for k up to that size) are read off the front of the list instead
+of ranking the whole catalog. Feedback changes the score of one restaurant, which is moved
+within the lists of its partitions with a binary search. A restaurant that drops below the
+end of a list leaves it, since a restaurant outside the list may now be better; the list is
+then one shorter, and only refilled from the whole partition when a query needs more
+restaurants than it holds.
+
+Restaurants added to or removed from the table are inserted into or deleted from the lists
+of their partitions the same way, so the leaderboards are never rebuilt for a catalog change.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import bisect
+import heapq
+import itertools
+import math
+from typing import Any, Iterable
+
+import numpy as np
+
+from restaurant_table import RestaurantTable
+
+# The ways restaurants are ranked: by effective review rate, or by the number of pieces of
+# feedback they received.
+RANKINGS = ('rating', 'feedback')
+
+# The number of restaurants each leaderboard keeps.
+LEADERBOARD_SIZE = 100
+
+# The side length (in degrees) of the geographic cells with their own leaderboards; about 2 km.
+LEADERBOARD_CELL_SIZE = 0.02
+
+# A partition of the restaurants: ('all', 0), ('category', c), ('price', p) or ('cell', (i, j)).
+Board = tuple[str, Any]
+
+
+class Leaderboards:
+    """The top restaurants of a RestaurantTable by each ranking, overall and within each
+    category, price range and geographic cell.
+
+    Instance Attributes:
+        - table: The table ranked.
+        - size: The number of restaurants each leaderboard keeps after feedback.
+        - cell_size: The side length (in degrees) of the geographic cells.
+
+    Representation Invariants:
+        - self.size >= 1
+        - self.cell_size > 0
+    """
+    table: RestaurantTable
+    size: int
+    cell_size: float
+    # Private Instance Attributes:
+    #     - _scores: Maps each ranking to the score of each row.
+    #     - _members: Maps each partition to its rows.
+    #     - _tops: Maps each (ranking, partition) to the sorted (-score, row) of the best rows
+    #       of the partition. The rows not in the list rank after the last one in it.
+    _scores: dict[str, np.ndarray]
+    _members: dict[Board, np.ndarray]
+    _tops: dict[tuple[str, Board], list[tuple[float, int]]]
+
+    def __init__(self, table: RestaurantTable, volumes: np.ndarray, size: int = LEADERBOARD_SIZE,
+                 cell_size: float = LEADERBOARD_CELL_SIZE) -> None:
+        """Initialize the leaderboards of the rows of the given table, where volumes[i] is the
+        number of pieces of feedback received by row i.
+
+        Preconditions:
+            - len(volumes) == len(table)
+            - size >= 1
+            - cell_size > 0
+        """
+        self.table = table
+        self.size = size
+        self.cell_size = cell_size
+        self._scores = {'rating': table.features[:, 2].copy(), 'feedback': np.asarray(volumes, dtype=np.float64)}
+        n = len(table)
+        rows = np.arange(n)
+        partitions = {'all': _partition(np.zeros(n, dtype=np.int64)),
+                      'category': _partition(table.features[:, 0].astype(np.int64)),
+                      'price': _partition(table.features[:, 1].astype(np.int64)),
+                      'cell': _partition(np.floor(table.locations / cell_size).astype(np.int64))}
+
+        self._members, self._tops = {}, {}
+        for ranking, scores in self._scores.items():
+            ranked = rows[np.lexsort((rows, -scores))]
+            for kind, (ids, keys) in partitions.items():
+                # A stable sort by partition keeps the rows of each partition in rank order.
+                grouped = ranked[np.argsort(ids[ranked], kind='stable')]
+                starts = np.flatnonzero(np.diff(ids[grouped], prepend=-1) != 0) if n else grouped
+                for start, end in zip(starts.tolist(), starts[1:].tolist() + [n]):
+                    board = (kind, keys[int(ids[grouped[start]])])
+                    top = grouped[start:min(end, start + size)]
+                    self._tops[(ranking, board)] = list(zip((-scores[top]).tolist(), top.tolist()))
+                    if board not in self._members:
+                        self._members[board] = np.sort(grouped[start:end])
+
+    def boards_of(self, row: int) -> list[Board]:
+        """Return the partitions the given row belongs to."""
+        category, price = self.table.features[row, :2].tolist()
+        lat, lon = self.table.locations[row].tolist()
+        return [('all', 0), ('category', int(category)), ('price', int(price)), ('cell', self.cell_of(lat, lon))]
+
+    def cell_of(self, lat: float, lon: float) -> tuple[int, int]:
+        """Return the geographic cell containing the given location."""
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def update(self, ranking: str, row: int, score: float) -> None:
+        """Change the score of the given row by the given ranking, and move it within the
+        leaderboards of its partitions.
+
+        Preconditions:
+            - ranking in RANKINGS
+        """
+        scores = self._scores[ranking]
+        old_key, new_key = (-float(scores[row]), row), (-score, row)
+        if old_key == new_key:
+            return
+        scores[row] = score
+        for board in self.boards_of(row):
+            top = self._tops[(ranking, board)]
+            i = bisect.bisect_left(top, old_key)
+            if i < len(top) and top[i] == old_key:
+                del top[i]
+            # The row can only be placed if it ranks before a row of the list, or if every
+            # other row of the partition is in the list.
+            if (top and new_key < top[-1]) or len(top) == len(self._members[board]) - 1:
+                bisect.insort(top, new_key)
+                if len(top) > self.size:
+                    top.pop()
+
+    def discard(self, rows: list[int]) -> None:
+        """Remove the given rows from their partitions and leaderboards, before they are removed
+        or changed in the table.
+        """
+        grouped = {}
+        for row in rows:
+            for board in self.boards_of(row):
+                grouped.setdefault(board, []).append(row)
+        for board, board_rows in grouped.items():
+            members = self._members[board]
+            self._members[board] = np.delete(members, np.searchsorted(members, board_rows))
+            for ranking, scores in self._scores.items():
+                top = self._tops[(ranking, board)]
+                for row in board_rows:
+                    key = (-float(scores[row]), row)
+                    i = bisect.bisect_left(top, key)
+                    if i < len(top) and top[i] == key:
+                        del top[i]
+
+    def truncate(self, n: int) -> None:
+        """Drop the scores of every row from row n on, after they were discarded and removed
+        from the table.
+        """
+        for ranking, scores in self._scores.items():
+            self._scores[ranking] = scores[:n]
+
+    def renumber(self, new_rows: np.ndarray) -> None:
+        """Move each row i to row new_rows[i], dropping the rows where it is -1, after the rows
+        dropped were discarded and the table renumbered the same way.
+
+        The leaderboards are emptied, so that each is refilled from its partition when it is
+        next read, rather than all at once.
+
+        Preconditions:
+            - new_rows[new_rows >= 0] is increasing
+        """
+        kept = np.flatnonzero(new_rows >= 0)
+        for ranking, scores in self._scores.items():
+            self._scores[ranking] = scores[kept]
+        for board, members in self._members.items():
+            self._members[board] = new_rows[members]
+        for top in self._tops.values():
+            top.clear()
+
+    def add(self, rows: list[int], volumes: list[float]) -> None:
+        """Insert the given rows into their partitions and leaderboards, after they were added
+        or changed in the table, where volumes[i] is the number of pieces of feedback received
+        by rows[i].
+
+        Preconditions:
+            - len(volumes) == len(rows)
+        """
+        n = len(self.table)
+        for ranking, scores in self._scores.items():
+            if len(scores) < n:
+                self._scores[ranking] = np.concatenate([scores, np.zeros(n - len(scores))])
+        grouped = {}
+        for row, volume in zip(rows, volumes):
+            self._scores['rating'][row] = self.table.features[row, 2]
+            self._scores['feedback'][row] = volume
+            for board in self.boards_of(row):
+                grouped.setdefault(board, []).append(row)
+        for board, board_rows in grouped.items():
+            members = self._members.get(board, np.empty(0, dtype=np.int64))
+            board_rows.sort()
+            self._members[board] = np.insert(members, np.searchsorted(members, board_rows), board_rows)
+            for ranking, scores in self._scores.items():
+                top = self._tops.setdefault((ranking, board), [])
+                # As in update, a row can only be placed if it ranks before a row of the list,
+                # or if the list holds every other row of the partition.
+                complete = len(top) == len(members)
+                for row in board_rows:
+                    key = (-float(scores[row]), row)
+                    if complete or (top and key < top[-1]):
+                        bisect.insort(top, key)
+                        if len(top) > self.size:
+                            top.pop()
+                            complete = False
+
+    def top(self, ranking: str, board: Board, k: int, exclude: Iterable[int] = ()) -> list[int]:
+        """Return the k best rows of the given partition by the given ranking (or all of them,
+        if there are fewer), from the best to the worst, skipping the rows in exclude. Ties
+        are broken by row.
+
+        Preconditions:
+            - ranking in RANKINGS
+        """
+        exclude = set(exclude)
+        return list(itertools.islice((row for _, row in self._top_keys(ranking, board, k + len(exclude))
+                                      if row not in exclude), k))
+
+    def near(self, ranking: str, lat: float, lon: float, k: int, exclude: Iterable[int] = ()) -> list[int]:
+        """Return the k best rows by the given ranking in the geographic cell of the given
+        location and the eight cells around it (or all of them, if there are fewer), as top
+        does.
+
+        Preconditions:
+            - ranking in RANKINGS
+        """
+        exclude = set(exclude)
+        i, j = self.cell_of(lat, lon)
+        lists = [self._top_keys(ranking, ('cell', (i + di, j + dj)), k + len(exclude))
+                 for di in (-1, 0, 1) for dj in (-1, 0, 1)]
+        return list(itertools.islice((row for _, row in heapq.merge(*lists) if row not in exclude), k))
+
+    def _top_keys(self, ranking: str, board: Board, count: int) -> list[tuple[float, int]]:
+        """Return the list of the best (-score, row) of the given partition by the given
+        ranking, refilling it first if it holds fewer than count of them and the partition has
+        more. The list is empty if the partition has no rows.
+        """
+        members = self._members.get(board)
+        if members is None:
+            return []
+        top = self._tops[(ranking, board)]
+        if len(top) < min(count, len(members)):
+            scores = self._scores[ranking][members]
+            best = np.lexsort((members, -scores))[:max(count, self.size)]
+            top[:] = zip((-scores[best]).tolist(), members[best].tolist())
+        return top
+
+
+def _partition(values: np.ndarray) -> tuple[np.ndarray, list[Any]]:
+    """Return the number of the partition of each of the given values (or rows of values),
+    numbered from 0 in sorted order, and the list of the value of each partition (as a tuple
+    for rows of values).
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64), []
+    keys, ids = np.unique(values, axis=0, return_inverse=True)
+    return ids.reshape(-1), [tuple(key) if values.ndim > 1 else key for key in keys.tolist()]
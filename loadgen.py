@@ -0,0 +1,147 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module generates load against a running FOODER service (see service.py) and
+reports its throughput and latency percentiles.
+
+Each simulated client keeps one HTTP connection open and sends requests back to back,
+picking a random endpoint, restaurant, user and location for each one.
+
+Run it from the project directory while the service is running:
+
+    python loadgen.py --port 8080 --clients 32 --requests 5000
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import csv
+import json
+import random
+import time
+from urllib.parse import urlencode
+
+# The endpoints requested, and how often each one is picked relative to the others.
+ENDPOINT_WEIGHTS = {'recommend': 4, 'similar': 4, 'nearby': 2, 'feedback': 1}
+
+# The box (min lat, min lon, max lat, max lon) that simulated users stand in.
+AREA = (43.59, -79.60, 43.82, -79.20)
+
+
+def restaurant_names(rest_file: str) -> list[str]:
+    """Return the restaurant names in the given CSV file."""
+    with open(rest_file, 'r') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        return list({row[2] for row in reader})
+
+
+def make_request(names: list[str], users: int) -> tuple[str, str, bytes]:
+    """Return the method, target and body of a random request."""
+    endpoint = random.choices(list(ENDPOINT_WEIGHTS), weights=list(ENDPOINT_WEIGHTS.values()))[0]
+    location = {'lat': random.uniform(AREA[0], AREA[2]), 'lon': random.uniform(AREA[1], AREA[3])}
+    user = f'load-user-{random.randrange(users)}'
+    if endpoint == 'recommend':
+        return 'GET', '/recommend?' + urlencode(dict(location, user=user)), b''
+    elif endpoint == 'similar':
+        return 'GET', '/similar?' + urlencode(dict(location, name=random.choice(names))), b''
+    elif endpoint == 'nearby':
+        return 'GET', '/nearby?' + urlencode(dict(location, radius=1.0)), b''
+    body = {'user': user, 'restaurant': random.choice(names), 'feedback': random.choice(['yes', 'no'])}
+    return 'POST', '/feedback', json.dumps(body).encode('utf-8')
+
+
+async def run_client(host: str, port: int, count: int, names: list[str], users: int,
+                     latencies: list[float], errors: list[int]) -> None:
+    """Send count random requests over one connection, appending the latency of each
+    successful request to latencies and the status of each failed one to errors.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            method, target, body = make_request(names, users)
+            start = time.perf_counter()
+            writer.write(f'{method} {target} HTTP/1.1\r\nHost: {host}\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                if key.strip().lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Return the p-th percentile (0 <= p <= 100) of the given sorted values.
+
+    Preconditions:
+        - values == sorted(values)
+        - values != []
+    """
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_load(host: str, port: int, clients: int, requests: int, names: list[str],
+                   users: int = 1000) -> dict[str, float]:
+    """Send the given number of requests from the given number of concurrent clients, and
+    return the throughput and latency statistics (latencies in milliseconds).
+    """
+    latencies = []
+    errors = []
+    per_client = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, count, names, users, latencies, errors)
+                           for count in per_client if count > 0))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {'requests': len(latencies) + len(errors),
+            'errors': len(errors),
+            'seconds': elapsed,
+            'requests_per_second': (len(latencies) + len(errors)) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000 if latencies else 0.0,
+            'p99_ms': percentile(latencies, 99) * 1000 if latencies else 0.0,
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0}
+
+
+def main() -> None:
+    """Run the load generator with the command-line options and print its report."""
+    parser = argparse.ArgumentParser(description='Generate load against the FOODER service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--clients', type=int, default=32, help='the number of concurrent connections')
+    parser.add_argument('--requests', type=int, default=5000, help='the total number of requests')
+    parser.add_argument('--csv', default='filtered_restaurant_dt_4d.csv', help='where to take restaurant names')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.host, args.port, args.clients, args.requests, restaurant_names(args.csv)))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['requests']} requests ({report['errors']} errors) in {report['seconds']:.2f}s: "
+              f"{report['requests_per_second']:.0f} req/s, p50 {report['p50_ms']:.2f} ms, "
+              f"p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
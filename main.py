@@ -10,8 +10,9 @@ Copyright and Usage Information
 
 This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
 """
-import recommender_4d_ver
+import user_location
 from recommender_4d_ver import CategoryGraph, AllUsers, User, load_graph, get_price_range
+from user_store import UserStore
 
 
 
@@ -31,15 +32,19 @@ if __name__ == "__main__":
         'max-line-length': 120,
     })
 
-    ip = recommender_4d_ver.get_location_from_ip()
-    restaurant_graph = load_graph("filtered_restaurant_dt_4d.csv")
+    # Find the user's location while the restaurant graph loads.
+    location_future = user_location.resolve_location_async()
+    restaurant_graph = load_graph("filtered_restaurant_dt_4d.csv", snapshot_path="restaurant_snapshot")
+    ip = location_future.result()
+
+    # The users are kept in a database, so they are remembered across rounds and runs.
+    all_users = AllUsers(UserStore("fooder_users.db", restaurant_graph))
+    user = None
 
     quit_game = False
     while not quit_game:
         new_game = False
         print("Welcome!This is the restaurant recommender FOODER. \n")
-        all_users = AllUsers()
-        user = None
 
         while not new_game:
             user_name = input('Pleaser enter your name: \n')
@@ -80,13 +85,13 @@ if __name__ == "__main__":
                 if 'yes' in satisfy:
                     print(f"\nI'm so glad to hear that! I will recommend you more restaurants like "
                           f"{final_rest.name} in future recommendations.\n")
-                    user.last_visited_restaurant.calculate_user_feedback('yes')
+                    restaurant_graph.record_feedback(user.last_visited_restaurant.name, 'yes', user.name)
+                    user.like(user.last_visited_restaurant)
                 else:
                     print("\nWe are sorry to hear that you didn't enjoy it. We will avoid recommending "
                           "it in the future.\n")
-                    user.disliked_restaurants.add(user.last_visited_restaurant)
-                    user.last_visited_restaurant.calculate_user_feedback('no')
-                    user.last_visited_restaurant = None
+                    restaurant_graph.record_feedback(user.last_visited_restaurant.name, 'no', user.name)
+                    user.dislike(user.last_visited_restaurant)
 
             else:
                 final_rest = None
@@ -100,7 +105,7 @@ if __name__ == "__main__":
                 if 'yes' in try_random.lower():
                     final_rest = random_rest
                 elif 'no' in try_random.lower():
-                    print('\nThen I\'ll recommend you 5 random resturants: ')
+                    print('\nThen I\'ll recommend you 5 popular resturants near you: ')
                     random_rests = user.recommend_restaurants(restaurant_graph, ip)
                     for rest in random_rests:
                         print(f'{rest.name}')
@@ -109,7 +114,7 @@ if __name__ == "__main__":
                     if satisfied_rest == 'quit':
                         quit_game = True
                         break
-                    while satisfied_rest not in random_rests:
+                    while satisfied_rest not in [rest.name for rest in random_rests]:
                         satisfied_rest = input("I couldn't understand what you said, please follow the instruction:)")
                     final_rest = CategoryGraph.get_vertex(restaurant_graph, satisfied_rest)
                     record_last_visited(user, restaurant_graph, satisfied_rest)
@@ -127,14 +132,15 @@ if __name__ == "__main__":
                 if 'yes' in satisfy:
                     print(f"\nI'm so glad to hear that! I will recommend you more restaurants like "
                           f"{final_rest.name} in future recommendations.\n")
-                    user.last_visited_restaurant.calculate_user_feedback('yes')
+                    restaurant_graph.record_feedback(user.last_visited_restaurant.name, 'yes', user.name)
+                    user.like(user.last_visited_restaurant)
                 else:
                     print("\nWe are sorry to hear that you didn't enjoy it. We will avoid recommending "
                           "it in the future.\n")
-                    user.disliked_restaurants.add(user.last_visited_restaurant)
-                    user.last_visited_restaurant.calculate_user_feedback('no')
-                    user.last_visited_restaurant = None
+                    restaurant_graph.record_feedback(user.last_visited_restaurant.name, 'no', user.name)
+                    user.dislike(user.last_visited_restaurant)
 
+            all_users.save_user(user)
             again = input('Do you want to get more recommendations? Pleaser enter \'new round\' or \'quit\':\n')
             while again not in ['new round', 'quit']:
                 again = input("I couldn't understand what you said, please follow the instruction:)")
@@ -142,4 +148,7 @@ if __name__ == "__main__":
                 quit_game = True
                 break
 
+    if user is not None:
+        all_users.save_user(user)
+    all_users.close()
     print('\nThank you for choosing the best restaurant recommender FOODER! It\'s our pleasure to assist you!')
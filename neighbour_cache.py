@@ -0,0 +1,212 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains NeighbourCache, which keeps the edges that
+CategoryGraph.similar_rest_all_connected adds to the graph bounded.
+
+Every restaurant may keep at most a fixed number of these edges. When linking a restaurant to
+its most similar restaurants pushes one of them over the limit, the cache picks edges to evict
+with one of two policies:
+
+    - 'score': evict the edge with the highest similarity score (the least similar neighbour).
+    - 'lru': evict the edge that was least recently linked or returned.
+
+The cache also remembers the last similar restaurants found for each restaurant, along with
+the location bucket of the user and the rating version they were found for, so that they can be
+returned again without being recomputed. Each is kept as a SimilarResult, which also records
+what the graph needs to tell whether a change to the catalog could alter it.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+import math
+from typing import Any
+
+EVICTION_POLICIES = ('score', 'lru')
+
+
+def location_bucket(ip: tuple[float, float], size: float) -> tuple[int, int]:
+    """Return the bucket of the square grid with the given cell size that ip falls in.
+
+    >>> location_bucket((43.6532, -79.3832), 0.01)
+    (4365, -7939)
+    """
+    return math.floor(ip[0] / size), math.floor(ip[1] / size)
+
+
+@dataclass(frozen=True)
+class SimilarResult:
+    """The restaurants most similar to a base restaurant for a user at some location.
+
+    Instance Attributes:
+        - names: The names of the most similar restaurants, from the most to the least similar.
+        - pool: The names of the candidates they were picked from, which is names itself
+        unless they were re-ranked for diversity.
+        - ip: The location of the user.
+        - bound: The largest similarity score of a candidate in pool, or infinity if fewer
+        candidates were found than were asked for, so that a restaurant scoring at most bound
+        could have been one of them.
+    """
+    names: list[str]
+    pool: list[str]
+    ip: tuple[float, float]
+    bound: float
+
+
+class NeighbourCache:
+    """The bounded edges added by similar_rest_all_connected, and its last results.
+
+    Instance Attributes:
+        - capacity: The maximum number of cached edges of each restaurant.
+        - policy: The eviction policy, 'score' or 'lru'.
+        - evictions: The number of edges evicted so far.
+
+    Representation Invariants:
+        - self.capacity >= 1
+        - self.policy in EVICTION_POLICIES
+        - all(len(edges) <= self.capacity for edges in self._edges.values())
+    """
+    capacity: int
+    policy: str
+    evictions: int
+    # Private Instance Attributes:
+    #     - _edges: Maps a restaurant to the {neighbour: similarity score} of its cached edges,
+    #       from the least to the most recently used. Both directions of an edge are kept.
+    #     - _results: Maps a restaurant to the location bucket and rating version its last
+    #       similar restaurants were found for, and those restaurants.
+    _edges: dict[Any, OrderedDict[Any, float]]
+    _results: dict[Any, tuple[tuple[int, int], int, SimilarResult]]
+
+    def __init__(self, capacity: int, policy: str = 'score') -> None:
+        """Initialize an empty cache keeping at most capacity edges per restaurant, evicting
+        with the given policy.
+
+        Raise a ValueError if the policy is unknown or the capacity is below 1.
+        """
+        if policy not in EVICTION_POLICIES or capacity < 1:
+            raise ValueError(f'invalid neighbour cache: capacity {capacity}, policy {policy!r}')
+        self.capacity = capacity
+        self.policy = policy
+        self.evictions = 0
+        self._edges = {}
+        self._results = {}
+
+    def lookup(self, name: Any, bucket: tuple[int, int], version: int) -> list[str] | None:
+        """Return the last similar restaurants found for name, if they were found for the given
+        location bucket and rating version, and None otherwise.
+
+        The edges to the returned restaurants count as used.
+        """
+        entry = self._results.get(name)
+        if entry is None or entry[0] != bucket or entry[1] != version:
+            return None
+        edges = self._edges.get(name, {})
+        for other in entry[2].names:
+            if other in edges:
+                edges.move_to_end(other)
+        return entry[2].names
+
+    def store(self, name: Any, bucket: tuple[int, int], version: int, similar: SimilarResult) -> None:
+        """Remember that similar are the similar restaurants of name for the given location
+        bucket and rating version.
+        """
+        self._results[name] = (bucket, version, similar)
+
+    def results(self) -> list[tuple[Any, int, SimilarResult]]:
+        """Return each restaurant with a remembered result, with the rating version and the
+        similar restaurants it was found for.
+        """
+        return [(name, version, similar) for name, (_, version, similar) in self._results.items()]
+
+    def forget_result(self, name: Any) -> None:
+        """Forget the remembered result of name, if there is one, keeping its edges."""
+        self._results.pop(name, None)
+
+    def link(self, name: Any, scores: dict[Any, float]) -> list[tuple[Any, Any]]:
+        """Record edges from name to each restaurant in scores, with the given similarity scores,
+        and return the edges that must be evicted to stay within capacity.
+
+        The new edges are never evicted by this call.
+
+        Preconditions:
+            - len(scores) <= self.capacity
+            - name not in scores
+        """
+        edges = self._edges.setdefault(name, OrderedDict())
+        for other, score in scores.items():
+            edges[other] = score
+            edges.move_to_end(other)
+            other_edges = self._edges.setdefault(other, OrderedDict())
+            other_edges[name] = score
+            other_edges.move_to_end(name)
+
+        evicted = []
+        for restaurant in [name, *scores]:
+            protected = scores if restaurant == name else {name}
+            while len(self._edges[restaurant]) > self.capacity:
+                victim = self._victim(restaurant, protected)
+                self._forget_edge(restaurant, victim)
+                evicted.append((restaurant, victim))
+        self.evictions += len(evicted)
+        return evicted
+
+    def reconfigure(self, capacity: int, policy: str) -> list[tuple[Any, Any]]:
+        """Change the capacity and eviction policy, and return the edges that must be evicted
+        to stay within the new capacity.
+
+        Raise a ValueError if the policy is unknown or the capacity is below 1.
+        """
+        if policy not in EVICTION_POLICIES or capacity < 1:
+            raise ValueError(f'invalid neighbour cache: capacity {capacity}, policy {policy!r}')
+        self.capacity = capacity
+        self.policy = policy
+        evicted = []
+        for restaurant in list(self._edges):
+            while len(self._edges[restaurant]) > capacity:
+                victim = self._victim(restaurant, set())
+                self._forget_edge(restaurant, victim)
+                evicted.append((restaurant, victim))
+        self.evictions += len(evicted)
+        return evicted
+
+    def forget(self, name: Any) -> list[Any]:
+        """Forget every cached edge and result of name, and return the restaurants it had
+        cached edges to.
+        """
+        self._results.pop(name, None)
+        others = list(self._edges.pop(name, {}))
+        for other in others:
+            self._edges[other].pop(name, None)
+        return others
+
+    def clear_results(self) -> None:
+        """Forget every remembered result, keeping the edges."""
+        self._results.clear()
+
+    def edge_count(self) -> int:
+        """Return the number of cached edges."""
+        return sum(len(edges) for edges in self._edges.values()) // 2
+
+    def _victim(self, name: Any, protected: Any) -> Any:
+        """Return the cached neighbour of name that the policy evicts first, other than the
+        restaurants in protected.
+
+        Preconditions:
+            - any(other not in protected for other in self._edges[name])
+        """
+        candidates = (other for other in self._edges[name] if other not in protected)
+        if self.policy == 'lru':
+            return next(candidates)
+        return max(candidates, key=self._edges[name].__getitem__)
+
+    def _forget_edge(self, name1: Any, name2: Any) -> None:
+        """Forget the cached edge between name1 and name2."""
+        self._edges[name1].pop(name2, None)
+        self._edges[name2].pop(name1, None)
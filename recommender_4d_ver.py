@@ -13,15 +13,84 @@ Copyright and Usage Information
 This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
 """
 from __future__ import annotations
-import csv
-from typing import Any
+from collections import deque
+from collections.abc import Iterator, MutableMapping
+from typing import Any, Iterable, TYPE_CHECKING
 
 import math
 import random
-import requests
+import threading
+import time
+import numpy as np
+
+import geodistance
+import user_location
+
+from ann_index import IvfIndex
+from caching import LRUCache
+from diversity import mmr_order
+from feedback import FeedbackLog, adjusted_rating
+from filter_index import FilterIndex, RestaurantFilter
+from graph_walk import WalkGraph, personalized_pagerank, push_pagerank
+from instrumentation import METRICS, timed
+from knn_build import KnnBuildReport, compute_knn, knn_rows, reverse_neighbours
+from leaderboard import Leaderboards
+from neighbour_cache import NeighbourCache, SimilarResult, location_bucket
+from restaurant_table import RestaurantTable
+from sampling import FenwickTree, sample_rows
+from sharding import ShardedCatalog
+import ingest
+import snapshot
+from spatial_index import GridIndex
+
+if TYPE_CHECKING:
+    from user_store import UserStore
 
 PRICE_RANGE = {1: 'Under $10', 2: '$11-30', 3: '$31-60', 4: 'Above $61'}
 
+# The number of scores computed at once by recommend_batch. Small enough for the score
+# matrix of a block of users to stay in the CPU cache.
+BATCH_BLOCK_SCORES = 1 << 18
+
+# The side length (in degrees) of a cell of the spatial index over restaurant locations.
+GRID_CELL_SIZE = 0.01
+
+# The default maximum number of edges that similar_rest_all_connected keeps for each restaurant.
+NEIGHBOUR_CAPACITY = 20
+
+# The side length (in degrees) of the location buckets that the results of
+# similar_rest_all_connected are reused within; about 500 m.
+LOCATION_BUCKET_SIZE = 0.005
+
+# The default number of results of most_similar_restaurants that are memoized.
+SIMILAR_MEMO_SIZE = 4096
+
+# The side length (in degrees) of the location cells that the results of
+# most_similar_restaurants are reused within; about 100 m.
+SIMILAR_MEMO_CELL_SIZE = 0.001
+
+# How far above the bound of a remembered similarity result (see SimilarResult) a restaurant
+# added or changed by apply_changes may score and still be taken to reach it, to allow for rounding.
+STALE_SCORE_TOLERANCE = 1e-9
+
+# The default number of lists of the approximate search index that are searched per query.
+ANN_NPROBE = 8
+
+# The default number of candidates that most_similar_restaurants re-ranks for diversity, and
+# the weight of their relevance against their novelty (see diversity.mmr_order).
+MMR_POOL_SIZE = 200
+MMR_TRADE_OFF = 0.7
+
+# The number of liked restaurants each user remembers.
+USER_HISTORY_SIZE = 500
+
+# The ways most_similar_to_many can combine the scores of a restaurant with several restaurants.
+ANCHOR_AGGREGATES = ('mean', 'max')
+
+# The number of most recently liked restaurants that most_similar_to_many compares every
+# restaurant with when aggregating by 'max', so its cost does not grow with the history.
+MAX_ANCHORS = 32
+
 
 def get_price_range(num: int) -> str:
     """
@@ -31,27 +100,13 @@ def get_price_range(num: int) -> str:
     return PRICE_RANGE[num]
 
 
-def get_location_from_ip() -> tuple[float, float]:
+def get_location_from_ip(provider: user_location.LocationProvider | None = None) -> tuple[float, float]:
     """
     Get the current location (latitude and longitude) based on the public IP address of the user.
-    """
-    response = requests.get('https://api64.ipify.org?format=json').json()
-    ip_address = response['ip']
-
-    location_response = requests.get(f'https://ipinfo.io/{ip_address}/json').json()
-    lat, lon = map(float, location_response.get('loc', '0,0').split(','))
-    return lat, lon
-
 
-def calculate_euclidean_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    The location comes from the given provider, or user_location.default_provider() if it is None.
     """
-    Calculate the distance between two points using the Euclidean distance formula.
-    """
-    p1 = (lat1, lon1)
-    p2 = (lat2, lon2)
-
-    distance = math.dist(p1, p2)
-    return distance
+    return user_location.resolve_location(provider)
 
 
 class _Vertex:
@@ -75,6 +130,7 @@ class _Vertex:
         - (c in range(1, 13) for c in self.category)
         - (p in range(1, 5) for p in self.price_range)
     """
+    __slots__ = ('category', 'address', 'name', 'price_range', 'review_rate', 'location', 'neighbours')
     category: int
     address: str
     name: Any
@@ -153,6 +209,12 @@ class Graph:
         else:
             raise ValueError
 
+    def has_vertex(self, name: Any) -> bool:
+        """
+        Return whether name appears as a vertex in this graph.
+        """
+        return name in self._vertices
+
     def adjacent(self, name1: Any, name2: Any) -> bool:
         """
         Return whether name1 and name2 are adjacent vertices in this graph.
@@ -211,6 +273,7 @@ class _CategoryVertex(_Vertex):
         - (p in range(1, 5) for p in self.price_range)
         - 0 <= self.review_rate <= 5
     """
+    __slots__ = ()
     category: int
     address: str
     name: Any
@@ -237,42 +300,179 @@ class _CategoryVertex(_Vertex):
     def is_within_distance(self, user_lat: float, user_lon: float, max_distance: float) \
             -> bool:
         """
-        Determine if the restaurant is within the maximum distance from the user's location.
+        Determine if the restaurant is within the maximum distance (in kilometres) from the
+        user's location.
         """
         res_lat, res_lon = self.location
-        return calculate_euclidean_distance(user_lat, user_lon, res_lat, res_lon) <= max_distance
+        return geodistance.distance_km(user_lat, user_lon, res_lat, res_lon) <= max_distance
 
     def similarity_score(self, other: _CategoryVertex, ip: tuple[float, float]) -> float:
         """
         Calculate the Euclidean distance between two restaurants in 4-dimensions such that
-        the coordinates are represented as category, prince range, review rate, and the Euclidean
-        distance between the restaurant and the user. The value returned is the similarity_score.
+        the coordinates are represented as category, prince range, review rate, and the distance
+        in kilometres between the restaurant and the user (see geodistance). The value returned
+        is the similarity_score.
         """
+        if METRICS.enabled:
+            METRICS.count('fooder_similarity_scores_total', path='vertex')
         p0_lat, p0_lon = ip
         p1_lat, p1_lon = self.location
         p2_lat, p2_lon = other.location
         p1 = (self.category, self.price_range, self.review_rate,
-              calculate_euclidean_distance(p0_lat, p0_lon, p1_lat, p1_lon))
+              geodistance.distance_km(p0_lat, p0_lon, p1_lat, p1_lon))
         p2 = (other.category, other.price_range, other.review_rate,
-              calculate_euclidean_distance(p0_lat, p0_lon, p2_lat, p2_lon))
+              geodistance.distance_km(p0_lat, p0_lon, p2_lat, p2_lon))
 
         distance = math.sqrt(sum((float(p1[i]) - float(p2[i])) ** 2 for i in range(4)))
         return distance
 
-    def calculate_user_feedback(self, feedback: str) -> None:
+    def calculate_user_feedback(self, feedback: str) -> float:
         """
-        Calculate the user feedback / review rate.
+        Return the review rate this restaurant would have after the given user feedback.
+
+        The review rate of the vertex itself never changes: CategoryGraph.record_feedback keeps
+        the effective review rates that result from feedback in a feedback.FeedbackLog.
         """
-        if 'yes' in feedback.lower():
-            if self.review_rate < 3.0:
-                self.review_rate += 0.5
-            elif self.review_rate < 5.0:
-                self.review_rate += 0.2
-        else:
-            if self.review_rate <= 0.5:
-                self.review_rate = 0.0
-            else:
-                self.review_rate -= 0.2
+        return adjusted_rating(self.review_rate, feedback)
+
+
+class _SnapshotVertex(_CategoryVertex):
+    """A vertex loaded from a snapshot, whose edges are only read from the snapshot's CSR
+    columns the first time its neighbours are used.
+    """
+    __slots__ = ('_edges', '_source', '_row')
+    # Private Instance Attributes:
+    #     - _edges: The neighbours of this vertex, or None if they have not been read yet.
+    #     - _source: The vertices of the snapshot this vertex was loaded from.
+    #     - _row: The row of this vertex in the snapshot.
+    _edges: dict[_CategoryVertex, float] | None
+    _source: _SnapshotVertices
+    _row: int
+
+    def __init__(self, source: _SnapshotVertices, row: int) -> None:
+        """Initialize the vertex in the given row of the given snapshot vertices."""
+        category, price_range, review_rate = source.features[row].tolist()
+        lat, lon = source.locations[row].tolist()
+        self.category = int(category)
+        self.address = source.address(row)
+        self.name = source.names[row]
+        self.price_range = int(price_range)
+        self.review_rate = review_rate
+        self.location = (lat, lon)
+        self._source = source
+        self._row = row
+        self._edges = None
+
+    @property
+    def neighbours(self) -> dict[_CategoryVertex, float]:
+        """The vertices adjacent to this vertex, mapped to the weights of the edges."""
+        if self._edges is None:
+            self._edges = self._source.edges_of(self._row)
+        return self._edges
+
+    @neighbours.setter
+    def neighbours(self, value: dict[_CategoryVertex, float]) -> None:
+        """Replace the neighbours of this vertex."""
+        self._edges = value
+
+
+class _SnapshotVertices(MutableMapping):
+    """The _vertices mapping of a CategoryGraph loaded from a snapshot, which only creates the
+    vertex of a restaurant when it is first looked up, from the snapshot's memory-mapped
+    columns. The vertices added later are stored as they are.
+
+    Instance Attributes:
+        - names: The name of each row of the snapshot.
+        - features: The (category, price range, base review rate) of each row of the snapshot.
+        - locations: The (latitude, longitude) of each row of the snapshot.
+
+    Representation Invariants:
+        - len(self.names) == len(self.features) == len(self.locations)
+    """
+    names: list[Any]
+    features: np.ndarray
+    locations: np.ndarray
+    # Private Instance Attributes:
+    #     - _entries: Maps each name to its vertex, or to its row of the snapshot if its vertex
+    #       has not been created yet, in the order of the rows.
+    #     - _columns: The address and edge columns of the snapshot (see CategoryGraph.save_snapshot).
+    #     - _changed: Whether a vertex was added, replaced or removed, or its edges read.
+    _entries: dict[Any, _CategoryVertex | int]
+    _columns: dict[str, np.ndarray]
+    _changed: bool
+
+    def __init__(self, names: list[Any], columns: dict[str, np.ndarray]) -> None:
+        """Initialize the mapping of the restaurants with the given names, the rows of the
+        given snapshot columns.
+        """
+        self.names = names
+        self.features = columns['features']
+        self.locations = columns['locations']
+        self._columns = columns
+        self._entries = dict(zip(names, range(len(names))))
+        self._changed = False
+
+    def __getitem__(self, name: Any) -> _CategoryVertex:
+        """Return the vertex of the given restaurant, creating it first if needed."""
+        entry = self._entries[name]
+        if isinstance(entry, int):
+            entry = _SnapshotVertex(self, entry)
+            self._entries[name] = entry
+        return entry
+
+    def __setitem__(self, name: Any, vertex: _CategoryVertex) -> None:
+        """Set the vertex of the given restaurant.
+
+        A vertex replaced keeps its edges, as in a dictionary, so the edges of its neighbours
+        that were not read yet are read first, to point to it rather than to the new vertex.
+        """
+        self._changed = True
+        if name in self._entries:
+            for u in self[name].neighbours:
+                _ = u.neighbours
+        self._entries[name] = vertex
+
+    def __delitem__(self, name: Any) -> None:
+        """Remove the vertex of the given restaurant."""
+        self._changed = True
+        del self._entries[name]
+
+    def __contains__(self, name: Any) -> bool:
+        """Return whether there is a restaurant with the given name."""
+        return name in self._entries
+
+    def __iter__(self) -> Iterator[Any]:
+        """Return an iterator over the restaurant names."""
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        """Return the number of restaurants."""
+        return len(self._entries)
+
+    def address(self, row: int) -> str:
+        """Return the address of the given row of the snapshot."""
+        offsets = self._columns['address_offsets']
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return self._columns['address_bytes'][start:end].tobytes().decode('utf-8')
+
+    def edges_of(self, row: int) -> dict[_CategoryVertex, float]:
+        """Return a new dictionary mapping the vertex of each neighbour of the given row of
+        the snapshot to the weight of the edge.
+        """
+        self._changed = True
+        start, end = int(self._columns['edge_indptr'][row]), int(self._columns['edge_indptr'][row + 1])
+        others = self._columns['edge_indices'][start:end].tolist()
+        weights = self._columns['edge_weights'][start:end].tolist()
+        return {self[self.names[other]]: weight for other, weight in zip(others, weights)}
+
+    def snapshot_edges(self) -> dict[str, np.ndarray] | None:
+        """Return the edge columns of the snapshot if they are still the edges of the graph
+        (no vertex was added, replaced or removed, and no edges were read, so none changed),
+        and None otherwise.
+        """
+        if self._changed:
+            return None
+        return {key: self._columns[key] for key in ('edge_indptr', 'edge_indices', 'edge_weights')}
 
 
 class CategoryGraph(Graph):
@@ -284,12 +484,117 @@ class CategoryGraph(Graph):
     # Private Instance Attributes:
     #     - _vertices:
     #         A collection of the vertices contained in this graph.
-    #         Maps item to _WeightedVertex object.
+    #         Maps item to _WeightedVertex object. For a graph loaded from a snapshot, this is
+    #         a _SnapshotVertices, which creates each vertex when it is first looked up.
+    #     - _table:
+    #         The NumPy feature table used to rank restaurants by similarity, or None if it
+    #         has not been built since the vertices last changed.
+    #     - _grid:
+    #         The spatial index over the rows of _table, or None if it has not been built.
+    #     - _knn_k:
+    #         The number of nearest neighbours precomputed for each vertex by build_knn_edges,
+    #         or 0 if the edges are added lazily by similar_rest_all_connected instead.
+    #     - _knn_report:
+    #         The report of the last build_knn_edges, or None if it was never called.
+    #     - _feedback:
+    #         The log of user feedback, which holds the effective review rates of the
+    #         restaurants. The review rates of the vertices are the base ones, and never change.
+    #     - _neighbour_cache:
+    #         The edges added by similar_rest_all_connected, which it keeps bounded, and its
+    #         last result for each restaurant.
+    #     - _similar_memo:
+    #         The memoized results of most_similar_restaurants, keyed on the base restaurant,
+    #         the user's location cell, the rating version, k and the filter, or None if
+    #         memoization is off.
+    #     - _rating_tree:
+    #         The effective review rates of the rows of _table, used to sample restaurants by
+    #         rating, or None if it has not been built since the table was.
+    #     - _filter_index:
+    #         The inverted index over the rows of _table used to filter restaurants by
+    #         category, price range and rating, or None if it has not been built since the
+    #         table was.
+    #     - _leaderboards:
+    #         The best rows of _table by rating and by feedback volume, overall and by
+    #         category, price range and location, or None if they have not been built since
+    #         the table was.
+    #     - _mmr_pool:
+    #         The number of candidates that most_similar_restaurants re-ranks for diversity,
+    #         or 0 if it returns the most similar restaurants as they are.
+    #     - _mmr_trade_off:
+    #         The weight of relevance against novelty when re-ranking for diversity.
+    #     - _ann_nprobe:
+    #         The number of lists of _ann_index that most_similar_restaurants searches, or 0 if
+    #         it searches every restaurant exactly.
+    #     - _ann_lists:
+    #         The number of lists of _ann_index, or None for about the square root of the
+    #         number of restaurants.
+    #     - _ann_index:
+    #         The approximate search index over the rows of _table, or None if it has not
+    #         been built since the table was.
+    #     - _shard_count:
+    #         The number of worker processes that most_similar_restaurants scores in, or 0 if
+    #         it scores in this process.
+    #     - _partition:
+    #         How the restaurants are partitioned between the worker processes.
+    #     - _shards:
+    #         The worker processes scoring the rows of _table, or None if they have not been
+    #         started. They keep running when the rows change, and are brought up to date.
+    #     - _walk_graph:
+    #         The random walk along the edges, over the rows of _table, or None if it has not
+    #         been built since the table or the edges were last replaced as a whole.
+    #     - _walk_dirty:
+    #         The restaurants whose edges changed since _walk_graph was built or patched.
+    #     - _lock:
+    #         Held while the structures above are built or changed (by feedback, catalog changes
+    #         and configuration), and while the ones changed in place are read, so the graph
+    #         can be shared by the threads of the service.
     _vertices: dict[Any, _CategoryVertex]
+    _table: RestaurantTable | None
+    _grid: GridIndex | None
+    _knn_k: int
+    _knn_report: KnnBuildReport | None
+    _feedback: FeedbackLog
+    _neighbour_cache: NeighbourCache
+    _similar_memo: LRUCache | None
+    _rating_tree: FenwickTree | None
+    _filter_index: FilterIndex | None
+    _leaderboards: Leaderboards | None
+    _mmr_pool: int
+    _mmr_trade_off: float
+    _ann_nprobe: int
+    _ann_lists: int | None
+    _ann_index: IvfIndex | None
+    _shard_count: int
+    _partition: str
+    _shards: ShardedCatalog | None
+    _walk_graph: WalkGraph | None
+    _walk_dirty: set[Any]
+    _lock: threading.RLock
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
         self._vertices = {}
+        self._table = None
+        self._grid = None
+        self._knn_k = 0
+        self._knn_report = None
+        self._feedback = FeedbackLog()
+        self._neighbour_cache = NeighbourCache(NEIGHBOUR_CAPACITY)
+        self._similar_memo = LRUCache(SIMILAR_MEMO_SIZE, 'similar')
+        self._rating_tree = None
+        self._filter_index = None
+        self._leaderboards = None
+        self._mmr_pool = 0
+        self._mmr_trade_off = MMR_TRADE_OFF
+        self._ann_nprobe = 0
+        self._ann_lists = None
+        self._ann_index = None
+        self._shard_count = 0
+        self._partition = 'hash'
+        self._shards = None
+        self._walk_graph = None
+        self._walk_dirty = set()
+        self._lock = threading.RLock()
 
         # This call isn't necessary, except to satisfy PythonTA.
         Graph.__init__(self)
@@ -309,6 +614,261 @@ class CategoryGraph(Graph):
         """
         if name not in self._vertices:
             self._vertices[name] = _CategoryVertex(category, address, name, price_range, review_rate, location)
+            self._clear_derived()
+
+    def add_whole_vertex(self, item: _CategoryVertex) -> None:
+        """
+        Add the whole vertex into the graph
+        """
+        self._vertices[item.name] = item
+        self._clear_derived()
+
+    def add_vertices(self, vertices: Iterable[_CategoryVertex]) -> None:
+        """
+        Add all the given vertices into the graph at once, as add_whole_vertex would.
+        """
+        with ingest.gc_paused():
+            for item in vertices:
+                self._vertices[item.name] = item
+        self._clear_derived()
+
+    def _clear_derived(self) -> None:
+        """
+        Discard the structures derived from the vertices, so they are rebuilt on next use.
+        """
+        with self._lock:
+            self._table = None
+            self._grid = None
+            self._rating_tree = None
+            self._filter_index = None
+            self._leaderboards = None
+            self._ann_index = None
+            self._walk_graph = None
+            self._walk_dirty.clear()
+            self._clear_results()
+
+    def _clear_results(self) -> None:
+        """
+        Discard the remembered results of similarity queries, keeping the structures they use.
+        """
+        with self._lock:
+            self._neighbour_cache.clear_results()
+            if self._similar_memo is not None:
+                self._similar_memo.clear()
+
+    def _forget_stale_results(self, removed: set[Any], upserted: list[Any]) -> None:
+        """
+        Discard the remembered results of similarity queries that removing the restaurants in
+        removed and adding or updating the ones in upserted could alter, keeping the others.
+
+        A result is discarded if it is for an old rating version, if its base restaurant or
+        one of its candidates was removed or upserted, or if an upserted restaurant scores at
+        most the bound of its candidates (see SimilarResult), so that it could now be one.
+        """
+        table = self.get_table()
+        changed = removed | set(upserted)
+        rows = np.array([table.rows[name] for name in upserted], dtype=np.intp)
+        version = self.rating_version()
+        # Each result, as the function that forgets it, its key, its base restaurant, its rating
+        # version and the result itself.
+        entries = []
+        if self._similar_memo is not None:
+            entries.extend((self._similar_memo.pop, key, key[0], key[2], result)
+                           for key, result in self._similar_memo.items())
+        entries.extend((self._neighbour_cache.forget_result, name, name, result_version, result)
+                       for name, result_version, result in self._neighbour_cache.results())
+
+        stale, others = [], []
+        for entry in entries:
+            _, _, base, result_version, result = entry
+            if result_version != version or base in changed or not changed.isdisjoint(result.pool):
+                stale.append(entry)
+            else:
+                others.append(entry)
+        if len(rows) > 0:
+            block_size = max(1, BATCH_BLOCK_SCORES // len(rows))
+            for start in range(0, len(others), block_size):
+                block = others[start:start + block_size]
+                scores = table.cross_scores(np.array([table.rows[entry[2]] for entry in block], dtype=np.intp),
+                                            np.array([entry[4].ip for entry in block], dtype=np.float64), rows)
+                bounds = np.array([entry[4].bound for entry in block])
+                # The scores may be rounded differently from the ones the bounds came from, so
+                # scores just above a bound count as reaching it.
+                reached = (scores <= bounds[:, None] + STALE_SCORE_TOLERANCE).any(axis=1)
+                stale.extend(entry for entry, is_reached in zip(block, reached.tolist()) if is_reached)
+        for forget, key, _, _, _ in stale:
+            forget(key)
+
+    def get_table(self) -> RestaurantTable:
+        """
+        Return the feature table of this graph, building it first if the vertices have changed
+        since it was last built.
+        """
+        with self._lock:
+            if self._table is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='table'):
+                    table = RestaurantTable(self._vertices.values())
+                for name, rating in self._feedback.global_ratings().items():
+                    if name in table.rows:
+                        table.set_review_rate(name, rating)
+                self._table = table
+            return self._table
+
+    def get_grid(self) -> GridIndex:
+        """
+        Return the spatial index over restaurant locations, building it first if needed.
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._grid is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='grid'):
+                    self._grid = GridIndex(table.locations, GRID_CELL_SIZE)
+            return self._grid
+
+    def restaurants_within(self, lat: float, lon: float, radius: float) -> list[str]:
+        """
+        Return the names of the restaurants within radius kilometres of the given location,
+        closest first.
+
+        This agrees with _CategoryVertex.is_within_distance, but only looks at the grid cells
+        that overlap the radius, unless the radius is so long that distances are measured with
+        the haversine formula (see geodistance), in which case every restaurant is measured.
+        """
+        table = self.get_table()
+        if radius > geodistance.EQUIRECTANGULAR_LIMIT_KM:
+            distances = table.distances_to((lat, lon))
+            rows = np.flatnonzero(distances <= radius)
+            return table.names_of(rows[np.lexsort((rows, distances[rows]))].tolist())
+        return table.names_of(self.get_grid().within(lat, lon, radius, geodistance.local_scales(lat)))
+
+    def nearest(self, lat: float, lon: float, k: int = 5) -> list[str]:
+        """
+        Return the names of the k restaurants closest to the given location, closest first.
+        """
+        table = self.get_table()
+        return table.names_of(self.get_grid().nearest(lat, lon, k, geodistance.local_scales(lat)))
+
+    def get_filter_index(self) -> FilterIndex:
+        """
+        Return the inverted index over the category, price range and effective review rate of
+        the restaurants, building it first if the restaurants have changed since it was last
+        built. Feedback updates it in place.
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._filter_index is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='filter_index'):
+                    self._filter_index = FilterIndex(table)
+            return self._filter_index
+
+    def filter_restaurants(self, where: RestaurantFilter) -> list[str]:
+        """
+        Return the names of the restaurants matching the given filter, in table row order.
+        """
+        with self._lock:
+            rows = self.get_filter_index().rows(where)
+        return self.get_table().names_of(rows.tolist())
+
+    def get_leaderboards(self) -> Leaderboards:
+        """
+        Return the leaderboards of the restaurants by effective review rate and by number of
+        pieces of feedback, building them first if the restaurants have changed since they
+        were last built. Feedback updates them in place.
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._leaderboards is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='leaderboards'):
+                    volumes = np.zeros(len(table))
+                    for name, volume in self._feedback.volumes().items():
+                        if name in table.rows:
+                            volumes[table.rows[name]] = volume
+                    self._leaderboards = Leaderboards(table, volumes)
+            return self._leaderboards
+
+    @timed('fooder_popular_restaurants_seconds')
+    def popular_restaurants(self, k: int = 5, by: str = 'rating', category: int | None = None,
+                            price_range: int | None = None, near: tuple[float, float] | None = None,
+                            exclude: Iterable[Any] = ()) -> list[str]:
+        """
+        Return the names of the k best restaurants by the given ranking (see
+        leaderboard.RANKINGS), from the best to the worst, skipping the restaurants in exclude.
+
+        They are the best restaurants of the given category, of the given price range, around
+        the given location (in its leaderboard cell and the eight cells around it, see
+        leaderboard.LEADERBOARD_CELL_SIZE), or of the whole graph if none is given. If there
+        are fewer than k restaurants around the location, they are followed by the best ones of
+        the whole graph. The restaurants are read off precomputed leaderboards, so this takes
+        O(k) time.
+
+        Preconditions:
+            - by in leaderboard.RANKINGS
+            - at most one of category, price_range and near is not None
+        """
+        table = self.get_table()
+        excluded = {table.rows[name] for name in exclude if name in table.rows}
+        with self._lock:
+            leaderboards = self.get_leaderboards()
+            if near is not None:
+                rows = leaderboards.near(by, near[0], near[1], k, excluded)
+                if len(rows) < k:
+                    rows += leaderboards.top(by, ('all', 0), k - len(rows), excluded.union(rows))
+            elif category is not None:
+                rows = leaderboards.top(by, ('category', category), k, excluded)
+            elif price_range is not None:
+                rows = leaderboards.top(by, ('price', price_range), k, excluded)
+            else:
+                rows = leaderboards.top(by, ('all', 0), k, excluded)
+        return table.names_of(rows)
+
+    def get_all_vertices(self, category: int | str = '') -> set:
+        """
+        Return a set of all vertex names in this graph.
+        If category != '', only return the restaurants of the given category (an int, or a
+        string holding one), which are looked up in the filter index.
+        """
+        if category == '':
+            return set(self._vertices.keys())
+        return set(self.filter_restaurants(RestaurantFilter(categories=frozenset({int(category)}))))
+
+    def record_feedback(self, name: Any, feedback: str, user_name: str | None = None) -> None:
+        """
+        Record the given user's feedback ('yes' or 'no') on the given restaurant.
+
+        The feedback changes the restaurant's effective review rate, which is what similarity is
+        computed with, but not the review rate of its vertex. Only the restaurant's row of the
+        feature table is updated.
+        """
+        with self._lock:
+            v = self._vertices[name]
+            rating = self._feedback.record(user_name, name, feedback, v.review_rate)
+            if self._table is not None:
+                self._table.set_review_rate(name, rating)
+                if self._rating_tree is not None:
+                    self._rating_tree.update(self._table.rows[name], rating)
+                if self._filter_index is not None:
+                    self._filter_index.update_rating(self._table.rows[name], rating)
+                if self._leaderboards is not None:
+                    self._leaderboards.update('rating', self._table.rows[name], rating)
+                    self._leaderboards.update('feedback', self._table.rows[name], self._feedback.volume(name))
+                if self._shards is not None:
+                    self._shards.set_review_rate(self._table.rows[name], rating)
+
+    def effective_rating(self, name: Any, user_name: str | None = None) -> float:
+        """
+        Return the review rate of the given restaurant with everyone's feedback applied, or with
+        only the given user's feedback applied if user_name is not None.
+        """
+        base = self._vertices[name].review_rate
+        if user_name is None:
+            return self._feedback.global_rating(name, base)
+        return self._feedback.user_rating(user_name, name, base)
+
+    def rating_version(self) -> int:
+        """
+        Return a number that changes whenever an effective review rate changes.
+        """
+        return self._feedback.version()
 
     def add_edge(self, name1: Any, name2: Any, similarity_score: float = 1.0) -> None:
         """Add an edge between the two vertices with the given items in this graph,
@@ -322,79 +882,1046 @@ class CategoryGraph(Graph):
         if name1 in self._vertices and name2 in self._vertices:
             v1 = self._vertices[name1]
             v2 = self._vertices[name2]
+            if METRICS.enabled and v2 not in v1.neighbours:
+                METRICS.count('fooder_edges_added_total')
 
             # Add the new edge
             v1.neighbours[v2] = similarity_score
             v2.neighbours[v1] = similarity_score
+            if self._walk_graph is not None:
+                self._walk_dirty.update((name1, name2))
         else:
             # We didn't find an existing vertex for both items.
             raise ValueError
 
-    def get_similarity_score(self, name1: Any, name2: Any, ip: tuple[float, float]) -> float:
-        """
-        Return the similarity score between the two given items in this graph.
+    def remove_edge(self, name1: Any, name2: Any) -> None:
+        """Remove the edge between the two vertices with the given items in this graph, if
+        there is one.
 
         Raise a ValueError if name1 or name2 do not appear as vertices in this graph.
         """
-        v1 = self._vertices[name1]
-        v2 = self._vertices[name2]
+        if name1 in self._vertices and name2 in self._vertices:
+            v1 = self._vertices[name1]
+            v2 = self._vertices[name2]
+            v1.neighbours.pop(v2, None)
+            v2.neighbours.pop(v1, None)
+            if self._walk_graph is not None:
+                self._walk_dirty.update((name1, name2))
+        else:
+            raise ValueError
 
-        return v1.similarity_score(v2, ip)
+    def get_similarity_score(self, name1: Any, name2: Any, ip: tuple[float, float]) -> float:
+        """
+        Return the similarity score between the two given items in this graph, using their
+        effective review rates.
 
+        Raise a KeyError if name1 or name2 do not appear as vertices in this graph.
+        """
+        table = self.get_table()
+        if METRICS.enabled:
+            METRICS.count('fooder_similarity_scores_total', path='pair')
+        return table.pair_score(table.rows[name1], table.rows[name2], ip)
+
+    @timed('fooder_get_sim_rest_seconds')
     def get_sim_rest(self, restaurant: str, ip: tuple[float, float]) -> list[str]:
         """
         Return a list of resturants based on the similarity scores.
+
+        If the nearest neighbours were precomputed by build_knn_edges, the neighbours of the
+        restaurant are re-ranked with the distance to the user, and the top 5 are returned.
+        Otherwise, the top 5 are found by similar_rest_all_connected.
         """
+        with self._lock:
+            v = self._vertices[restaurant]
+            if self._knn_k > 0 and v.neighbours:
+                return self._rank_neighbours(v, ip)[:5]
+            return self.similar_rest_all_connected(restaurant, ip)
 
-        # v = self._vertices[restaurant]
-        # return [key.name for key in v.neighbours]
-        self.similar_rest_all_connected(restaurant, ip)
-        v = self._vertices[restaurant]
-        return [key.name for key in v.neighbours]
+    def _rank_neighbours(self, v: _CategoryVertex, ip: tuple[float, float]) -> list[str]:
+        """
+        Return the names of the neighbours of v, from the most to the least similar.
 
-    def similar_rest_all_connected(self, restaurant: str, ip: tuple[float, float]) -> None:
+        The edge weights only hold the location-independent part of the similarity score, so
+        the difference in distance to the user is added back here.
+        """
+        table = self.get_table()
+        names = [u.name for u in v.neighbours]
+        weights = np.fromiter(v.neighbours.values(), dtype=np.float64, count=len(names))
+        rows = np.array([table.rows[name] for name in names], dtype=np.intp)
+        if METRICS.enabled:
+            METRICS.count('fooder_similarity_scores_total', len(names), path='neighbours')
+        user_distances = table.distances_to(ip, rows)
+        base_distance = table.distances_to(ip, np.array([table.rows[v.name]]))[0]
+        scores = np.sqrt(weights ** 2 + (user_distances - base_distance) ** 2)
+        return [names[i] for i in np.lexsort((rows, scores))]
+
+    def get_knn_k(self) -> int:
         """
-        Connects restaurant to its top 5 most similar restaurants based on similarity scores.
+        Return the number of nearest neighbours precomputed for each vertex by build_knn_edges,
+        or 0 if they were not precomputed.
         """
-        similar_res_names = self.most_similar_restaurants(restaurant, ip)
+        return self._knn_k
 
-        for res in similar_res_names:
-            s_score = self.get_similarity_score(res, restaurant, ip)
-            self.add_edge(res, restaurant, s_score)
+    def get_knn_report(self) -> KnnBuildReport | None:
+        """
+        Return the report of the time and memory the last build_knn_edges took, or None if
+        the edges were never built (such as for a graph loaded from a snapshot).
+        """
+        return self._knn_report
+
+    def build_knn_edges(self, k: int = 10, processes: int = 1) -> KnnBuildReport:
+        """
+        Connect every restaurant to its k most similar restaurants, ignoring the distance to
+        the user, and return a report of the time and memory the build took.
+
+        The edge weights are the similarity scores without the distance-to-user term, which
+        get_sim_rest adds back at query time. They use the base review rates, so user feedback
+        does not make them stale.
+
+        Preconditions:
+            - 0 < k < len(self.get_all_restaurants())
+            - processes >= 1
+        """
+        with self._lock:
+            table = self.get_table()
+            neighbours, distances, report = compute_knn(table.base_features(), k, processes)
+            self._walk_graph = None
+            self._walk_dirty.clear()
+            for row, name in enumerate(table.names):
+                for other, distance in zip(neighbours[row], distances[row]):
+                    self.add_edge(name, table.names[other], float(distance))
+            self._knn_k = k
+            table.knn_radii = distances[:, -1].copy()
+            report.edges = sum(v.degree() for v in self._vertices.values()) // 2
+            self._knn_report = report
+            return report
+
+    def upsert_restaurant(self, category: int, address: str, name: str, price_range: int,
+                          review_rate: float, location: tuple[float, float]) -> None:
+        """
+        Add a restaurant with the given attributes to this graph, or, if there already is a
+        restaurant with the given name, replace its attributes. See apply_changes.
+        """
+        self.apply_changes([(category, address, name, price_range, review_rate, location)], [])
 
-    def most_similar_restaurants(self, base_restaurant: str, ip: tuple[float, float]) -> list[str]:
+    def remove_restaurant(self, name: Any) -> None:
         """
-        Recommend the top 5 most similar restaurants by calculating the similarity score
+        Remove the given restaurant and its edges from this graph. See apply_changes.
+
+        Raise a ValueError if name does not appear as a vertex in this graph.
+        """
+        self.apply_changes([], [name])
+
+    def apply_changes(self, upserts: list[tuple], removals: list[Any]) -> None:
+        """
+        Remove the restaurants named in removals from this graph, then add or update each
+        restaurant in upserts, which are tuples of the arguments of add_vertex. The last
+        upsert of a name wins.
+
+        Unlike add_vertex, nothing is rebuilt: the feature table, the spatial index, the
+        precomputed nearest-neighbour edges and every structure built from them (the rating
+        tree, filter index, leaderboards, approximate search index, random walk and shards)
+        are patched, and only the remembered results of similarity queries that the changes
+        could alter are discarded (see _forget_stale_results). A removed restaurant loses its edges,
+        and so does an updated one whose category, price range or review rate changed. If the
+        nearest neighbours were precomputed, those restaurants, the added ones and the ones
+        that had any of them among their nearest neighbours are ranked against the catalog
+        again, and the restaurants that changed are connected to the restaurants they are now
+        among the nearest neighbours of. The edges therefore always include the ones
+        build_knn_edges would build.
+
+        Raise a ValueError, before changing anything, if a restaurant in removals does not
+        appear as a vertex in this graph.
+        """
+        with self._lock:
+            removals = list(dict.fromkeys(removals))
+            if any(name not in self._vertices for name in removals):
+                raise ValueError
+            upserts = list({change[2]: change for change in upserts}.values())
+            changed = [change[2] for change in upserts if change[2] in removals or not self._same_features(change)]
+
+            radii = self._knn_radii() if self._knn_k > 0 else None
+            stale = set()
+            for name in removals + [name for name in changed if name in self._vertices]:
+                for other, weight in self._detach(name).items():
+                    if radii is not None and weight <= radii[self._table.rows[other]]:
+                        stale.add(other)
+            new_rows = self._remove_rows(removals)
+            self._upsert_rows(upserts)
+            self._refresh_shards()
+            if self._knn_k > 0:
+                stale.difference_update(removals)
+                stale.difference_update(changed)
+                self._link_knn(list(stale) + changed, changed)
+            self._patch_walk_graph(new_rows)
+            self._forget_stale_results(set(removals), [change[2] for change in upserts])
+
+    def _same_features(self, change: tuple) -> bool:
+        """
+        Return whether the given upsert (a tuple of the arguments of add_vertex) is of a
+        restaurant in this graph whose category, price range and review rate it keeps.
+        """
+        category, _, name, price_range, review_rate, _ = change
+        if name not in self._vertices:
+            return False
+        v = self._vertices[name]
+        return (float(v.category), float(v.price_range), float(v.review_rate)) == \
+            (float(category), float(price_range), float(review_rate))
+
+    def apply_delta(self, delta_file: Any) -> tuple[int, int]:
+        """
+        Apply the changes in the given delta file (see ingest.read_delta) with apply_changes,
+        and return the number of restaurants upserted and removed.
+
+        Removals of restaurants that are not in this graph are ignored, so applying the same
+        delta file twice is the same as applying it once.
+        """
+        columns, removals = ingest.read_delta(delta_file)
+        removals = [name for name in removals if name in self._vertices]
+        upserts = [(category, address, name, price, review_rate, (lat, lon))
+                   for name, address, category, price, review_rate, lat, lon in zip(
+                       columns.names, columns.addresses, columns.categories.tolist(), columns.price_ranges.tolist(),
+                       columns.review_rates.tolist(), columns.locations[:, 0].tolist(),
+                       columns.locations[:, 1].tolist())]
+        self.apply_changes(upserts, removals)
+        return len(upserts), len(removals)
+
+    def _detach(self, name: Any) -> dict[Any, float]:
+        """
+        Remove every edge of the given restaurant, and return a dictionary mapping each of its
+        former neighbours to the weight of the edge.
+        """
+        self._neighbour_cache.forget(name)
+        edges = {u.name: weight for u, weight in self._vertices[name].neighbours.items()}
+        for other in edges:
+            self.remove_edge(name, other)
+        return edges
+
+    def _remove_rows(self, names: list[Any]) -> np.ndarray | None:
+        """
+        Remove the given restaurants, which have no edges, from the vertices, the feature table,
+        the spatial index and the structures patched by _add_rows, and return an array mapping
+        each old row of the table to its new row (or -1 for a removed row), or None if the
+        table was not built. A removed row is filled with the last row of the table.
+        """
+        table, grid = self._table, self._grid
+        if table is None:
+            for name in names:
+                del self._vertices[name]
+            return None
+        # Only the removed rows and the last len(names) rows, which may be moved into them,
+        # change; the ones still in the table afterwards are put back.
+        n = len(table)
+        touched = sorted({table.rows[name] for name in names} | set(range(max(n - len(names), 0), n)))
+        self._discard_rows(touched)
+        original = np.arange(n)
+        for name in names:
+            v = self._vertices.pop(name)
+            row = table.rows[name]
+            if grid is not None:
+                grid.discard(row, v.location)
+            last = table.swap_remove(name)
+            original[row] = original[last]
+            if grid is not None and row != last:
+                lat, lon = table.locations[row].tolist()
+                grid.renumber(last, row, (lat, lon))
+        if grid is not None:
+            grid.locations = table.locations
+        self._truncate_rows(len(table))
+        self._add_rows([row for row in touched if row < len(table)])
+        new_rows = np.full(n, -1, dtype=np.int64)
+        new_rows[original[:len(table)]] = np.arange(len(table))
+        return new_rows
+
+    def _upsert_rows(self, upserts: list[tuple]) -> None:
+        """
+        Add or update the given restaurants (tuples of the arguments of add_vertex) in the
+        vertices, the feature table, the spatial index and the structures patched by _add_rows.
+        An updated restaurant keeps its row.
+        """
+        table, grid = self._table, self._grid
+        added = []
+        updated = []
+        for category, address, name, price_range, review_rate, location in upserts:
+            v = self._vertices.get(name)
+            if v is None:
+                v = _CategoryVertex(category, address, name, price_range, review_rate, location)
+                self._vertices[name] = v
+                added.append(v)
+                continue
+            if table is not None:
+                row = table.rows[name]
+                self._discard_rows([row])
+                updated.append(row)
+                if grid is not None:
+                    grid.discard(row, v.location)
+                    grid.add(row, location)
+                table.update_row(row, np.array([float(category), float(price_range), float(review_rate)]), location)
+                table.set_review_rate(name, self._feedback.global_rating(name, review_rate))
+            v.category, v.address, v.price_range, v.review_rate, v.location = \
+                category, address, price_range, review_rate, location
+
+        if table is None:
+            return
+        first = len(table)
+        if added:
+            table.append_rows([v.name for v in added],
+                              np.array([(float(v.category), float(v.price_range), float(v.review_rate))
+                                        for v in added], dtype=np.float64),
+                              np.array([v.location for v in added], dtype=np.float64))
+            for v in added:
+                table.set_review_rate(v.name, self._feedback.global_rating(v.name, v.review_rate))
+                if grid is not None:
+                    grid.add(table.rows[v.name], v.location)
+        if grid is not None:
+            grid.locations = table.locations
+        self._add_rows(updated + list(range(first, len(table))))
+
+    def _discard_rows(self, rows: list[int]) -> None:
+        """
+        Take the given rows of the table out of the structures built from it, before they are
+        removed or changed. The rows keep their place in the rating tree, with no weight.
+        """
+        if self._rating_tree is not None:
+            for row in rows:
+                self._rating_tree.update(row, 0.0)
+        if self._filter_index is not None:
+            self._filter_index.discard(rows)
+        if self._leaderboards is not None:
+            self._leaderboards.discard(rows)
+        if self._ann_index is not None:
+            self._ann_index.discard(rows)
+
+    def _truncate_rows(self, n: int) -> None:
+        """
+        Drop every row from row n on from the structures built from the table, after those rows
+        were discarded and removed from it.
+        """
+        if self._rating_tree is not None:
+            self._rating_tree.truncate(n)
+        if self._filter_index is not None:
+            self._filter_index.truncate(n)
+        if self._leaderboards is not None:
+            self._leaderboards.truncate(n)
+
+    def _renumber_rows(self, new_rows: np.ndarray) -> None:
+        """
+        Move each row i of the structures built from the table to row new_rows[i], dropping the
+        rows where it is -1, after those rows were discarded and the table renumbered the same
+        way.
+
+        Preconditions:
+            - new_rows[new_rows >= 0] is increasing
+        """
+        kept = np.flatnonzero(new_rows >= 0)
+        if self._rating_tree is not None:
+            self._rating_tree = FenwickTree(np.array(self._rating_tree.weights)[kept])
+        if self._filter_index is not None:
+            self._filter_index.renumber(new_rows)
+        if self._leaderboards is not None:
+            self._leaderboards.renumber(new_rows)
+        if self._ann_index is not None:
+            self._ann_index.renumber(new_rows)
+
+    def _add_rows(self, rows: list[int]) -> None:
+        """
+        Put the given rows of the table back into the structures built from it, after they were
+        added or changed. Rows past the end of the rating tree are appended to it, in order.
+        """
+        table = self._table
+        if self._rating_tree is not None:
+            for row in rows:
+                weight = max(float(table.features[row, 2]), 0.0)
+                if row < len(self._rating_tree):
+                    self._rating_tree.update(row, weight)
+                else:
+                    self._rating_tree.append(weight)
+        if self._filter_index is not None:
+            self._filter_index.add(rows)
+        if self._leaderboards is not None:
+            self._leaderboards.add(rows, [self._feedback.volume(table.names[row]) for row in rows])
+        if self._ann_index is not None:
+            self._ann_index.add(rows, table.features[rows])
+
+    def _link_knn(self, names: list[Any], upserted: list[Any]) -> None:
+        """
+        Connect each restaurant in names to its k most similar restaurants, as build_knn_edges
+        does, then connect each restaurant in upserted to every restaurant that it is now one
+        of the k most similar restaurants of.
+
+        Preconditions:
+            - all(name in names for name in upserted)
+        """
+        table = self.get_table()
+        k = min(self._knn_k, len(table) - 1)
+        if k <= 0 or not names:
+            return
+        features = table.base_features()
+        radii = self._knn_radii()
+        rows = np.array([table.rows[name] for name in names], dtype=np.intp)
+        neighbours, distances = knn_rows(features, rows, k)
+        for name, row_neighbours, row_distances in zip(names, neighbours.tolist(), distances.tolist()):
+            for other, distance in zip(row_neighbours, row_distances):
+                self.add_edge(name, table.names[other], distance)
+        radii[rows] = distances[:, -1]
+
+        upserted_rows = np.array([table.rows[name] for name in upserted], dtype=np.intp)
+        indices, others, distances = reverse_neighbours(features, upserted_rows, radii)
+        for i, other, distance in zip(indices.tolist(), others.tolist(), distances.tolist()):
+            self.add_edge(upserted[i], table.names[other], distance)
+
+    def _knn_radii(self) -> np.ndarray:
+        """
+        Return the distance from each restaurant to its k-th most similar restaurant, in table
+        row order, as precomputed by build_knn_edges.
+
+        If the table does not know them (e.g. the graph was loaded from a snapshot), they are
+        taken to be the k-th smallest edge weight of each restaurant, or infinity for a
+        restaurant with fewer than k edges.
+        """
+        table = self.get_table()
+        if table.knn_radii is None:
+            edges = self._edge_columns()
+            indptr = edges['edge_indptr']
+            degrees = np.diff(indptr)
+            sources = np.repeat(np.arange(len(table)), degrees)
+            # Sort the weights of each row, keeping the rows in order.
+            weights = edges['edge_weights'][np.lexsort((edges['edge_weights'], sources))]
+            radii = np.full(len(table), np.inf)
+            has_k = degrees >= self._knn_k
+            radii[has_k] = weights[indptr[:-1][has_k] + self._knn_k - 1]
+            table.knn_radii = radii
+        return table.knn_radii
+
+    def similar_rest_all_connected(self, restaurant: str, ip: tuple[float, float]) -> list[str]:
+        """
+        Connects restaurant to its top 5 most similar restaurants based on similarity scores,
+        and return their names, from the most to the least similar.
+
+        Each restaurant keeps at most a fixed number of the edges added here (see
+        configure_neighbour_cache); the edges over that limit are evicted. The top 5 are only
+        recomputed when the user has moved to another location bucket or a review rate has
+        changed since they were last found.
+        """
+        with self._lock:
+            bucket = location_bucket(ip, LOCATION_BUCKET_SIZE)
+            version = self.rating_version()
+            similar_res_names = self._neighbour_cache.lookup(restaurant, bucket, version)
+            if similar_res_names is not None:
+                METRICS.count('fooder_neighbour_cache_total', result='hit')
+                return similar_res_names
+            METRICS.count('fooder_neighbour_cache_total', result='miss')
+
+            result = self._similar_result(restaurant, ip)
+            similar_res_names = list(result.names)
+            scores = {}
+            for res in similar_res_names[:self._neighbour_cache.capacity]:
+                s_score = self.get_similarity_score(res, restaurant, ip)
+                self.add_edge(res, restaurant, s_score)
+                scores[res] = s_score
+
+            evicted = self._neighbour_cache.link(restaurant, scores)
+            for name1, name2 in evicted:
+                self.remove_edge(name1, name2)
+            METRICS.count('fooder_edges_evicted_total', len(evicted))
+            self._neighbour_cache.store(restaurant, bucket, version, result)
+            return similar_res_names
+
+    def configure_neighbour_cache(self, capacity: int, policy: str = 'score') -> None:
+        """
+        Keep at most capacity edges added by similar_rest_all_connected for each restaurant,
+        evicting the ones over that limit with the given policy: 'score' evicts the least
+        similar neighbour first, and 'lru' the least recently used one. Edges over the new
+        limit are evicted now.
+
+        Raise a ValueError if the policy is unknown or the capacity is below 1.
+        """
+        with self._lock:
+            for name1, name2 in self._neighbour_cache.reconfigure(capacity, policy):
+                self.remove_edge(name1, name2)
+
+    def neighbour_cache_stats(self) -> dict[str, int]:
+        """
+        Return the capacity of the neighbour cache, the number of edges it holds, and the number
+        of edges it has evicted.
+        """
+        cache = self._neighbour_cache
+        return {'capacity': cache.capacity, 'edges': cache.edge_count(), 'evictions': cache.evictions}
+
+    def most_similar_restaurants(self, base_restaurant: str, ip: tuple[float, float], k: int = 5,
+                                 where: RestaurantFilter | None = None) -> list[str]:
+        """
+        Recommend the top k most similar restaurants by calculating the similarity score
         between the restaurant and the rest of the restaurants, then return a list of
-        the names of the top 5 similar restaurants.
+        the names of the top k similar restaurants, from the most to the least similar.
+
+        The similarity score is a distance, so the most similar restaurants are the ones with
+        the lowest score. All the scores are computed at once on the feature table.
+
+        If where is not None, only the restaurants matching it are candidates. They are found
+        in the filter index first, and only they are scored. Otherwise, if approximate search
+        is on (see configure_approximate_search), only the restaurants in the lists of the
+        approximate search index closest to the base restaurant are candidates. Otherwise,
+        if sharding is on (see configure_shards), the restaurants are scored by the worker
+        processes of their shards.
+
+        If diversity is on (see configure_diversity), the most similar candidates are found
+        in a pool of the configured size instead, and k of them are picked by maximal marginal
+        relevance, so that they are not all alike.
+
+        Results are memoized: users in the same location cell (about 100 m across) asking
+        about the same restaurant get the result computed for the first of them, until a
+        review rate changes or a change to the catalog could alter it.
         """
-        recommendations = []
+        return list(self._similar_result(base_restaurant, ip, k, where).names)
 
-        for res in self._vertices:
-            v = self._vertices[res]
-            if v.name != base_restaurant:
-                sim_score = self.get_similarity_score(base_restaurant, v.name, ip)
-                if (sim_score, res) not in recommendations:
-                    recommendations.append((sim_score, v.name))
+    @timed('fooder_most_similar_restaurants_seconds')
+    def _similar_result(self, base_restaurant: str, ip: tuple[float, float], k: int = 5,
+                        where: RestaurantFilter | None = None) -> SimilarResult:
+        """
+        Return the result of most_similar_restaurants, with the candidates it was picked from
+        and their bound (see SimilarResult), memoized.
 
-        recommendations.sort()
-        recommendations.reverse()
+        The rows are scored, named and memoized while holding the lock, since apply_changes
+        renumbers them in place: a result found over the rows as they were before a change
+        would name the restaurants moved into their place.
+        """
+        with self._lock:
+            memo = self._similar_memo
+            if memo is not None:
+                key = (base_restaurant, location_bucket(ip, SIMILAR_MEMO_CELL_SIZE), self.rating_version(), k, where)
+                result = memo.get(key)
+                if result is not None:
+                    return result
+            result = self._find_similar(base_restaurant, ip, k, where)
+            if memo is not None:
+                memo.put(key, result)
+            return result
+
+    def _find_similar(self, base_restaurant: str, ip: tuple[float, float], k: int,
+                      where: RestaurantFilter | None) -> SimilarResult:
+        """
+        Return the result of most_similar_restaurants, with the candidates it was picked from
+        and their bound (see SimilarResult), without the memo.
+        """
+        table = self.get_table()
+        row = table.rows[base_restaurant]
+        count = max(k, self._mmr_pool) if self._mmr_pool > 0 else k
+        if where is not None and not where.is_empty():
+            candidates = self.get_filter_index().rows(where)
+            candidates = candidates[candidates != row]
+            scores = table.similarity_scores(row, ip, candidates)
+            if METRICS.enabled:
+                METRICS.count('fooder_similarity_scores_total', len(scores), path='filtered')
+            rows = candidates[table.top_k(scores, count)]
+        else:
+            candidates = self._approximate_candidates(row, count) if self._ann_nprobe > 0 else None
+            if candidates is not None:
+                scores = table.similarity_scores(row, ip, candidates)
+                if METRICS.enabled:
+                    METRICS.count('fooder_similarity_scores_total', len(scores), path='approximate')
+                rows = candidates[table.top_k(scores, count)]
+            elif self._shard_count > 0:
+                if METRICS.enabled:
+                    METRICS.count('fooder_similarity_scores_total', len(table), path='sharded')
+                rows = self.get_shards().most_similar(row, ip, count)
+            else:
+                scores = table.similarity_scores(row, ip)
+                if METRICS.enabled:
+                    METRICS.count('fooder_similarity_scores_total', len(scores), path='all')
+                rows = table.top_k(scores, count, exclude=row)
+        if len(rows) < count or len(rows) == 0:
+            bound = math.inf
+        else:
+            bound = float(table.similarity_scores(row, ip, rows).max())
+        pool = table.names_of(rows.tolist())
+        similar = table.names_of(self._diversify(row, ip, rows, k).tolist()) if count > k else pool
+        return SimilarResult(similar, pool, ip, bound)
 
-        lst_of_res = [score[1] for score in recommendations]
+    def _diversify(self, row: int, ip: tuple[float, float], candidates: np.ndarray, k: int) -> np.ndarray:
+        """
+        Return k of the given candidate rows, picked by maximal marginal relevance (see
+        diversity.mmr_order) for their similarity with row as seen by a user at ip.
+        """
+        table = self.get_table()
+        pairwise = table.pairwise_scores(candidates, ip)
+        if METRICS.enabled:
+            METRICS.count('fooder_similarity_scores_total', pairwise.size, path='diversity')
+        relevance = table.similarity_scores(row, ip, candidates)
+        return candidates[mmr_order(relevance, pairwise, k, self._mmr_trade_off)]
+
+    def configure_diversity(self, pool: int = MMR_POOL_SIZE, trade_off: float = MMR_TRADE_OFF) -> None:
+        """
+        Make most_similar_restaurants pick its results by maximal marginal relevance among
+        the pool most similar restaurants, weighing their relevance by trade_off and their
+        novelty by 1 - trade_off, or return the most similar restaurants as they are if pool
+        is 0. Re-ranking a pool of m restaurants costs one m by m array of scores per query.
 
-        return lst_of_res[:5]
+        Preconditions:
+            - pool >= 0
+            - 0 <= trade_off <= 1
+        """
+        with self._lock:
+            self._mmr_pool = pool
+            self._mmr_trade_off = trade_off
+            self._clear_results()
+
+    def _approximate_candidates(self, row: int, k: int) -> np.ndarray | None:
+        """
+        Return the rows other than row in the lists of the approximate search index closest to
+        the features of row, or None if there are fewer than k of them.
+        """
+        table = self.get_table()
+        candidates = self.get_ann_index().candidates(table.features[row], self._ann_nprobe)
+        candidates = candidates[candidates != row]
+        return candidates if len(candidates) >= min(k, len(table) - 1) else None
+
+    def configure_approximate_search(self, nprobe: int = ANN_NPROBE, n_lists: int | None = None) -> None:
+        """
+        Make most_similar_restaurants search only the nprobe lists of the approximate search
+        index closest to the base restaurant, out of n_lists lists (about the square root of
+        the number of restaurants if n_lists is None), or search every restaurant exactly if
+        nprobe is 0. More lists searched find more of the exact results, more slowly; see
+        measure_ann_recall.
+
+        Preconditions:
+            - nprobe >= 0
+            - n_lists is None or n_lists >= 1
+        """
+        with self._lock:
+            if n_lists != self._ann_lists:
+                self._ann_index = None
+            self._ann_nprobe = nprobe
+            self._ann_lists = n_lists
+            self._clear_results()
+
+    def get_ann_index(self) -> IvfIndex:
+        """
+        Return the approximate search index over the category, price range and effective
+        review rate of the restaurants, building it first if the restaurants have changed since
+        it was last built.
+
+        Feedback does not move restaurants between its lists; the candidates it finds are
+        still scored with their current review rates.
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._ann_index is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='ann_index'):
+                    self._ann_index = IvfIndex(table.features, self._ann_lists)
+            return self._ann_index
+
+    def configure_shards(self, shards: int, partition: str = 'hash') -> None:
+        """
+        Make most_similar_restaurants score the restaurants in the given number of worker
+        processes, each holding a shard of the restaurants partitioned by partition (see
+        sharding.PARTITIONS), or in this process if shards is 0. Any running workers are
+        stopped; the new ones are started on first use.
+
+        Preconditions:
+            - shards >= 0
+            - partition in sharding.PARTITIONS
+        """
+        with self._lock:
+            self._close_shards()
+            self._shard_count = shards
+            self._partition = partition
+
+    def get_shards(self) -> ShardedCatalog:
+        """
+        Return the worker processes scoring the restaurants, starting them first if they are
+        not running, or bringing their shards up to date if the feature table was rebuilt
+        since.
+
+        Preconditions:
+            - self._shard_count > 0
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._shards is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='shards'):
+                    self._shards = ShardedCatalog(table, self._shard_count, self._partition)
+            elif self._shards.table is not table:
+                self._shards.refresh(table)
+            return self._shards
+
+    def _refresh_shards(self) -> None:
+        """
+        Bring the shards of the running worker processes up to date with the rows of the
+        feature table, after they changed. The workers keep running.
+        """
+        if self._shards is not None and self._table is not None:
+            with METRICS.timer('fooder_derived_build_seconds', structure='shards_refresh'):
+                self._shards.refresh(self._table)
+
+    def _close_shards(self) -> None:
+        """
+        Stop the worker processes scoring the restaurants, if they are running.
+        """
+        if self._shards is not None:
+            self._shards.close()
+            self._shards = None
+
+    def measure_ann_recall(self, queries: int = 100, k: int = 5, seed: int = 0) -> dict[str, float]:
+        """
+        Return how well approximate search, as configured, matches the exact search of
+        most_similar_restaurants, over the given number of random queries by users near a
+        random restaurant: the recall (the fraction of the exact k most similar restaurants
+        that it finds, counting ties as found), the mean number of restaurants it scores, and the mean seconds per
+        query of each search. Nothing is memoized.
+
+        Preconditions:
+            - self._ann_nprobe > 0
+            - len(self.get_all_restaurants()) > k
+        """
+        table = self.get_table()
+        rng = np.random.default_rng(seed)
+        rows = rng.integers(len(table), size=queries)
+        locations = table.locations[rng.integers(len(table), size=queries)] + rng.normal(0.0, 0.01, (queries, 2))
+        self.get_ann_index()
+
+        found = scored = 0
+        exact_seconds = approximate_seconds = 0.0
+        for row, (lat, lon) in zip(rows.tolist(), locations.tolist()):
+            start = time.perf_counter()
+            scores = table.similarity_scores(row, (lat, lon))
+            exact = table.top_k(scores, k, exclude=row)
+            exact_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            candidates = self._approximate_candidates(row, k)
+            if candidates is None:
+                approximate = table.top_k(table.similarity_scores(row, (lat, lon)), k, exclude=row)
+                scored += len(table)
+            else:
+                approximate = candidates[table.top_k(table.similarity_scores(row, (lat, lon), candidates), k)]
+                scored += len(candidates)
+            approximate_seconds += time.perf_counter() - start
+            # A restaurant tied with the last exact result is as good as it.
+            found += min(k, int(np.count_nonzero(scores[approximate] <= scores[exact[-1]])))
+        return {'recall': found / (queries * k), 'scored': scored / queries,
+                'exact_seconds': exact_seconds / queries, 'approximate_seconds': approximate_seconds / queries}
+
+    @timed('fooder_most_similar_to_many_seconds')
+    def most_similar_to_many(self, anchors: list[Any], ip: tuple[float, float], k: int = 5,
+                             aggregate: str = 'mean', exclude: Iterable[Any] = ()) -> list[str]:
+        """
+        Return the names of the k restaurants most similar to the given anchor restaurants
+        taken together, from the most to the least similar, skipping the anchors themselves
+        and the restaurants in exclude.
+
+        If aggregate is 'mean', restaurants are ranked by the mean of the squares of their
+        similarity scores with all the anchors. If it is 'max', they are ranked by their score
+        with the anchor they are most similar to, among the last MAX_ANCHORS anchors (the most
+        recent ones, for a user's history). Either way, every restaurant is scored against the
+        anchors at once on the feature table, so the cost is that of a few scans of the table
+        however many anchors there are.
+
+        Anchors not in this graph are ignored; if none are left, return an empty list.
+
+        Preconditions:
+            - aggregate in ANCHOR_AGGREGATES
+        """
+        table = self.get_table()
+        rows = [table.rows[name] for name in anchors if name in table.rows]
+        if not rows:
+            return []
+        scored = rows[-MAX_ANCHORS:] if aggregate == 'max' else rows
+        squared = table.anchor_squared_scores(np.array(scored, dtype=np.intp), ip, aggregate)
+        if METRICS.enabled:
+            METRICS.count('fooder_similarity_scores_total', len(squared) * (len(scored) if aggregate == 'max' else 1),
+                          path='anchors')
+        squared[rows] = np.inf
+        squared[[table.rows[name] for name in exclude if name in table.rows]] = np.inf
+        top = table.top_k(squared, k)
+        return table.names_of(top[np.isfinite(squared[top])].tolist())
+
+    def get_walk_graph(self) -> WalkGraph:
+        """
+        Return the random walk along the edges of this graph used by walk_recommendations,
+        building it first if the edges have changed since it was last built.
+        """
+        with self._lock:
+            if self._walk_graph is None:
+                with METRICS.timer('fooder_derived_build_seconds', structure='walk_graph'):
+                    edges = self._edge_columns()
+                    self._walk_graph = WalkGraph(edges['edge_indptr'], edges['edge_indices'], edges['edge_weights'])
+            elif self._walk_dirty:
+                self._patch_walk_graph(None)
+            return self._walk_graph
+
+    def _patch_walk_graph(self, new_rows: np.ndarray | None) -> None:
+        """
+        Bring the random walk up to date with the table and the edges, if it was built: move
+        its rows as new_rows says (see _remove_rows), unless it is None, and replace the edges
+        of the restaurants in _walk_dirty with their current ones.
+        """
+        if self._walk_graph is None:
+            return
+        table = self.get_table()
+        rows = [table.rows[name] for name in self._walk_dirty if name in table.rows]
+        with METRICS.timer('fooder_derived_build_seconds', structure='walk_graph_patch'):
+            self._walk_graph = self._walk_graph.patched(new_rows, len(table), rows,
+                                                        [self._row_edges(row) for row in rows])
+        self._walk_dirty.clear()
+
+    def _row_edges(self, row: int) -> tuple[list[int], list[float]]:
+        """
+        Return the rows of the neighbours of the restaurant in the given row of the table, and
+        the weights of its edges to them.
+        """
+        table = self.get_table()
+        neighbours = self._vertices[table.names[row]].neighbours
+        return [table.rows[u.name] for u in neighbours], list(neighbours.values())
+
+    @timed('fooder_walk_recommendations_seconds')
+    def walk_recommendations(self, seeds: list[Any], k: int = 5, exclude: Iterable[Any] = (),
+                             exact: bool = False) -> list[str]:
+        """
+        Return the names of the k restaurants with the highest personalized PageRank from the
+        given seed restaurants (see graph_walk), from the highest to the lowest, skipping the
+        seeds themselves. The restaurants in exclude are removed from the graph for the walk,
+        so they are neither returned nor walked through. Ties are broken by row.
+
+        Unless exact is True, the ranks are approximated by graph_walk.push_pagerank, which
+        only visits the restaurants near the seeds; otherwise they are computed by a power
+        iteration over the whole graph. Only restaurants reachable from the seeds have a rank,
+        so fewer than k names are returned if fewer are reachable.
+
+        Seeds not in this graph are ignored; if none are left, return an empty list.
+        """
+        table = self.get_table()
+        seed_rows = np.array([table.rows[name] for name in seeds if name in table.rows], dtype=np.intp)
+        excluded = np.array([table.rows[name] for name in exclude if name in table.rows], dtype=np.intp)
+        if len(seed_rows) == 0:
+            return []
+        walk = self.get_walk_graph()
+        if exact:
+            ranks, _ = personalized_pagerank(walk, seed_rows, excluded)
+            if METRICS.enabled:
+                METRICS.count('fooder_walk_rows_visited_total', len(ranks), path='power')
+            ranks[seed_rows] = 0.0
+            rows = np.flatnonzero(ranks > 0.0)
+            scores = ranks[rows]
+        else:
+            approximate = push_pagerank(walk, seed_rows, excluded)
+            if METRICS.enabled:
+                METRICS.count('fooder_walk_rows_visited_total', len(approximate), path='push')
+            for row in seed_rows.tolist():
+                approximate.pop(row, None)
+            rows = np.fromiter(approximate.keys(), dtype=np.intp, count=len(approximate))
+            scores = np.fromiter(approximate.values(), dtype=np.float64, count=len(approximate))
+        top = rows[np.lexsort((rows, -scores))[:k]]
+        return table.names_of(top.tolist())
+
+    def configure_similarity_memo(self, capacity: int) -> None:
+        """
+        Memoize at most capacity results of most_similar_restaurants, or turn memoization off
+        if capacity is 0. Any memoized results are discarded.
+
+        Preconditions:
+            - capacity >= 0
+        """
+        with self._lock:
+            self._similar_memo = LRUCache(capacity, 'similar') if capacity > 0 else None
+
+    def similarity_memo_stats(self) -> dict[str, float]:
+        """
+        Return the capacity, size, hits, misses and hit rate of the memoized results of
+        most_similar_restaurants, all 0 if memoization is off.
+        """
+        memo = self._similar_memo
+        if memo is None:
+            return {'capacity': 0, 'size': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+        return {'capacity': memo.capacity, 'size': len(memo), 'hits': memo.hits, 'misses': memo.misses,
+                'hit_rate': memo.hit_rate()}
+
+    def save_snapshot(self, path: str, source_hash: str = '') -> None:
+        """
+        Save this graph, including its edges, as a snapshot directory at path. The base review
+        rates are saved; the feedback log is not.
+
+        source_hash is the hash of the CSV file the graph was loaded from (see snapshot.file_hash),
+        which load_graph uses to tell whether the snapshot is stale.
+        """
+        table = self.get_table()
+        name_bytes, name_offsets = snapshot.encode_strings(table.names)
+        columns = {'features': table.base_features(), 'locations': table.locations,
+                   'name_bytes': name_bytes, 'name_offsets': name_offsets}
+        columns.update(self._address_columns())
+        columns.update(self._edge_columns())
+        snapshot.write_columns(path, columns, {'source_hash': source_hash, 'knn': self._knn_k})
+
+    def _address_columns(self) -> dict[str, np.ndarray]:
+        """
+        Return the addresses of the restaurants, in table row order, encoded as snapshot columns.
+        """
+        table = self.get_table()
+        address_bytes, address_offsets = snapshot.encode_strings([self._vertices[name].address
+                                                                  for name in table.names])
+        return {'address_bytes': address_bytes, 'address_offsets': address_offsets}
+
+    def _edge_columns(self) -> dict[str, np.ndarray]:
+        """
+        Return the edges of this graph, in compressed sparse row (CSR) form: the neighbours of
+        row i of the table are edge_indices[edge_indptr[i]:edge_indptr[i + 1]], and the weights
+        of those edges are the same slice of edge_weights.
+        """
+        if isinstance(self._vertices, _SnapshotVertices):
+            edges = self._vertices.snapshot_edges()
+            if edges is not None:
+                return edges
+        table = self.get_table()
+        vertices = [self._vertices[name] for name in table.names]
+        edge_indptr = np.zeros(len(vertices) + 1, dtype=np.int64)
+        np.cumsum([len(v.neighbours) for v in vertices], out=edge_indptr[1:])
+        edge_indices = np.array([table.rows[u.name] for v in vertices for u in v.neighbours], dtype=np.int64)
+        edge_weights = np.array([w for v in vertices for w in v.neighbours.values()], dtype=np.float64)
+        return {'edge_indptr': edge_indptr, 'edge_indices': edge_indices, 'edge_weights': edge_weights}
+
+    @staticmethod
+    def load_snapshot(path: str, source_hash: str | None = None) -> CategoryGraph | None:
+        """
+        Return the graph saved as a snapshot at path.
+
+        Return None if there is no usable snapshot at path, or if source_hash is not None and
+        the snapshot was saved from a different CSV file.
+
+        The columns of the snapshot are memory-mapped, and the vertex of a restaurant is only
+        created when it is first looked up (see _SnapshotVertices), so loading takes time in
+        proportion to the number of restaurants rather than of edges.
+        """
+        meta = snapshot.read_meta(path)
+        if meta is None or (source_hash is not None and meta['source_hash'] != source_hash):
+            return None
+        columns = snapshot.read_columns(path, meta, mmap_mode='r')
+        names = snapshot.decode_strings(columns['name_bytes'], columns['name_offsets'])
+
+        graph = CategoryGraph()
+        graph._vertices = _SnapshotVertices(names, columns)
+        # The table changes feedback in place, so its columns are mapped copy-on-write.
+        table_columns = snapshot.read_columns(path, {'columns': ['features', 'locations']})
+        graph._table = RestaurantTable.from_columns(names, table_columns['features'], table_columns['locations'])
+        graph._knn_k = meta['knn']
+        return graph
+
+    @timed('fooder_recommend_batch_seconds')
+    def recommend_batch(self, users: list[User], locations: list[tuple[float, float]], k: int = 5) \
+            -> list[list[str]]:
+        """
+        Return the names of k recommended restaurants for each of the given users, where
+        locations[i] is the location of users[i].
+
+        A user whose last visited restaurant is set, not disliked and still in the graph gets
+        the k restaurants most similar to it, as in most_similar_restaurants. Any other user gets
+        the k best rated restaurants near them, as in popular_restaurants. Disliked restaurants
+        are never recommended. Similar restaurants are re-ranked for diversity as in
+        most_similar_restaurants, if it is on.
+
+        The similar restaurants of many users are ranked together: the scores of a block of
+        users against every restaurant form one matrix, and the dislikes are masked out of it
+        in one step.
+
+        Preconditions:
+            - len(users) == len(locations)
+        """
+        table = self.get_table()
+        n = len(table)
+        results = [[] for _ in users]
+        similar_users = []
+        for i, user in enumerate(users):
+            last = user.last_visited_restaurant
+            if last is not None and last not in user.disliked_restaurants and last.name in table.rows:
+                similar_users.append(i)
+            else:
+                results[i] = self.popular_restaurants(k, near=locations[i],
+                                                      exclude=[r.name for r in user.disliked_restaurants])
+
+        block_size = max(1, BATCH_BLOCK_SCORES // max(n, 1))
+        for start in range(0, len(similar_users), block_size):
+            block = similar_users[start:start + block_size]
+            rows = np.array([table.rows[users[i].last_visited_restaurant.name] for i in block], dtype=np.intp)
+            ips = np.array([locations[i] for i in block], dtype=np.float64).reshape(-1, 2)
+            squared = table.batch_squared_scores(rows, ips)
+            if METRICS.enabled:
+                METRICS.count('fooder_similarity_scores_total', squared.size, path='batch')
+
+            # Mask each user's own base restaurant and disliked restaurants.
+            masked = [(j, table.rows[r.name]) for j, i in enumerate(block) for r in users[i].disliked_restaurants
+                      if r.name in table.rows]
+            masked_users = [j for j, _ in masked]
+            masked_rows = [row for _, row in masked]
+            squared[np.arange(len(block)), rows] = np.inf
+            squared[masked_users, masked_rows] = np.inf
+
+            block_k = min(max(k, self._mmr_pool) if self._mmr_pool > 0 else k, n)
+            if block_k <= 0:
+                continue
+            if block_k < n:
+                top = np.argpartition(squared, block_k - 1, axis=1)[:, :block_k]
+            else:
+                top = np.tile(np.arange(n), (len(block), 1))
+            top_scores = np.take_along_axis(squared, top, axis=1)
+            order = np.lexsort((top, top_scores), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for j, i in enumerate(block):
+                similar = top[j][np.isfinite(top_scores[j])]
+                if len(similar) > k:
+                    similar = self._diversify(int(rows[j]), locations[i], similar, k)
+                results[i] = table.names_of(similar)
+        return results
 
     def get_all_restaurants(self) -> list[_CategoryVertex]:
         """Return a list of all restaurant vertices in the graph."""
         # Ensure that _vertices.values() are actually instances of _CategoryVertex
         return list(self._vertices.values())
 
-    def get_random_restaurant(self) -> _CategoryVertex:
-        """Return a random restaurant from the graph."""
-        if self._vertices:
-            return random.choice(list(self._vertices.values()))
-        else:
+    @timed('fooder_get_random_restaurant_seconds')
+    def get_random_restaurant(self, weighted: bool = False) -> _CategoryVertex:
+        """Return a random restaurant from the graph.
+
+        If weighted is True, each restaurant is picked with probability proportional to its
+        effective review rate (see random_restaurants).
+
+        Raise a ValueError if the graph has no restaurants.
+        """
+        if not self._vertices:
             raise ValueError
+        table = self.get_table()
+        with self._lock:
+            tree = self.get_rating_tree() if weighted else None
+            row = tree.sample() if tree is not None and tree.has_weight() else random.randrange(len(table))
+        return self._vertices[table.names[row]]
+
+    def random_restaurants(self, k: int, exclude: Iterable[Any] = (), weighted: bool = False) -> list[Any]:
+        """Return the names of k distinct random restaurants (or all of them, if there are
+        fewer), none of which is in exclude.
+
+        If weighted is False, every restaurant is equally likely. Otherwise, each one is picked
+        with probability proportional to its effective review rate, so restaurants rated 0 are
+        never picked. Either way, no list of the restaurants is built for the sample.
+        """
+        table = self.get_table()
+        excluded = {table.rows[name] for name in exclude if name in table.rows}
+        if weighted:
+            with self._lock:
+                rows = self.get_rating_tree().sample_distinct(k, excluded)
+        else:
+            rows = sample_rows(len(table), k, excluded)
+        return table.names_of(rows)
+
+    def get_rating_tree(self) -> FenwickTree:
+        """
+        Return the tree of effective review rates used to sample restaurants by rating,
+        building it first if the restaurants have changed since it was last built. Feedback
+        updates it in place.
+        """
+        with self._lock:
+            table = self.get_table()
+            if self._rating_tree is None:
+                self._rating_tree = FenwickTree(np.maximum(table.features[:, 2], 0.0))
+            return self._rating_tree
 
 
 class User:
@@ -406,10 +1933,13 @@ class User:
         - last_visited_restaurant (_CategoryVertex): The last restaurant visited by the user based
         on the recommendation system.
         - disliked_restaurants (set[_CategoryVertex]): A set of restaurants that the user did not like.
+        - liked_restaurants (deque[_CategoryVertex]): The last USER_HISTORY_SIZE distinct
+        restaurants the user liked, from the least to the most recent.
     """
     name: str
     last_visited_restaurant: _CategoryVertex | None
     disliked_restaurants: set[_CategoryVertex]
+    liked_restaurants: deque[_CategoryVertex]
 
     def __init__(self, name: str) -> None:
         """Initialize a user with their name, the latest restaurant they visited and a set of restaurants they dislike.
@@ -417,19 +1947,77 @@ class User:
         self.name = name
         self.last_visited_restaurant = None
         self.disliked_restaurants = set()
+        self.liked_restaurants = deque(maxlen=USER_HISTORY_SIZE)
+
+    def like(self, restaurant: _CategoryVertex) -> None:
+        """
+        Record that this user liked the given restaurant, which becomes their last visited
+        restaurant and the most recent one in their history.
+        """
+        self.last_visited_restaurant = restaurant
+        history = self.liked_restaurants
+        if restaurant in history:
+            history.remove(restaurant)
+        history.append(restaurant)
+
+    def dislike(self, restaurant: _CategoryVertex) -> None:
+        """
+        Record that this user did not like the given restaurant, which leaves their history and
+        is no longer their last visited restaurant.
+        """
+        self.disliked_restaurants.add(restaurant)
+        if restaurant in self.liked_restaurants:
+            self.liked_restaurants.remove(restaurant)
+        self.last_visited_restaurant = None
 
+    @timed('fooder_recommend_restaurants_seconds')
     def recommend_restaurants(self, graph: CategoryGraph, ip: tuple[float, float]) -> list[_CategoryVertex]:
         """
         Recommend restaurants based on user's history and feedback if exists.
-        Otherwise, randomly generate a recommendation from the entire graph.
+        Otherwise, recommend the best rated restaurants near the user (see
+        CategoryGraph.popular_restaurants). A last visited restaurant that has since been
+        removed from the graph counts as no history.
         """
-        if self.last_visited_restaurant and self.last_visited_restaurant not in self.disliked_restaurants:
-            similar_restaurants = graph.most_similar_restaurants(self.last_visited_restaurant.name, ip)
-            return [self.last_visited_restaurant] + similar_restaurants
+        last = self.last_visited_restaurant
+        if last and last not in self.disliked_restaurants and graph.has_vertex(last.name):
+            similar_restaurants = graph.most_similar_restaurants(last.name, ip)
+            return [last] + [graph.get_vertex(name) for name in similar_restaurants]
         else:
-            all_restaurants = graph.get_all_restaurants()
-            filtered_restaurants = [r for r in all_restaurants if r not in self.disliked_restaurants]
-            return random.sample(filtered_restaurants, min(5, len(filtered_restaurants)))
+            names = graph.popular_restaurants(5, near=ip, exclude=[r.name for r in self.disliked_restaurants])
+            return [graph.get_vertex(name) for name in names]
+
+    @timed('fooder_recommend_from_history_seconds')
+    def recommend_from_history(self, graph: CategoryGraph, ip: tuple[float, float], k: int = 5,
+                               aggregate: str = 'mean') -> list[_CategoryVertex]:
+        """
+        Recommend the k restaurants most similar to all the restaurants this user liked, as
+        aggregated by CategoryGraph.most_similar_to_many, skipping the ones they did not like.
+        Without a history (of restaurants still in the graph), recommend as
+        recommend_restaurants does.
+
+        Preconditions:
+            - aggregate in ANCHOR_AGGREGATES
+        """
+        anchors = [r.name for r in self.liked_restaurants]
+        names = graph.most_similar_to_many(anchors, ip, k, aggregate, [r.name for r in self.disliked_restaurants])
+        if not names:
+            return self.recommend_restaurants(graph, ip)
+        return [graph.get_vertex(name) for name in names]
+
+    @timed('fooder_recommend_by_walk_seconds')
+    def recommend_by_walk(self, graph: CategoryGraph, ip: tuple[float, float], k: int = 5) -> list[_CategoryVertex]:
+        """
+        Recommend the k restaurants a random walk along the edges of the graph, restarting at
+        the restaurants this user liked, reaches most often (see
+        CategoryGraph.walk_recommendations), never walking through the ones they did not like.
+        If it reaches none (without a history, or without edges), recommend as
+        recommend_restaurants does.
+        """
+        seeds = [r.name for r in self.liked_restaurants]
+        names = graph.walk_recommendations(seeds, k, [r.name for r in self.disliked_restaurants])
+        if not names:
+            return self.recommend_restaurants(graph, ip)
+        return [graph.get_vertex(name) for name in names]
 
 
 class AllUsers:
@@ -437,13 +2025,18 @@ class AllUsers:
     Represents all the users in the food recommender. No instance objects share the same name.
 
     Instance Attributes:
-        - list_of_users (User): A list of users that have used the FOODER
+        - list_of_users (User): A list of users that have used the FOODER. This is a
+        user_store.UserStore instead of a dictionary when the users are kept in a database.
     """
-    list_of_users: dict[str, User]
+    list_of_users: dict[str, User] | UserStore
+    # Private Instance Attributes:
+    #     - _store: The database the users are kept in, or None if they are only kept in memory.
+    _store: UserStore | None
 
-    def __init__(self) -> None:
-        """Initialize AllUsers with an empty list of users."""
-        self.list_of_users = {}
+    def __init__(self, store: UserStore | None = None) -> None:
+        """Initialize AllUsers with an empty list of users, or with the users in the given store."""
+        self._store = store
+        self.list_of_users = {} if store is None else store
 
     def add_new_user(self, name: str, u: User) -> None:
         """
@@ -457,29 +2050,64 @@ class AllUsers:
         """
         return self.list_of_users[user_name]
 
+    def save_user(self, u: User) -> None:
+        """
+        Record the changes made to the given user, so they are kept once FOODER closes.
+        Do nothing if the users are only kept in memory.
+        """
+        if self._store is not None:
+            self._store.save(u)
+
+    def close(self) -> None:
+        """
+        Write any unsaved changes to the users and close their database, if there is one.
+        """
+        if self._store is not None:
+            self._store.close()
 
-def load_graph(rest_file: str) -> CategoryGraph:
+
+def load_graph(rest_file: Any, knn: int = 0, processes: int = 1, snapshot_path: str | None = None) \
+        -> CategoryGraph:
     """Return a restaurant graph corresponding to the given datasets.
 
     The CSV file should have the columns 'Category', 'Restaurant Address', 'Name',
-    'Restaurant Price Range', 'Restaurant Location' and 'Review Rates'.
+    'Restaurant Price Range', 'Restaurant Location' and 'Review Rates'. Instead of a file
+    path, rest_file may be anything ingest.read_blocks accepts, such as a file-like object, a
+    generator of lines or gzip-compressed data, as long as snapshot_path is None. The file is
+    parsed in chunks, by the given number of processes.
+
+    If knn > 0, the knn most similar restaurants of every restaurant are precomputed as edges
+    with build_knn_edges, using the given number of processes. The report of the build is kept
+    by the graph (see CategoryGraph.get_knn_report) for the caller to show if it wants.
+
+    If snapshot_path is not None, the graph is loaded from the snapshot at that path instead,
+    unless the snapshot is missing, was saved from a different version of the CSV file or with
+    a different knn. In that case the graph is loaded from the CSV file and saved there.
     """
-    graph = CategoryGraph()
+    if snapshot_path is not None:
+        with METRICS.timer('fooder_load_graph_seconds', phase='snapshot_load'):
+            source_hash = snapshot.file_hash(rest_file)
+            graph = CategoryGraph.load_snapshot(snapshot_path, source_hash)
+        if graph is not None and graph.get_knn_k() == knn:
+            return graph
+        graph = load_graph(rest_file, knn, processes)
+        with METRICS.timer('fooder_load_graph_seconds', phase='snapshot_save'):
+            graph.save_snapshot(snapshot_path, source_hash)
+        return graph
 
-    with open(rest_file, 'r') as file:
-        reader = csv.reader(file)
-        next(reader, None)  # Skip the header row
-        for row in reader:
-            category, address, name, price, review_rate, loc = row
-            location = tuple(val.strip() for val in loc.split(','))
-            latitude = float(location[0])
-            longitude = float(location[1])
-            location = (latitude, longitude)
-            if review_rate == 'NA':
-                review_rate = 0
-            else:
-                review_rate = float(review_rate)
-            curr_v = _CategoryVertex(category, address, name, price, review_rate, location)
-            graph.add_whole_vertex(curr_v)
+    graph = CategoryGraph()
+    with METRICS.timer('fooder_load_graph_seconds', phase='parse'):
+        columns = ingest.read_restaurants(rest_file, processes=processes)
+    with METRICS.timer('fooder_load_graph_seconds', phase='vertices'), ingest.gc_paused():
+        vertices = [_CategoryVertex(category, address, name, price, review_rate, (lat, lon))
+                    for name, address, category, price, review_rate, lat, lon in zip(
+                        columns.names, columns.addresses, columns.categories.tolist(), columns.price_ranges.tolist(),
+                        columns.review_rates.tolist(), columns.locations[:, 0].tolist(),
+                        columns.locations[:, 1].tolist())]
+        graph.add_vertices(vertices)
+
+    if knn > 0:
+        with METRICS.timer('fooder_load_graph_seconds', phase='knn'):
+            graph.build_knn_edges(knn, processes)
 
     return graph
@@ -0,0 +1,322 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains the RestaurantTable class, a column-oriented (NumPy) copy of
+the restaurant features of a CategoryGraph. The table lets us score one restaurant against
+every other restaurant in the graph with a handful of array operations instead of one
+Python call per restaurant.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import math
+from typing import Any, Iterable, TYPE_CHECKING
+
+import numpy as np
+
+import geodistance
+
+if TYPE_CHECKING:
+    from recommender_4d_ver import _CategoryVertex
+
+
+class RestaurantTable:
+    """A column-oriented table of the features used to compute similarity scores.
+
+    Row i of every column describes the restaurant names[i].
+
+    Instance Attributes:
+        - names: The restaurant names, in row order.
+        - rows: Maps each restaurant name to its row in the table.
+        - features: An (n, 3) array of the category, price range and effective review rate
+        (see feedback.FeedbackLog) of each restaurant.
+        - locations: An (n, 2) array of the latitude and longitude of each restaurant.
+        - base_review_rates: The review rate of each restaurant before any user feedback.
+        - knn_radii: The distance from each restaurant to its k-th most similar restaurant, as
+        found by CategoryGraph.build_knn_edges, or None if it is not known.
+
+    Representation Invariants:
+        - len(self.names) == len(self.rows) == self.features.shape[0] == self.locations.shape[0]
+        - all(self.names[self.rows[name]] == name for name in self.rows)
+        - self.knn_radii is None or len(self.knn_radii) == len(self.names)
+    """
+    names: list[Any]
+    rows: dict[Any, int]
+    features: np.ndarray
+    locations: np.ndarray
+    base_review_rates: np.ndarray
+    knn_radii: np.ndarray | None
+    # Private Instance Attributes:
+    #     - _buffers: Maps the name of each array column to a larger array whose first rows are
+    #       the column, so that rows can be appended without copying the column every time.
+    #       Empty until rows are first appended.
+    #     - _capacity: The number of rows in each buffer.
+    _buffers: dict[str, np.ndarray]
+    _capacity: int
+
+    def __init__(self, vertices: Iterable[_CategoryVertex]) -> None:
+        """Initialize a table holding the features of the given vertices."""
+        vertices = list(vertices)
+        self.names = [v.name for v in vertices]
+        self.rows = {name: i for i, name in enumerate(self.names)}
+        self.features = np.array([(float(v.category), float(v.price_range), float(v.review_rate))
+                                  for v in vertices], dtype=np.float64).reshape(-1, 3)
+        self.locations = np.array([v.location for v in vertices], dtype=np.float64).reshape(-1, 2)
+        self.base_review_rates = self.features[:, 2].copy()
+        self.knn_radii = None
+        self._buffers = {}
+        self._capacity = 0
+
+    @classmethod
+    def from_columns(cls, names: list[Any], features: np.ndarray, locations: np.ndarray,
+                     base_review_rates: np.ndarray | None = None) -> RestaurantTable:
+        """Return a table with the given columns, without going through the vertices.
+
+        If base_review_rates is None, the review rates in features are the base ones.
+        """
+        table = cls([])
+        table.names = names
+        table.rows = {name: i for i, name in enumerate(names)}
+        table.features = features
+        table.locations = locations
+        table.base_review_rates = features[:, 2].copy() if base_review_rates is None else base_review_rates
+        return table
+
+    def base_features(self) -> np.ndarray:
+        """Return a copy of the features, with the base review rates instead of the effective ones."""
+        features = np.array(self.features)
+        features[:, 2] = self.base_review_rates
+        return features
+
+    def __len__(self) -> int:
+        """Return the number of restaurants in this table."""
+        return len(self.names)
+
+    def append_rows(self, names: list[Any], features: np.ndarray, locations: np.ndarray) -> None:
+        """Append a row for each of the given restaurants, with the given (len(names), 3)
+        features and (len(names), 2) locations. The review rates in features are the base ones.
+
+        The columns grow geometrically, so appending one row at a time takes amortized
+        constant time.
+
+        Preconditions:
+            - all(name not in self.rows for name in names)
+        """
+        n, m = len(self.names), len(names)
+        if self._capacity < n + m:
+            self._capacity = max(16, 2 * (n + m))
+            self._buffers = {}
+        new_values = {'features': features, 'locations': locations, 'base_review_rates': features[:, 2],
+                      'knn_radii': np.inf}
+        for column, values in new_values.items():
+            current = getattr(self, column)
+            if current is None:
+                continue
+            buffer = self._buffers.get(column)
+            if buffer is None or current.base is not buffer:
+                # The column was replaced since the buffer was made (or there is no buffer yet).
+                buffer = np.empty((self._capacity,) + current.shape[1:], dtype=current.dtype)
+                buffer[:n] = current
+                self._buffers[column] = buffer
+            buffer[n:n + m] = values
+            setattr(self, column, buffer[:n + m])
+        for name in names:
+            self.rows[name] = len(self.names)
+            self.names.append(name)
+
+    def update_row(self, row: int, features: np.ndarray, location: tuple[float, float]) -> None:
+        """Replace the features and location of the restaurant in the given row. The review
+        rate in features is the base one, and becomes the effective one too.
+        """
+        self.features[row] = features
+        self.locations[row] = location
+        self.base_review_rates[row] = features[2]
+
+    def swap_remove(self, name: Any) -> int:
+        """Remove the row of the given restaurant by moving the last row into it, and return
+        the row the moved restaurant used to be in (the last row).
+
+        If the removed restaurant was in the last row, nothing is moved and its row is returned.
+        """
+        row = self.rows.pop(name)
+        last = len(self.names) - 1
+        if row != last:
+            moved = self.names[last]
+            self.names[row] = moved
+            self.rows[moved] = row
+            for column in (self.features, self.locations, self.base_review_rates, self.knn_radii):
+                if column is not None:
+                    column[row] = column[last]
+        self.names.pop()
+        self.features = self.features[:last]
+        self.locations = self.locations[:last]
+        self.base_review_rates = self.base_review_rates[:last]
+        if self.knn_radii is not None:
+            self.knn_radii = self.knn_radii[:last]
+        return last
+
+    def delete_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Remove the given rows, keeping the order of the other rows, and return an array
+        mapping each old row to its new row (or -1 for a removed row).
+        """
+        keep = np.ones(len(self.names), dtype=bool)
+        keep[rows] = False
+        new_rows = np.cumsum(keep) - 1
+        new_rows[~keep] = -1
+        self.names = [name for name, kept in zip(self.names, keep.tolist()) if kept]
+        self.rows = {name: i for i, name in enumerate(self.names)}
+        self.features = self.features[keep]
+        self.locations = self.locations[keep]
+        self.base_review_rates = self.base_review_rates[keep]
+        if self.knn_radii is not None:
+            self.knn_radii = self.knn_radii[keep]
+        self._buffers = {}
+        self._capacity = 0
+        return new_rows
+
+    def set_review_rate(self, name: Any, review_rate: float) -> None:
+        """Update the effective review rate stored for the given restaurant."""
+        self.features[self.rows[name], 2] = review_rate
+
+    def distances_to(self, ip: tuple[float, float], rows: np.ndarray | None = None) -> np.ndarray:
+        """Return the distance in kilometres between the given location and every restaurant,
+        or only the restaurants in the given rows if rows is not None (see geodistance).
+        """
+        locations = self.locations if rows is None else self.locations[rows]
+        return geodistance.distances_km(ip[0], ip[1], locations)
+
+    def pair_score(self, row1: int, row2: int, ip: tuple[float, float]) -> float:
+        """Return the similarity score between the restaurants in the given rows."""
+        distances = self.distances_to(ip, np.array([row1, row2]))
+        diff = self.features[row1] - self.features[row2]
+        return math.sqrt(float(diff @ diff) + float(distances[0] - distances[1]) ** 2)
+
+    def similarity_scores(self, row: int, ip: tuple[float, float], candidates: np.ndarray | None = None) \
+            -> np.ndarray:
+        """Return the similarity score between the restaurant in the given row and every
+        restaurant in the table (including itself, whose score is 0), or only the restaurants
+        in the rows of candidates if it is not None.
+
+        The scores are the same as _CategoryVertex.similarity_score: the Euclidean distance
+        between (category, price range, review rate, distance to the user in kilometres) points.
+        """
+        user_distances = self.distances_to(ip, candidates)
+        base_distance = self.distances_to(ip, np.array([row]))[0]
+        features = self.features if candidates is None else self.features[candidates]
+        diff = features - self.features[row]
+        squared = np.einsum('ij,ij->i', diff, diff)
+        squared += (user_distances - base_distance) ** 2
+        return np.sqrt(squared)
+
+    def batch_squared_scores(self, rows: np.ndarray, ips: np.ndarray) -> np.ndarray:
+        """Return a (len(rows), n) array whose entry [i, j] is the square of the similarity
+        score between the restaurant in rows[i] and the restaurant in row j, as seen by a user
+        at ips[i].
+
+        Preconditions:
+            - ips.shape == (len(rows), 2)
+        """
+        squared = geodistance.pairwise_distances_km(ips, self.locations)  # Each user's distance to every restaurant
+        squared -= squared[np.arange(len(rows)), rows][:, None].copy()
+        np.square(squared, out=squared)
+        temp = np.empty_like(squared)
+        for column in range(self.features.shape[1]):
+            np.subtract(self.features[None, :, column], self.features[rows, column, None], out=temp)
+            np.square(temp, out=temp)
+            squared += temp
+        return squared
+
+    def cross_scores(self, rows: np.ndarray, ips: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Return a (len(rows), len(candidates)) array whose entry [i, j] is the similarity
+        score between the restaurants in rows[i] and candidates[j], as seen by a user at ips[i]
+        (up to rounding).
+
+        Preconditions:
+            - ips.shape == (len(rows), 2)
+        """
+        squared = geodistance.pairwise_distances_km(ips, self.locations[candidates])
+        squared -= geodistance.paired_distances_km(ips, self.locations[rows])[:, None]
+        np.square(squared, out=squared)
+        for column in range(self.features.shape[1]):
+            squared += (self.features[None, candidates, column] - self.features[rows, column, None]) ** 2
+        return np.sqrt(squared, out=squared)
+
+    def pairwise_scores(self, rows: np.ndarray, ip: tuple[float, float]) -> np.ndarray:
+        """Return a (len(rows), len(rows)) array whose entry [i, j] is the similarity score
+        between the restaurants in rows[i] and rows[j], as seen by a user at ip.
+        """
+        points = np.column_stack([self.features[rows], self.distances_to(ip, rows)])
+        squared = np.zeros((len(rows), len(rows)))
+        temp = np.empty_like(squared)
+        for column in points.T:
+            np.subtract(column[:, None], column[None, :], out=temp)
+            np.square(temp, out=temp)
+            squared += temp
+        return np.sqrt(squared, out=squared)
+
+    def anchor_squared_scores(self, rows: np.ndarray, ip: tuple[float, float], aggregate: str,
+                              block_scores: int = 1 << 20) -> np.ndarray:
+        """Return, for every restaurant, an aggregate of the squares of its similarity scores
+        with the restaurants in the given (anchor) rows, as seen by a user at ip: their mean if
+        aggregate is 'mean', or their minimum (the square of the score with the most similar
+        anchor) if it is 'max'.
+
+        The mean is computed from the centroid of the anchors, in one pass over the table, since
+        the mean squared distance to a set of points is the squared distance to their centroid
+        plus their spread. The minimum is computed as a matrix product of the table and the
+        anchors, about block_scores entries at a time.
+
+        Preconditions:
+            - len(rows) > 0
+            - aggregate in ('mean', 'max')
+        """
+        distances = self.distances_to(ip)
+        points = np.column_stack([self.features, distances])
+        anchors = points[rows]
+        if aggregate == 'mean':
+            centroid = anchors.mean(axis=0)
+            diff = points - centroid
+            spread = float(np.mean(np.einsum('ij,ij->i', anchors - centroid, anchors - centroid)))
+            return np.einsum('ij,ij->i', diff, diff) + spread
+
+        squared = np.empty(len(points))
+        point_norms = np.einsum('ij,ij->i', points, points)
+        anchor_norms = np.einsum('ij,ij->i', anchors, anchors)
+        block_size = max(1, block_scores // len(anchors))
+        for start in range(0, len(points), block_size):
+            block = points[start:start + block_size]
+            products = block @ anchors.T
+            products *= -2.0
+            products += anchor_norms
+            squared[start:start + block_size] = products.min(axis=1)
+        squared += point_norms
+        # The expansion can round an exact match to just below 0.
+        return np.maximum(squared, 0.0, out=squared)
+
+    def top_k(self, scores: np.ndarray, k: int, exclude: int | None = None) -> np.ndarray:
+        """Return the rows of the k lowest scores (i.e. the k most similar restaurants),
+        ordered from the most to the least similar. Ties are broken by row.
+
+        If exclude is not None, that row is never returned.
+        """
+        if exclude is not None:
+            scores = scores.copy()
+            scores[exclude] = np.inf
+            k = min(k, len(scores) - 1)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k < len(scores):
+            candidates = np.argpartition(scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.lexsort((candidates, scores[candidates]))]
+
+    def names_of(self, rows: Iterable[int]) -> list[Any]:
+        """Return the restaurant names of the given rows."""
+        return [self.names[i] for i in rows]
@@ -0,0 +1,209 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains the random sampling used for recommendations without history:
+uniform sampling of rows without replacement that skips excluded rows (such as a user's
+disliked restaurants), and FenwickTree, which samples rows with probability proportional to
+a weight (such as the effective review rate) and keeps doing so as the weights change.
+
+Both work on row numbers, such as the rows of a RestaurantTable, so nothing proportional to
+the number of restaurants is built for each sample.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import random
+from typing import Any
+
+import numpy as np
+
+
+def sample_rows(n: int, k: int, excluded: set[int] | frozenset[int] = frozenset(), rng: Any = random) -> list[int]:
+    """Return min(k, the number of rows left) distinct rows of range(n) that are not in
+    excluded, chosen uniformly at random, in the order they were drawn.
+
+    Rows are drawn at random until k of them are acceptable, which takes O(k) draws when
+    most rows are acceptable. When at least half of the rows would be excluded or drawn,
+    the acceptable rows are listed and sampled instead.
+
+    Preconditions:
+        - all(0 <= row < n for row in excluded)
+    """
+    k = min(k, n - len(excluded))
+    if k <= 0:
+        return []
+    if 2 * (k + len(excluded)) > n:
+        return rng.sample([row for row in range(n) if row not in excluded], k)
+    chosen = {}
+    while len(chosen) < k:
+        row = rng.randrange(n)
+        if row not in excluded:
+            chosen[row] = None
+    return list(chosen)
+
+
+class FenwickTree:
+    """A Fenwick (binary indexed) tree over non-negative weights, one per row, used to sample
+    rows with probability proportional to their weight.
+
+    Changing a weight and sampling a row both take O(log n) time.
+
+    Instance Attributes:
+        - weights: The weight of each row.
+
+    Representation Invariants:
+        - all(weight >= 0 for weight in self.weights)
+    """
+    weights: list[float]
+    # Private Instance Attributes:
+    #     - _tree: _tree[i - 1] is the sum of the weights of the rows in
+    #       range(i - (i & -i), i), for i in range(1, n + 1).
+    #     - _top: The largest power of two that is at most the number of rows, or 0 if there
+    #       are no rows.
+    #     - _positive: The number of rows with a positive weight.
+    _tree: list[float]
+    _top: int
+    _positive: int
+
+    def __init__(self, weights: np.ndarray) -> None:
+        """Initialize a tree over the given weights.
+
+        Preconditions:
+            - (weights >= 0).all()
+        """
+        n = len(weights)
+        prefix = np.zeros(n + 1)
+        np.cumsum(weights, out=prefix[1:])
+        ends = np.arange(1, n + 1)
+        self._tree = (prefix[ends] - prefix[ends - (ends & -ends)]).tolist()
+        self.weights = np.asarray(weights, dtype=np.float64).tolist()
+        self._top = 1 << (n.bit_length() - 1) if n > 0 else 0
+        self._positive = int(np.count_nonzero(weights))
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.weights)
+
+    def update(self, row: int, weight: float) -> None:
+        """Change the weight of the given row.
+
+        Preconditions:
+            - weight >= 0
+        """
+        delta = weight - self.weights[row]
+        self._positive += (weight > 0) - (self.weights[row] > 0)
+        self.weights[row] = weight
+        i = row + 1
+        while i <= len(self._tree):
+            self._tree[i - 1] += delta
+            i += i & -i
+
+    def append(self, weight: float) -> None:
+        """Add a row with the given weight after the last row.
+
+        Preconditions:
+            - weight >= 0
+        """
+        i = len(self._tree) + 1
+        # The new entry sums the rows in range(i - (i & -i), i): the new row and the ones
+        # before it in that range, which are already in the tree.
+        self._tree.append(self._prefix(i - 1) - self._prefix(i - (i & -i)) + weight)
+        self.weights.append(float(weight))
+        self._positive += weight > 0
+        self._top = 1 << (i.bit_length() - 1)
+
+    def truncate(self, n: int) -> None:
+        """Remove every row from row n on. No entry of the other rows sums any of them, so the
+        rest of the tree is kept as it is.
+
+        Preconditions:
+            - 0 <= n <= len(self)
+        """
+        self._positive -= sum(1 for weight in self.weights[n:] if weight > 0)
+        del self.weights[n:]
+        del self._tree[n:]
+        self._top = 1 << (n.bit_length() - 1) if n > 0 else 0
+
+    def has_weight(self) -> bool:
+        """Return whether any row has a positive weight."""
+        return self._positive > 0
+
+    def total(self) -> float:
+        """Return the sum of all the weights."""
+        return self._prefix(len(self._tree))
+
+    def _prefix(self, count: int) -> float:
+        """Return the sum of the weights of the first count rows."""
+        total = 0.0
+        i = count
+        while i > 0:
+            total += self._tree[i - 1]
+            i -= i & -i
+        return total
+
+    def find(self, value: float) -> int:
+        """Return the row whose weight covers value when the weights are laid end to end, in
+        row order: the first row whose weight and the weights before it add up to more than
+        value.
+
+        Preconditions:
+            - self.has_weight()
+            - 0 <= value < self.total()
+        """
+        row = 0
+        bit = self._top
+        while bit > 0:
+            if row + bit <= len(self._tree) and self._tree[row + bit - 1] <= value:
+                row += bit
+                value -= self._tree[row - 1]
+            bit >>= 1
+        # Rounding in the sums may land value on a row with no weight, or past the last row.
+        row = min(row, len(self.weights) - 1)
+        while row > 0 and self.weights[row] == 0.0:
+            row -= 1
+        while self.weights[row] == 0.0:
+            row += 1
+        return row
+
+    def sample(self, rng: Any = random) -> int:
+        """Return a row chosen with probability proportional to its weight.
+
+        Preconditions:
+            - self.has_weight()
+        """
+        return self.find(rng.random() * self.total())
+
+    def sample_distinct(self, k: int, excluded: set[int] | frozenset[int] = frozenset(),
+                        rng: Any = random) -> list[int]:
+        """Return up to k distinct rows not in excluded, each chosen with probability
+        proportional to its weight among the rows not chosen yet, in the order they were drawn.
+        Rows with no weight are never chosen.
+
+        Rows are drawn from the tree and rejected if excluded or already chosen. If that keeps
+        failing, because the excluded and chosen rows hold most of the weight, the rest are
+        drawn from a copy of the weights instead. The tree itself is never changed, so it can
+        be sampled while another thread updates it.
+        """
+        chosen = {}
+        attempts = 4 * (k + len(excluded)) + 16
+        while len(chosen) < k and attempts > 0 and self.has_weight():
+            row = self.sample(rng)
+            if row not in excluded:
+                chosen[row] = None
+            attempts -= 1
+        if len(chosen) < k:
+            weights = np.array(self.weights)
+            weights[list(excluded | chosen.keys())] = 0.0
+            while len(chosen) < k and weights.any():
+                cumulative = np.cumsum(weights)
+                row = min(int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right')),
+                          len(weights) - 1)
+                if weights[row] > 0:
+                    chosen[row] = None
+                    weights[row] = 0.0
+        return list(chosen)
@@ -0,0 +1,359 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module runs FOODER as a long-running HTTP service, so that many people can use
+it at once. The restaurant graph is loaded once and shared by every request. The service
+uses asyncio to handle connections, and hands the CPU-bound scoring to a pool of worker
+threads (NumPy releases the GIL while it computes scores). The graph serializes the changes
+to itself (see CategoryGraph._lock), and the requests of each user are handled one at a time.
+
+Endpoints (all responses are JSON, except /metrics):
+
+    GET  /recommend?user=NAME[&lat=..&lon=..][&k=5][&history=mean|max|walk]
+    GET  /similar?name=RESTAURANT[&lat=..&lon=..][&k=5][&FILTERS]
+    GET  /search?FILTERS
+    GET  /nearby?[lat=..&lon=..]&radius=KM   or   /nearby?[lat=..&lon=..][&k=5]
+    GET  /popular?[lat=..&lon=..][&k=5][&by=rating|feedback][&category=C or &price_range=P]
+    POST /feedback   with body {"user": NAME, "restaurant": RESTAURANT, "feedback": "yes" or "no"}
+    GET  /health
+    GET  /metrics    the instrumentation metrics, in the Prometheus text format
+
+With history, the recommendations are the restaurants most similar to every restaurant the user
+liked, rather than to the last one (see CategoryGraph.most_similar_to_many), or with history=walk
+the restaurants a random walk along the edges of the graph from them reaches most often (see
+graph_walk).
+
+/popular returns the best restaurants by effective rating or by number of pieces of feedback,
+of the given category or price range, or else near the user (see CategoryGraph.popular_restaurants).
+
+FILTERS restrict the restaurants returned: category=3,5 (any of these categories), min_price=..,
+max_price=.., min_rating=.. and max_rating=.. (see filter_index.RestaurantFilter).
+
+When lat and lon are missing, the client's IP address is looked up in the offline IP table
+(see user_location), so the service never calls out to the network.
+
+Run it from the project directory:
+
+    python service.py --port 8080 --workers 4 [--shards 4 [--partition geo]] [--diversity 0.7] [--metrics]
+
+The metrics are only recorded when the service is started with --metrics. With --shards,
+similar restaurants are scored in that many worker processes instead (see sharding), so that
+scoring is not limited to one interpreter. With --diversity, similar restaurants are re-ranked so
+they are not all alike (see CategoryGraph.configure_diversity).
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import traceback
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+import sharding
+import user_location
+from filter_index import RestaurantFilter
+from instrumentation import METRICS
+from leaderboard import RANKINGS
+from recommender_4d_ver import ANCHOR_AGGREGATES, MMR_POOL_SIZE, AllUsers, CategoryGraph, User, load_graph
+from user_store import UserStore
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+# The largest request body accepted, in bytes.
+MAX_BODY = 1 << 16
+
+
+class RequestError(Exception):
+    """An error in a request, reported to the client with the given HTTP status."""
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize an error with the given HTTP status and message."""
+        super().__init__(message)
+        self.status = status
+
+
+class RecommenderService:
+    """The endpoints of the FOODER service, on top of one shared restaurant graph.
+
+    Instance Attributes:
+        - graph: The restaurant graph shared by all requests.
+        - users: The users of the service.
+    """
+    graph: CategoryGraph
+    users: AllUsers
+    # Private Instance Attributes:
+    #     - _executor: The worker pool that scoring runs in.
+    #     - _locator: The provider used to locate clients that do not send their location.
+    #     - _routes: Maps (HTTP method, path) to the method handling it.
+    #     - _users_lock: Held while users are looked up or created.
+    #     - _user_locks: Maps the name of each user to a lock held while their requests are
+    #       handled, since feedback changes the user's history.
+    _executor: ThreadPoolExecutor
+    _locator: user_location.LocationProvider
+    _routes: dict[tuple[str, str], Callable[[dict[str, Any], str], Any]]
+    _users_lock: threading.Lock
+    _user_locks: dict[str, threading.Lock]
+
+    def __init__(self, graph: CategoryGraph, users: AllUsers, workers: int = 4) -> None:
+        """Initialize the service with the given graph and users, scoring in the given number
+        of worker threads.
+        """
+        self.graph = graph
+        self.users = users
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._locator = user_location.OfflineIpTable()
+        self._routes = {('GET', '/recommend'): self.recommend, ('GET', '/similar'): self.similar,
+                        ('GET', '/search'): self.search, ('GET', '/nearby'): self.nearby,
+                        ('GET', '/popular'): self.popular, ('POST', '/feedback'): self.feedback,
+                        ('GET', '/health'): self.health, ('GET', '/metrics'): self.metrics}
+        self._users_lock = threading.Lock()
+        self._user_locks = {}
+        # Build the derived structures now, rather than in the middle of the first requests.
+        graph.get_table()
+        graph.get_grid()
+        graph.get_filter_index()
+        graph.get_leaderboards()
+
+    def _location(self, params: dict[str, Any], client_ip: str) -> tuple[float, float]:
+        """Return the location in the request parameters, or the location of the client's IP."""
+        if 'lat' in params and 'lon' in params:
+            return float(params['lat']), float(params['lon'])
+        return self._locator.locate(client_ip) or user_location.DEFAULT_LOCATION
+
+    def _user(self, name: str) -> tuple[User, threading.Lock]:
+        """Return the user with the given name, creating them if they are new, and the lock to
+        hold while handling their request.
+        """
+        with self._users_lock:
+            if name not in self.users.list_of_users:
+                self.users.add_new_user(name, User(name))
+            return self.users.existing_user(name), self._user_locks.setdefault(name, threading.Lock())
+
+    def _filter(self, params: dict[str, Any]) -> RestaurantFilter | None:
+        """Return the filter in the request parameters, or None if there is none."""
+        def number(key: str, kind: type) -> Any:
+            return kind(params[key]) if key in params else None
+
+        categories = None
+        if 'category' in params:
+            categories = frozenset(int(category) for category in str(params['category']).split(','))
+        where = RestaurantFilter(categories, number('min_price', int), number('max_price', int),
+                                 number('min_rating', float), number('max_rating', float))
+        return None if where.is_empty() else where
+
+    def _restaurant(self, name: Any) -> str:
+        """Return the given restaurant name, or raise a RequestError if it is not in the graph."""
+        if not isinstance(name, str) or not self.graph.has_vertex(name):
+            raise RequestError(404, f'unknown restaurant: {name}')
+        return name
+
+    def recommend(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return k recommendations for the user in params."""
+        if 'user' not in params:
+            raise RequestError(400, 'missing parameter: user')
+        history = params.get('history')
+        if history is not None and history != 'walk' and history not in ANCHOR_AGGREGATES:
+            raise RequestError(400, f'history must be one of {", ".join(ANCHOR_AGGREGATES)} or walk')
+        user, lock = self._user(params['user'])
+        ip = self._location(params, client_ip)
+        k = int(params.get('k', 5))
+        with lock:
+            if history == 'walk':
+                restaurants = [v.name for v in user.recommend_by_walk(self.graph, ip, k)]
+            elif history is not None:
+                restaurants = [v.name for v in user.recommend_from_history(self.graph, ip, k, history)]
+            else:
+                restaurants = self.graph.recommend_batch([user], [ip], k)[0]
+        return {'user': user.name, 'restaurants': restaurants}
+
+    def similar(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return the k restaurants most similar to the restaurant in params."""
+        name = self._restaurant(params.get('name'))
+        ip = self._location(params, client_ip)
+        k = int(params.get('k', 5))
+        return {'name': name, 'restaurants': self.graph.most_similar_restaurants(name, ip, k, self._filter(params))}
+
+    def search(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return the restaurants matching the filter in params."""
+        where = self._filter(params)
+        if where is None:
+            raise RequestError(400, 'expected at least one filter')
+        return {'restaurants': self.graph.filter_restaurants(where)}
+
+    def nearby(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return the restaurants within the radius in params (in kilometres), or the k nearest restaurants."""
+        lat, lon = self._location(params, client_ip)
+        if 'radius' in params:
+            return {'restaurants': self.graph.restaurants_within(lat, lon, float(params['radius']))}
+        return {'restaurants': self.graph.nearest(lat, lon, int(params.get('k', 5)))}
+
+    def popular(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return the k best restaurants of the category or price range in params, or else
+        near the location in params or of the client's IP.
+        """
+        by = params.get('by', 'rating')
+        if by not in RANKINGS:
+            raise RequestError(400, f'by must be one of {", ".join(RANKINGS)}')
+        k = int(params.get('k', 5))
+        if 'category' in params:
+            return {'restaurants': self.graph.popular_restaurants(k, by, category=int(params['category']))}
+        if 'price_range' in params:
+            return {'restaurants': self.graph.popular_restaurants(k, by, price_range=int(params['price_range']))}
+        return {'restaurants': self.graph.popular_restaurants(k, by, near=self._location(params, client_ip))}
+
+    def feedback(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Record the user's feedback on a restaurant, as main.py does after a recommendation."""
+        if 'user' not in params or params.get('feedback') not in ('yes', 'no'):
+            raise RequestError(400, 'expected user, restaurant and feedback ("yes" or "no")')
+        name = self._restaurant(params.get('restaurant'))
+        user, lock = self._user(params['user'])
+        with lock:
+            self.graph.record_feedback(name, params['feedback'], user.name)
+            if params['feedback'] == 'yes':
+                user.like(self.graph.get_vertex(name))
+            else:
+                user.dislike(self.graph.get_vertex(name))
+            self.users.save_user(user)
+        return {'user': user.name, 'restaurant': name, 'rating': self.graph.effective_rating(name)}
+
+    def health(self, params: dict[str, Any], client_ip: str) -> dict[str, Any]:
+        """Return the size of the graph and the hit rate of its memoized similar restaurants."""
+        return {'status': 'ok', 'restaurants': len(self.graph.get_table()),
+                'similar_memo': self.graph.similarity_memo_stats()}
+
+    def metrics(self, params: dict[str, Any], client_ip: str) -> str:
+        """Return the instrumentation metrics in the Prometheus text format."""
+        return METRICS.to_prometheus()
+
+    async def dispatch(self, method: str, target: str, body: bytes, client_ip: str) -> tuple[int, Any]:
+        """Return the HTTP status and response for the given request. The response is sent as
+        plain text if it is a string, and as JSON otherwise.
+        """
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                return 405, {'error': f'{method} not allowed on {url.path}'}
+            return 404, {'error': f'no such endpoint: {url.path}'}
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if body:
+                params.update(json.loads(body))
+            loop = asyncio.get_running_loop()
+            return 200, await loop.run_in_executor(self._executor, handler, params, client_ip)
+        except RequestError as error:
+            return error.status, {'error': str(error)}
+        except KeyError as error:
+            return 404, {'error': f'not found: {error}'}
+        except (ValueError, TypeError, AttributeError) as error:
+            return 400, {'error': str(error)}
+        except Exception as error:  # pylint: disable=broad-except
+            traceback.print_exc()
+            return 500, {'error': f'internal error: {type(error).__name__}'}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the HTTP/1.1 requests sent on one connection, until the client closes it."""
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else ''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                if len(parts) != 3 or length > MAX_BODY:
+                    status, response = 400, {'error': 'malformed request'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, response = await self.dispatch(parts[0], parts[1], body, client_ip)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                if isinstance(response, str):
+                    payload, content_type = response.encode('utf-8'), 'text/plain; version=0.0.4'
+                else:
+                    payload, content_type = json.dumps(response).encode('utf-8'), 'application/json'
+                writer.write(f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                             f'Content-Type: {content_type}\r\n'
+                             f'Content-Length: {len(payload)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1')
+                             + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        """Serve requests on the given host and port until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'FOODER is serving on http://{host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        """Stop the worker pool and the graph's worker processes, and save the users."""
+        self._executor.shutdown()
+        self.graph.configure_shards(0)
+        self.users.close()
+
+
+def main() -> None:
+    """Load the restaurant graph and serve it until interrupted."""
+    parser = argparse.ArgumentParser(description='Run the FOODER recommendation service.')
+    parser.add_argument('--csv', default='filtered_restaurant_dt_4d.csv', help='the restaurant CSV file')
+    parser.add_argument('--snapshot', default='restaurant_snapshot', help='the graph snapshot directory')
+    parser.add_argument('--users', default='fooder_users.db', help='the user database')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=4, help='the number of scoring threads')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='the number of worker processes that similar restaurants are scored in')
+    parser.add_argument('--partition', choices=sharding.PARTITIONS, default='hash',
+                        help='how restaurants are split between the worker processes')
+    parser.add_argument('--diversity', type=float, metavar='TRADE_OFF',
+                        help='re-rank similar restaurants for diversity, weighing relevance by TRADE_OFF (0 to 1)')
+    parser.add_argument('--metrics', action='store_true', help='record metrics, served at /metrics')
+    args = parser.parse_args()
+
+    if args.metrics:
+        METRICS.enable()
+
+    graph = load_graph(args.csv, snapshot_path=args.snapshot)
+    graph.configure_shards(args.shards, args.partition)
+    if args.diversity is not None:
+        graph.configure_diversity(MMR_POOL_SIZE, args.diversity)
+    service = RecommenderService(graph, AllUsers(UserStore(args.users, graph)), args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
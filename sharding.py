@@ -0,0 +1,443 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains ShardedCatalog, which splits the restaurants of a RestaurantTable
+into shards that are scored by worker processes, so that finding the most similar restaurants
+uses every core instead of the one interpreter of CategoryGraph.
+
+The restaurants are partitioned either by a hash of their name or by geography (bands of
+latitude, which held the same number of restaurants when the catalog was sharded). The columns
+of each shard (the features, locations and catalog rows of its restaurants) are kept in one
+block of shared memory, which the coordinator writes and its worker reads without copying.
+When the catalog changes, only the shards whose columns changed are written again, to new
+blocks that their workers switch to; the workers keep running.
+
+A query is first sent to the shards that may hold its most similar restaurants: the similarity
+score includes the difference between the distances of the two restaurants to the user, so a
+shard whose restaurants are all much closer to or further from the user than the base
+restaurant cannot. Each shard returns its k most similar restaurants, and the other shards are
+only asked if they could still hold a better one. With the geographic partition, only the
+bands around the user and the base restaurant are usually asked; with the hash partition,
+every shard is. The coordinator merges the answers into the k most similar overall.
+
+Every request to a worker carries an id, which its answer is matched with, so requests from
+many threads are in flight on the same connection at once.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from concurrent.futures import Future
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import operator
+import signal
+import threading
+from typing import Any, Iterator
+import zlib
+
+import numpy as np
+
+import geodistance
+from restaurant_table import RestaurantTable
+
+PARTITIONS = ('hash', 'geo')
+
+# The number of float64 columns of a shard: category, price range, review rate, latitude,
+# longitude and catalog row.
+SHARD_COLUMNS = 6
+
+
+def _shard_columns(buffer: Any, size: int) -> np.ndarray:
+    """Return the (size, SHARD_COLUMNS) array of the columns of a shard stored in buffer."""
+    return np.ndarray((size, SHARD_COLUMNS), dtype=np.float64, buffer=buffer)
+
+
+def shard_top_k(columns: np.ndarray, features: np.ndarray, base_distance: float, ip: tuple[float, float],
+                k: int, exclude: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the catalog rows and scores of the k restaurants of a shard most similar to a
+    restaurant with the given features and distance to a user at ip, from the most to the least
+    similar, skipping the restaurant in the shard's row exclude (if it is not -1). Ties are
+    broken by catalog row.
+
+    The scores are the same as RestaurantTable.similarity_scores.
+    """
+    diff = columns[:, :3] - features
+    squared = np.einsum('ij,ij->i', diff, diff)
+    squared += (geodistance.distances_km(ip[0], ip[1], columns[:, 3:5]) - base_distance) ** 2
+    if exclude >= 0:
+        squared[exclude] = np.inf
+        k = min(k, len(squared) - 1)
+    k = min(k, len(squared))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    candidates = np.argpartition(squared, k - 1)[:k] if k < len(squared) else np.arange(len(squared))
+    rows = columns[candidates, 5].astype(np.intp)
+    order = np.lexsort((rows, squared[candidates]))
+    return rows[order], np.sqrt(squared[candidates[order]])
+
+
+def _serve_shard(connection: Connection, memory_name: str, size: int) -> None:
+    """Answer the requests received on connection about the shard of the given size stored in
+    the shared memory block of the given name, until told to stop.
+
+    Each request is a (request id, command, payload) tuple, answered with (request id, result).
+    A 'query' payload is a list of (features, base distance, user location, k, row to exclude)
+    tuples, whose result is the list of the results of shard_top_k. An 'attach' payload is the
+    (name, size) of a new block holding the shard, which the worker switches to.
+
+    Interrupts (such as Ctrl-C in the terminal, which reaches every process) are ignored: the
+    coordinator stops the worker when it closes.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    memory = shared_memory.SharedMemory(memory_name)
+    columns = _shard_columns(memory.buf, size)
+    try:
+        while True:
+            request = connection.recv()
+            if request is None:
+                break
+            request_id, command, payload = request
+            if command == 'attach':
+                del columns
+                memory.close()
+                memory = shared_memory.SharedMemory(payload[0])
+                columns = _shard_columns(memory.buf, payload[1])
+                connection.send((request_id, None))
+            else:
+                connection.send((request_id, [shard_top_k(columns, *query) for query in payload]))
+    finally:
+        del columns
+        memory.close()
+
+
+class ShardedCatalog:
+    """The restaurants of a RestaurantTable split into shards scored by worker processes.
+
+    Instance Attributes:
+        - table: The table sharded. Its names and rows are the catalog rows of the shards.
+        - partition: How the restaurants are partitioned, one of PARTITIONS.
+        - shard_of: The shard of each catalog row.
+        - position: The row of each catalog row in the columns of its shard.
+
+    Representation Invariants:
+        - self.partition in PARTITIONS
+        - len(self.shard_of) == len(self.position) == len(self.table)
+    """
+    table: RestaurantTable
+    partition: str
+    shard_of: np.ndarray
+    position: np.ndarray
+    # Private Instance Attributes:
+    #     - _cutoffs: The latitudes where the bands of the geographic partition start, after
+    #       the first, or None for the hash partition.
+    #     - _names: The name of each catalog row when the shards were last written.
+    #     - _memories: The shared memory block of each shard.
+    #     - _columns: The columns of each shard, in its shared memory block.
+    #     - _bounds: The (lowest latitude, highest latitude, lowest longitude, highest
+    #       longitude) of the restaurants of each shard, or NaN for an empty shard.
+    #     - _workers: The worker process of each shard.
+    #     - _connections: The connection to the worker of each shard.
+    #     - _send_locks: The lock held while sending on the connection to each worker.
+    #     - _receivers: The thread receiving the answers of each worker.
+    #     - _pending: Maps the id of each request to a worker to the Future of its answer,
+    #       for each worker.
+    #     - _request_ids: The ids of requests.
+    #     - _generation: The number of times the shards were written again.
+    #     - _lock: Held while the shards are written, and while requests are sent, so no
+    #       request is sent with the rows of one version of the shards and answered by another.
+    _cutoffs: np.ndarray | None
+    _names: list[Any]
+    _memories: list[shared_memory.SharedMemory]
+    _columns: list[np.ndarray]
+    _bounds: np.ndarray
+    _workers: list[multiprocessing.Process]
+    _connections: list[Connection]
+    _send_locks: list[threading.Lock]
+    _receivers: list[threading.Thread]
+    _pending: list[dict[int, Future]]
+    _request_ids: Iterator[int]
+    _generation: int
+    _lock: threading.Lock
+
+    def __init__(self, table: RestaurantTable, shards: int, partition: str = 'hash') -> None:
+        """Split the restaurants of the given table into the given number of shards and start
+        a worker process for each.
+
+        Preconditions:
+            - shards >= 1
+            - partition in PARTITIONS
+        """
+        self.table = table
+        self.partition = partition
+        self._cutoffs = None
+        if partition == 'geo':
+            latitudes = np.sort(table.locations[:, 0])
+            self._cutoffs = latitudes[[i * len(latitudes) // shards for i in range(1, shards)]] \
+                if len(latitudes) > 0 else np.zeros(shards - 1)
+        self._names = []
+        self.shard_of = np.empty(0, dtype=np.intp)
+        self.position = np.empty(0, dtype=np.intp)
+        self._bounds = np.full((shards, 4), np.nan)
+
+        self._memories, self._columns = [], []
+        for shard, rows in enumerate(self._split(self._assign(table), shards)):
+            memory, columns = self._write(shard, rows)
+            self._memories.append(memory)
+            self._columns.append(columns)
+        self._names = list(table.names)
+
+        context = multiprocessing.get_context('spawn')
+        self._workers, self._connections, self._receivers = [], [], []
+        self._send_locks = [threading.Lock() for _ in range(shards)]
+        self._pending = [{} for _ in range(shards)]
+        self._request_ids = itertools.count()
+        self._generation = 0
+        self._lock = threading.Lock()
+        for shard, (memory, columns) in enumerate(zip(self._memories, self._columns)):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=_serve_shard, args=(worker_connection, memory.name, len(columns)),
+                                     daemon=True)
+            worker.start()
+            worker_connection.close()
+            receiver = threading.Thread(target=self._receive, args=(shard, connection), daemon=True)
+            receiver.start()
+            self._workers.append(worker)
+            self._connections.append(connection)
+            self._receivers.append(receiver)
+
+    def __len__(self) -> int:
+        """Return the number of shards."""
+        return len(self._workers)
+
+    def __enter__(self) -> ShardedCatalog:
+        """Return this catalog, which is closed on leaving the with block."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close this catalog."""
+        self.close()
+
+    def _assign(self, table: RestaurantTable) -> np.ndarray:
+        """Return the shard of each row of the given table. A restaurant that keeps its row
+        keeps its shard without being hashed again.
+        """
+        if self._cutoffs is not None:
+            return np.searchsorted(self._cutoffs, table.locations[:, 0], side='right').astype(np.intp)
+        shards = len(self._bounds)
+        kept = min(len(self._names), len(table))
+        shard_of = np.empty(len(table), dtype=np.intp)
+        same = np.fromiter(map(operator.eq, table.names[:kept], self._names[:kept]), dtype=bool, count=kept)
+        shard_of[:kept][same] = self.shard_of[:kept][same]
+        for row in itertools.chain(np.flatnonzero(~same).tolist(), range(kept, len(table))):
+            shard_of[row] = zlib.crc32(str(table.names[row]).encode()) % shards
+        return shard_of
+
+    def _split(self, shard_of: np.ndarray, shards: int) -> list[np.ndarray]:
+        """Set the shards and positions of the catalog rows to the given shards, and return
+        the catalog rows of each shard, in increasing order.
+        """
+        order = np.argsort(shard_of, kind='stable')
+        split = np.split(order, np.cumsum(np.bincount(shard_of, minlength=shards))[:-1])
+        self.shard_of = shard_of
+        self.position = np.empty(len(shard_of), dtype=np.intp)
+        for rows in split:
+            self.position[rows] = np.arange(len(rows))
+        return split
+
+    def _write(self, shard: int, rows: np.ndarray) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+        """Return a new shared memory block holding the columns of the given catalog rows,
+        and the columns in it, and record their bounds as the bounds of the given shard.
+        """
+        # A block of size 0 cannot be created.
+        memory = shared_memory.SharedMemory(create=True, size=max(1, len(rows) * SHARD_COLUMNS * 8))
+        columns = _shard_columns(memory.buf, len(rows))
+        columns[:, :3] = self.table.features[rows]
+        columns[:, 3:5] = self.table.locations[rows]
+        columns[:, 5] = rows
+        if len(rows) > 0:
+            self._bounds[shard] = (columns[:, 3].min(), columns[:, 3].max(), columns[:, 4].min(), columns[:, 4].max())
+        else:
+            self._bounds[shard] = np.nan
+        return memory, columns
+
+    def refresh(self, table: RestaurantTable) -> None:
+        """Bring the shards up to date with the given table, after its rows were added,
+        removed or changed (or it replaced the table sharded).
+
+        Only the shards whose columns changed are written again, each to a new block of shared
+        memory that its worker switches to before answering the requests sent after this call.
+        The old block is released once the worker has switched. Restaurants are assigned to
+        the bands of the geographic partition chosen when the catalog was created.
+        """
+        with self._lock:
+            self.table = table
+            split = self._split(self._assign(table), len(self))
+            for shard, rows in enumerate(split):
+                current = self._columns[shard]
+                if len(current) == len(rows) and np.array_equal(current[:, 5], rows) \
+                        and np.array_equal(current[:, :3], table.features[rows]) \
+                        and np.array_equal(current[:, 3:5], table.locations[rows]):
+                    continue
+                old_memory = self._memories[shard]
+                self._memories[shard], self._columns[shard] = self._write(shard, rows)
+                del current
+                answer = self._send(shard, 'attach', (self._memories[shard].name, len(rows)))
+                answer.add_done_callback(lambda _, memory=old_memory: _release(memory))
+            self._names = list(table.names)
+            self._generation += 1
+
+    def shard_sizes(self) -> list[int]:
+        """Return the number of restaurants in each shard."""
+        return [len(columns) for columns in self._columns]
+
+    def set_review_rate(self, row: int, review_rate: float) -> None:
+        """Update the effective review rate of the restaurant in the given catalog row, which
+        its worker sees from its next query.
+        """
+        self._columns[self.shard_of[row]][self.position[row], 2] = review_rate
+
+    def most_similar(self, row: int, ip: tuple[float, float], k: int = 5) -> np.ndarray:
+        """Return the catalog rows of the k restaurants most similar to the restaurant in the
+        given row for a user at ip, from the most to the least similar, as
+        CategoryGraph.most_similar_restaurants would find them.
+        """
+        return self.most_similar_batch([(row, ip)], k)[0]
+
+    def most_similar_batch(self, queries: list[tuple[int, tuple[float, float]]], k: int = 5) -> list[np.ndarray]:
+        """Return the result of most_similar for each (catalog row, user location) query.
+
+        The queries are sent together, first to the shards with the lowest bound on their
+        scores (see _lower_bounds), then to the other shards whose bound is at most the k-th
+        best score found so far. If the shards are written again in between, the queries are
+        sent again.
+        """
+        while True:
+            with self._lock:
+                generation = self._generation
+                requests = [self._request(row, ip, k) for row, ip in queries]
+                bounds = [lower for _, lower in requests]
+                first = [lower <= lower.min() for lower in bounds]
+                answers = self._ask(requests, first)
+            found = self._gather(len(queries), answers)
+
+            rest = []
+            for i, (rows, scores) in enumerate(found):
+                threshold = np.sort(scores)[k - 1] if len(scores) >= k else np.inf
+                rest.append(~first[i] & (bounds[i] <= threshold))
+            with self._lock:
+                if self._generation != generation:
+                    continue
+                answers = self._ask(requests, rest)
+            for i, (rows, scores) in enumerate(self._gather(len(queries), answers)):
+                found[i] = (np.concatenate([found[i][0], rows]), np.concatenate([found[i][1], scores]))
+            return [rows[np.lexsort((rows, scores))[:k]] for rows, scores in found]
+
+    def _request(self, row: int, ip: tuple[float, float], k: int) -> tuple[list[tuple], np.ndarray]:
+        """Return the query about the given row for a user at ip sent to each shard, and a
+        lower bound on the scores of the restaurants of each shard (infinity for an empty one).
+
+        The score of a restaurant is at least the difference between its distance to the user
+        and the base restaurant's. Every distance is at least the difference in latitude and at
+        most the sum of the differences in latitude and longitude, in kilometres per degree, so
+        the bounds of the locations of a shard bound the distances of its restaurants.
+        """
+        features = self.table.features[row].copy()
+        base_distance = float(geodistance.distances_km(ip[0], ip[1], self.table.locations[row:row + 1])[0])
+        shard = self.shard_of[row]
+        queries = [(features, base_distance, ip, k, self.position[row] if i == shard else -1)
+                   for i in range(len(self))]
+
+        lat, lon = ip
+        lat_low, lat_high, lon_low, lon_high = self._bounds.T
+        nearest = np.maximum(0.0, np.maximum(lat_low - lat, lat - lat_high)) * geodistance.KM_PER_DEGREE
+        furthest = (np.maximum(np.abs(lat - lat_low), np.abs(lat - lat_high))
+                    + np.maximum(np.abs(lon - lon_low), np.abs(lon - lon_high))) * geodistance.KM_PER_DEGREE
+        # Leave a margin for rounding.
+        lower = np.maximum(0.0, np.maximum(nearest * (1.0 - 1e-9) - base_distance,
+                                           base_distance - furthest * (1.0 + 1e-9)))
+        lower[np.isnan(lat_low)] = np.inf
+        return queries, lower
+
+    def _ask(self, requests: list[tuple[list[tuple], np.ndarray]], asked: list[np.ndarray]) \
+            -> list[tuple[list[int], Future]]:
+        """Send each query to the shards where asked[i] is True for it (skipping empty shards),
+        and return the indices of the queries sent to each shard with the Future of its answer.
+        """
+        answers = []
+        for shard in range(len(self)):
+            indices = [i for i, mask in enumerate(asked) if mask[shard] and np.isfinite(requests[i][1][shard])]
+            if indices:
+                answers.append((indices, self._send(shard, 'query', [requests[i][0][shard] for i in indices])))
+        return answers
+
+    @staticmethod
+    def _gather(count: int, answers: list[tuple[list[int], Future]]) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return the catalog rows and scores each of the given number of queries got from the
+        shards it was sent to, waiting for the given answers.
+        """
+        rows, scores = [[] for _ in range(count)], [[] for _ in range(count)]
+        for indices, answer in answers:
+            for i, (shard_rows, shard_scores) in zip(indices, answer.result()):
+                rows[i].append(shard_rows)
+                scores[i].append(shard_scores)
+        return [(np.concatenate(rows[i]) if rows[i] else np.empty(0, dtype=np.intp),
+                 np.concatenate(scores[i]) if scores[i] else np.empty(0)) for i in range(count)]
+
+    def _send(self, shard: int, command: str, payload: Any) -> Future:
+        """Send a request to the worker of the given shard, and return the Future of its answer.
+
+        Raise a ConnectionError if the worker has stopped.
+        """
+        if not self._receivers[shard].is_alive():
+            raise ConnectionError(f'the worker of shard {shard} has stopped')
+        request_id = next(self._request_ids)
+        answer = Future()
+        self._pending[shard][request_id] = answer
+        with self._send_locks[shard]:
+            self._connections[shard].send((request_id, command, payload))
+        return answer
+
+    def _receive(self, shard: int, connection: Connection) -> None:
+        """Resolve the Futures of the answers received from the worker of the given shard,
+        until it stops. The requests left unanswered then fail with a ConnectionError.
+        """
+        pending = self._pending[shard]
+        while True:
+            try:
+                request_id, result = connection.recv()
+            except (EOFError, OSError):
+                break
+            pending.pop(request_id).set_result(result)
+        for request_id in list(pending):
+            pending.pop(request_id).set_exception(ConnectionError(f'the worker of shard {shard} has stopped'))
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory. Do nothing if already closed."""
+        with self._lock:
+            for shard, connection in enumerate(self._connections):
+                with self._send_locks[shard]:
+                    connection.send(None)
+            for worker, receiver, connection in zip(self._workers, self._receivers, self._connections):
+                worker.join()
+                receiver.join()
+                connection.close()
+            self._columns.clear()
+            for memory in self._memories:
+                _release(memory)
+            self._memories.clear()
+            self._workers.clear()
+            self._connections.clear()
+            self._receivers.clear()
+
+
+def _release(memory: shared_memory.SharedMemory) -> None:
+    """Close and remove the given shared memory block."""
+    memory.close()
+    memory.unlink()
@@ -0,0 +1,104 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module reads and writes graph snapshots. A snapshot is a directory holding one
+NumPy .npy file per column (plus a small JSON file of metadata), so that a snapshot can be
+memory-mapped on startup instead of parsing the restaurant CSV file row by row.
+
+Strings are stored as one array of UTF-8 bytes and one array of offsets into it, so no
+column needs to be unpickled.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from typing import Any
+
+import numpy as np
+
+# Bump this whenever the layout of a snapshot changes, so that old snapshots are rebuilt.
+SNAPSHOT_VERSION = 1
+
+META_FILE = 'meta.json'
+
+
+def file_hash(path: str) -> str:
+    """Return the SHA-256 hex digest of the contents of the given file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the UTF-8 bytes of the given strings joined together, and an array of offsets
+    such that string i is bytes[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """Return the strings encoded by encode_strings."""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def write_columns(path: str, columns: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+    """Write the given columns and metadata as a snapshot directory at path.
+
+    The metadata is written last, so a snapshot whose write was interrupted has no metadata
+    and is never loaded. Each column is written to a temporary file that then replaces the old
+    one, so the columns of a snapshot already at path stay readable while they are written,
+    even if they are memory-mapped by the graph being saved.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for name, column in columns.items():
+        column_path = os.path.join(path, name + '.npy')
+        with open(column_path + '.tmp', 'wb') as file:
+            np.save(file, np.ascontiguousarray(column))
+        os.replace(column_path + '.tmp', column_path)
+    with open(meta_path, 'w') as file:
+        json.dump(dict(meta, version=SNAPSHOT_VERSION, columns=sorted(columns)), file)
+
+
+def read_meta(path: str) -> dict[str, Any] | None:
+    """Return the metadata of the snapshot at path, or None if there is no complete snapshot
+    of the current version there.
+    """
+    try:
+        with open(os.path.join(path, META_FILE)) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SNAPSHOT_VERSION:
+        return None
+    return meta
+
+
+def read_columns(path: str, meta: dict[str, Any], mmap_mode: str = 'c') -> dict[str, np.ndarray]:
+    """Return the columns of the snapshot at path with the given metadata.
+
+    The columns are memory-mapped, so they are only read from disk when used. By default they
+    are copy-on-write, so changing them in memory never changes the snapshot; with mmap_mode
+    'r' they are read-only.
+
+    Preconditions:
+        - mmap_mode in {'c', 'r'}
+    """
+    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            for name in meta['columns']}
@@ -0,0 +1,178 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains the GridIndex class, a uniform grid over restaurant locations.
+It answers "which restaurants are within this radius" and "which k restaurants are the
+closest" by looking only at the grid cells around the user instead of every restaurant.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import math
+
+import numpy as np
+
+
+class GridIndex:
+    """A uniform grid of square cells, each holding the rows of the locations inside it.
+
+    Locations are in the units of the points given to the index. Distances are too, unless
+    the queries give a scale: the length of a unit along each axis, in the units of the
+    distances (such as the kilometres per degree of latitude and of longitude).
+
+    Instance Attributes:
+        - cell_size: The side length of every cell.
+        - locations: An (n, 2) array of the indexed points; row i is the point of row i.
+        - cells: Maps the (x, y) coordinates of every non-empty cell to the rows inside it.
+
+    Representation Invariants:
+        - self.cell_size > 0
+        - sum(len(rows) for rows in self.cells.values()) == self.locations.shape[0]
+    """
+    cell_size: float
+    locations: np.ndarray
+    cells: dict[tuple[int, int], np.ndarray]
+    # Private Instance Attributes:
+    #     - _bounds: The (min x, min y, max x, max y) cell coordinates of the non-empty cells.
+    _bounds: tuple[int, int, int, int]
+
+    def __init__(self, locations: np.ndarray, cell_size: float) -> None:
+        """Initialize a grid over the given (n, 2) array of points.
+
+        Preconditions:
+            - cell_size > 0
+        """
+        self.cell_size = cell_size
+        self.locations = locations
+        self.cells = {}
+
+        coords = np.floor(locations / cell_size).astype(np.int64)
+        if len(coords) == 0:
+            self._bounds = (0, 0, -1, -1)
+            return
+        order = np.lexsort((coords[:, 1], coords[:, 0]))
+        sorted_coords = coords[order]
+        starts = np.flatnonzero(np.any(np.diff(sorted_coords, axis=0) != 0, axis=1)) + 1
+        for group in np.split(order, starts):
+            x, y = coords[group[0]]
+            self.cells[(int(x), int(y))] = group
+        low = coords.min(axis=0)
+        high = coords.max(axis=0)
+        self._bounds = (int(low[0]), int(low[1]), int(high[0]), int(high[1]))
+
+    def _cell_of(self, x: float, y: float) -> tuple[int, int]:
+        """Return the coordinates of the cell containing the given point."""
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _gather(self, cell_keys: list[tuple[int, int]]) -> np.ndarray:
+        """Return the rows inside the given cells."""
+        groups = [self.cells[key] for key in cell_keys if key in self.cells]
+        if not groups:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(groups)
+
+    def _distances(self, rows: np.ndarray, x: float, y: float, scale: tuple[float, float]) -> np.ndarray:
+        """Return the distance between the given point and the points of the given rows."""
+        points = self.locations[rows]
+        return np.hypot((points[:, 0] - x) * scale[0], (points[:, 1] - y) * scale[1])
+
+    def within(self, x: float, y: float, radius: float, scale: tuple[float, float] = (1.0, 1.0)) -> np.ndarray:
+        """Return the rows of all points within radius of (x, y), closest first.
+
+        Preconditions:
+            - scale[0] > 0 and scale[1] > 0
+        """
+        low_x, low_y = self._cell_of(x - radius / scale[0], y - radius / scale[1])
+        high_x, high_y = self._cell_of(x + radius / scale[0], y + radius / scale[1])
+        if (high_x - low_x + 1) * (high_y - low_y + 1) > len(self.cells):
+            # The query box covers more cells than are occupied, so visit the occupied ones.
+            keys = [key for key in self.cells if low_x <= key[0] <= high_x and low_y <= key[1] <= high_y]
+        else:
+            keys = [(i, j) for i in range(low_x, high_x + 1) for j in range(low_y, high_y + 1)]
+        rows = self._gather(keys)
+        distances = self._distances(rows, x, y, scale)
+        keep = distances <= radius
+        rows, distances = rows[keep], distances[keep]
+        return rows[np.lexsort((rows, distances))]
+
+    def nearest(self, x: float, y: float, k: int, scale: tuple[float, float] = (1.0, 1.0)) -> np.ndarray:
+        """Return the rows of the k points closest to (x, y), closest first.
+
+        Rings of cells around the cell containing (x, y) are visited in order until no
+        unvisited cell can hold a point closer than the k-th closest point found so far.
+
+        Preconditions:
+            - scale[0] > 0 and scale[1] > 0
+        """
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        cx, cy = self._cell_of(x, y)
+        low_x, low_y, high_x, high_y = self._bounds
+        max_ring = max(cx - low_x, high_x - cx, cy - low_y, high_y - cy, 0)
+        found = []
+        found_count = 0
+        ring = 0
+        while ring <= max_ring:
+            if 8 * ring > len(self.cells):
+                # The ring has more cells than are occupied, e.g. when (x, y) is far from every
+                # point, so it is cheaper to rank every point.
+                found = [np.arange(len(self.locations))]
+                break
+            if ring == 0:
+                keys = [(cx, cy)]
+            else:
+                keys = [(cx + i, cy + j) for i in range(-ring, ring + 1) for j in (-ring, ring)]
+                keys.extend((cx + i, cy + j) for i in (-ring, ring) for j in range(-ring + 1, ring))
+            rows = self._gather(keys)
+            if len(rows) > 0:
+                found.append(rows)
+                found_count += len(rows)
+            if found_count >= k:
+                candidates = np.concatenate(found)
+                kth = np.partition(self._distances(candidates, x, y, scale), k - 1)[k - 1]
+                # Every cell in the next ring is at least ring * cell_size away from (x, y) along
+                # one of the axes.
+                if ring * self.cell_size * min(scale) >= kth:
+                    break
+            ring += 1
+
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        candidates = np.concatenate(found)
+        distances = self._distances(candidates, x, y, scale)
+        order = np.lexsort((candidates, distances))
+        return candidates[order[:k]]
+
+    def add(self, row: int, point: tuple[float, float]) -> None:
+        """Add the given row, whose point is already in self.locations, to the cell of point."""
+        key = self._cell_of(*point)
+        rows = self.cells.get(key)
+        self.cells[key] = np.array([row]) if rows is None else np.append(rows, row)
+        if len(self.cells) == 1 and rows is None:
+            self._bounds = (key[0], key[1], key[0], key[1])
+        else:
+            low_x, low_y, high_x, high_y = self._bounds
+            self._bounds = (min(low_x, key[0]), min(low_y, key[1]), max(high_x, key[0]), max(high_y, key[1]))
+
+    def discard(self, row: int, point: tuple[float, float]) -> None:
+        """Remove the given row from the cell of point, which must be the point it was added with.
+
+        The bounds of the grid are not shrunk, so they may cover empty cells afterwards.
+        """
+        key = self._cell_of(*point)
+        rows = self.cells[key]
+        rows = rows[rows != row]
+        if len(rows) == 0:
+            del self.cells[key]
+        else:
+            self.cells[key] = rows
+
+    def renumber(self, old_row: int, new_row: int, point: tuple[float, float]) -> None:
+        """Change the row of the given point from old_row to new_row."""
+        rows = self.cells[self._cell_of(*point)]
+        rows[rows == old_row] = new_row
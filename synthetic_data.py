@@ -0,0 +1,63 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module generates synthetic restaurant datasets of any size, in the same CSV
+format as filtered_restaurant_dt_4d.csv, for benchmarking.
+
+Every synthetic restaurant copies the category, price range, review rate and address of a
+random restaurant in the real dataset, so the joint distribution of those columns is kept.
+Its location is the real restaurant's location plus a little Gaussian noise, so restaurants
+stay clustered where the real ones are. Names get a numeric suffix so they are all unique.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import csv
+import random
+from typing import Iterator
+
+# The standard deviation (in degrees) of the noise added to each location; about 300 m.
+LOCATION_NOISE = 0.003
+
+
+def read_source_rows(source_file: str) -> tuple[list[str], list[list[str]]]:
+    """Return the header and the data rows of the given restaurant CSV file."""
+    with open(source_file, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        return header, list(reader)
+
+
+def generate_rows(source_rows: list[list[str]], n: int, seed: int = 0) -> Iterator[list[str]]:
+    """Yield n synthetic rows resembling the given source rows.
+
+    Preconditions:
+        - source_rows != []
+    """
+    rng = random.Random(seed)
+    for i in range(n):
+        category, address, name, price, review_rate, loc = rng.choice(source_rows)
+        lat, lon = (float(val) for val in loc.split(','))
+        lat += rng.gauss(0.0, LOCATION_NOISE)
+        lon += rng.gauss(0.0, LOCATION_NOISE)
+        yield [category, address, f'{name} #{i}', price, review_rate, f'{lat:.6f}, {lon:.6f}']
+
+
+def write_synthetic_csv(source_file: str, dest_file: str, n: int, seed: int = 0) -> None:
+    """Write a synthetic dataset of n restaurants resembling source_file to dest_file."""
+    header, rows = read_source_rows(source_file)
+    with open(dest_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(generate_rows(rows, n, seed))
+
+
+if __name__ == '__main__':
+    import sys
+
+    write_synthetic_csv(sys.argv[1], sys.argv[2], int(sys.argv[3]))
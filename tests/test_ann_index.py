@@ -0,0 +1,68 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for approximate search: searching every list of the IVF index finds the restaurants the
+exact scan finds, and the default number of lists searched finds nearly all of them on the
+bundled restaurant CSV file.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from ann_index import IvfIndex
+from recommender_4d_ver import ANN_NPROBE, CategoryGraph, load_graph
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'filtered_restaurant_dt_4d.csv')
+
+
+@pytest.fixture(scope='module')
+def graph() -> CategoryGraph:
+    """Return the graph of the bundled restaurant CSV file, without memoized results."""
+    loaded = load_graph(DATA_FILE)
+    loaded.configure_similarity_memo(0)
+    return loaded
+
+
+def test_index_lists_every_row() -> None:
+    """Every row is in exactly one list, the one of its closest centroid."""
+    points = np.random.default_rng(0).uniform(0.0, 5.0, (2000, 3))
+    index = IvfIndex(points, 30)
+    assert sorted(index.order.tolist()) == list(range(len(points)))
+    for i in range(len(index.offsets) - 1):
+        rows = index.order[index.offsets[i]:index.offsets[i + 1]]
+        distances = ((points[rows, None, :] - index.centroids[None, :, :]) ** 2).sum(axis=2)
+        assert np.allclose(distances.min(axis=1), distances[:, i])
+
+
+def test_all_lists_equal_exact_scan(graph: CategoryGraph) -> None:
+    """Searching every list finds restaurants as similar as the exact scan's, for every k."""
+    table = graph.get_table()
+    graph.configure_approximate_search(len(graph.get_ann_index().offsets) - 1)
+    rng = np.random.default_rng(1)
+    try:
+        for row in rng.integers(len(table), size=50).tolist():
+            ip = (float(rng.uniform(43.6, 43.8)), float(rng.uniform(-79.5, -79.3)))
+            scores = table.similarity_scores(row, ip)
+            for k in (1, 5, 20):
+                exact = table.top_k(scores, k, exclude=row)
+                found = [table.rows[name] for name in graph.most_similar_restaurants(table.names[row], ip, k)]
+                assert scores[found].tolist() == scores[exact].tolist()
+    finally:
+        graph.configure_approximate_search(0)
+
+
+def test_default_recall(graph: CategoryGraph) -> None:
+    """The default number of lists searched finds at least 95% of the exact results."""
+    graph.configure_approximate_search(ANN_NPROBE)
+    try:
+        assert graph.measure_ann_recall(200)['recall'] >= 0.95
+    finally:
+        graph.configure_approximate_search(0)
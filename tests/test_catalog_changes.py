@@ -0,0 +1,183 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for catalog changes: after CategoryGraph.apply_changes patches the structures built
+from the table (the rating tree, filter index, leaderboards, approximate search index and
+random walk), they are the ones built from scratch, and every remembered similarity result
+kept is the one a fresh query finds, even for a query running while the changes are made.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from compact_graph import CompactCategoryGraph
+from filter_index import FilterIndex
+from graph_walk import WalkGraph
+from leaderboard import Leaderboards
+from recommender_4d_ver import CategoryGraph
+from restaurant_table import RestaurantTable
+from sampling import FenwickTree
+
+
+def random_restaurant(rng: random.Random, name: str) -> tuple:
+    """Return the arguments of add_vertex for a random restaurant around Toronto."""
+    return (rng.randint(1, 12), f'{name} Street', name, rng.randint(1, 4), round(rng.uniform(0.0, 5.0), 1),
+            (rng.uniform(43.6, 43.8), rng.uniform(-79.5, -79.3)))
+
+
+def make_graph(kind: str, n: int, seed: int = 0) -> CategoryGraph:
+    """Return a graph of n random restaurants with their 5 nearest neighbours as edges, and
+    every structure built from its table built.
+    """
+    rng = random.Random(seed)
+    restaurants = [random_restaurant(rng, f'restaurant {i}') for i in range(n)]
+    if kind == 'compact':
+        table = RestaurantTable.from_columns(
+            [r[2] for r in restaurants], np.array([(r[0], r[3], r[4]) for r in restaurants], dtype=np.float64),
+            np.array([r[5] for r in restaurants], dtype=np.float64))
+        graph = CompactCategoryGraph(table, [r[1] for r in restaurants])
+    else:
+        graph = CategoryGraph()
+        for restaurant in restaurants:
+            graph.add_vertex(*restaurant)
+    graph.build_knn_edges(5)
+    graph.get_rating_tree()
+    graph.get_filter_index()
+    graph.get_leaderboards()
+    graph.get_ann_index()
+    graph.get_walk_graph()
+    return graph
+
+
+def assert_structures_rebuilt(graph: CategoryGraph) -> None:
+    """Assert that the structures of graph are the ones built from scratch from its table."""
+    table = graph.get_table()
+    n = len(table)
+    assert np.allclose(graph.get_rating_tree()._tree, FenwickTree(np.maximum(table.features[:, 2], 0.0))._tree)
+
+    index, fresh_index = graph.get_filter_index(), FilterIndex(table)
+    for bitmaps, fresh in ((index.categories, fresh_index.categories), (index.price_ranges, fresh_index.price_ranges),
+                           (index.rating_bands, fresh_index.rating_bands)):
+        for value, bitmap in bitmaps.items():
+            assert bitmap.tolist() == fresh.get(value, np.zeros(n, dtype=bool)).tolist()
+
+    volumes = np.zeros(n)
+    for name, volume in graph._feedback.volumes().items():
+        if name in table.rows:
+            volumes[table.rows[name]] = volume
+    leaderboards, fresh_leaderboards = graph.get_leaderboards(), Leaderboards(table, volumes)
+    for board in fresh_leaderboards._members:
+        for ranking in ('rating', 'feedback'):
+            assert leaderboards.top(ranking, board, 20) == fresh_leaderboards.top(ranking, board, 20)
+
+    assert sorted(graph.get_ann_index().order.tolist()) == list(range(n))
+
+    walk = graph.get_walk_graph()
+    edges = graph._edge_columns()
+    fresh_walk = WalkGraph(edges['edge_indptr'], edges['edge_indices'], edges['edge_weights'])
+    assert walk.indptr.tolist() == fresh_walk.indptr.tolist()
+    for row in range(n):
+        start, end = walk.indptr[row], walk.indptr[row + 1]
+        patched = dict(zip(walk.indices[start:end].tolist(), walk.probabilities[start:end].tolist()))
+        built = dict(zip(fresh_walk.indices[start:end].tolist(), fresh_walk.probabilities[start:end].tolist()))
+        assert patched.keys() == built.keys()
+        assert all(patched[other] == pytest.approx(built[other]) for other in patched)
+
+
+@pytest.mark.parametrize('kind', ['object', 'compact'])
+def test_changes_patch_structures(kind: str) -> None:
+    """Removals, updates and additions leave every structure as if it were rebuilt, and keep
+    only remembered results that are still right.
+    """
+    graph = make_graph(kind, 400)
+    rng = random.Random(1)
+    for name in rng.sample(graph.get_table().names, 20):
+        graph.record_feedback(name, rng.choice(['like', 'dislike']))
+    for step in range(5):
+        names = list(graph.get_table().names)
+        for name in rng.sample(names, 30):
+            ip = (rng.uniform(43.6, 43.8), rng.uniform(-79.5, -79.3))
+            graph.most_similar_restaurants(name, ip, rng.choice([3, 5]))
+            graph.similar_rest_all_connected(name, ip)
+
+        # The last rows are removed too, since removing a row moves the last one into it.
+        removals = rng.sample(names[:-5], 4) + names[-2:]
+        updated = rng.sample([name for name in names if name not in removals], 3)
+        upserts = [random_restaurant(rng, name) for name in updated + [f'new {step} {i}' for i in range(3)]]
+        graph.apply_changes(upserts, removals)
+        assert_structures_rebuilt(graph)
+
+        memo = graph._similar_memo
+        graph._similar_memo = None
+        for (name, _, _, k, where), result in memo.items():
+            assert graph.most_similar_restaurants(name, result.ip, k, where) == result.names
+        for name, _, result in graph._neighbour_cache.results():
+            assert graph.most_similar_restaurants(name, result.ip) == result.names
+        graph._similar_memo = memo
+
+
+def test_changes_keep_unaffected_results() -> None:
+    """Adding a restaurant far from everything keeps the remembered results, while removing
+    one of the restaurants a result holds discards that result.
+    """
+    graph = make_graph('object', 300)
+    names = list(graph.get_table().names)
+    ip = (43.7, -79.4)
+    for name in names[:50]:
+        graph.most_similar_restaurants(name, ip)
+    graph.upsert_restaurant(12, 'Far Street', 'far away', 4, 0.0, (10.0, 10.0))
+    assert len(graph._similar_memo) == 50
+
+    removed = graph.most_similar_restaurants(names[0], ip)[0]
+    graph.remove_restaurant(removed)
+    assert names[0] not in {key[0] for key, _ in graph._similar_memo.items()}
+
+
+def test_query_during_changes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A query whose rows are being scored when a restaurant it finds is removed names the
+    restaurants it found, not the ones moved into their rows, and leaves no stale result.
+    """
+    graph = make_graph('object', 300)
+    base, ip = graph.get_table().names[10], (43.7, -79.4)
+    expected = graph.most_similar_restaurants(base, ip)
+    graph._similar_memo.clear()
+
+    scoring, resume = threading.Event(), threading.Event()
+    top_k = RestaurantTable.top_k
+
+    def paused_top_k(table: RestaurantTable, *args, **kwargs) -> np.ndarray:
+        """Rank as usual, pausing the query thread until resume is set."""
+        if threading.current_thread().name == 'query':
+            scoring.set()
+            resume.wait(5)
+        return top_k(table, *args, **kwargs)
+
+    monkeypatch.setattr(RestaurantTable, 'top_k', paused_top_k)
+    results = []
+    query = threading.Thread(target=lambda: results.append(graph.most_similar_restaurants(base, ip)), name='query')
+    query.start()
+    assert scoring.wait(5)
+    change = threading.Thread(target=graph.apply_changes, args=([], [expected[0]]))
+    change.start()
+    change.join(0.2)
+    resume.set()
+    query.join(5)
+    change.join(5)
+    monkeypatch.undo()
+
+    assert results == [expected]
+    memo = graph._similar_memo
+    graph._similar_memo = None
+    fresh = graph.most_similar_restaurants(base, ip)
+    graph._similar_memo = memo
+    assert expected[0] not in fresh
+    assert graph.most_similar_restaurants(base, ip) == fresh
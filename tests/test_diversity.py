@@ -0,0 +1,53 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for diversity: mmr_order picks the candidates that choosing them one at a time, by
+comparing every candidate with every one already chosen, picks.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import numpy as np
+import pytest
+
+from diversity import mmr_order
+
+
+def brute_force_order(relevance: list[float], pairwise: list[list[float]], k: int, trade_off: float) -> list[int]:
+    """Return the candidates maximal marginal relevance picks, computing each penalty in full."""
+    chosen = []
+    while len(chosen) < min(k, len(relevance)):
+        best = None
+        for i in range(len(relevance)):
+            if i in chosen:
+                continue
+            novelty = min((pairwise[i][j] for j in chosen), default=0.0)
+            penalty = trade_off * relevance[i] - (1.0 - trade_off) * novelty if chosen else relevance[i]
+            if best is None or penalty < best[0]:
+                best = (penalty, i)
+        chosen.append(best[1])
+    return chosen
+
+
+@pytest.mark.parametrize('trade_off', [0.0, 0.3, 0.7, 1.0])
+def test_mmr_equals_brute_force(trade_off: float) -> None:
+    """Random candidates, with tied scores, are picked as the brute force picks them."""
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        n = int(rng.integers(1, 30))
+        points = rng.integers(0, 4, (n, 2)).astype(np.float64)
+        pairwise = np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+        relevance = rng.integers(0, 5, n).astype(np.float64)
+        for k in (0, 1, 5, n, n + 3):
+            assert mmr_order(relevance, pairwise, k, trade_off).tolist() == \
+                brute_force_order(relevance.tolist(), pairwise.tolist(), k, trade_off)
+
+
+def test_full_trade_off_keeps_relevance_order() -> None:
+    """With a trade-off of 1, the candidates are in order of relevance, ties by index."""
+    relevance = np.array([3.0, 1.0, 2.0, 1.0, 0.5])
+    assert mmr_order(relevance, np.zeros((5, 5)), 4, 1.0).tolist() == [4, 1, 3, 2]
@@ -0,0 +1,77 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for filter_index: the rows FilterIndex finds for a RestaurantFilter are the ones a scan
+of every row finds, including after review rates change and rows are added or changed.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+
+import numpy as np
+
+from filter_index import FilterIndex, RestaurantFilter
+from restaurant_table import RestaurantTable
+
+
+def make_table(n: int, seed: int = 0) -> RestaurantTable:
+    """Return a table of n random restaurants, with review rates on a grid of 0.1."""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([rng.integers(1, 13, n), rng.integers(1, 5, n), rng.integers(0, 51, n) / 10.0])
+    locations = np.column_stack([rng.uniform(43.6, 43.8, n), rng.uniform(-79.5, -79.3, n)])
+    return RestaurantTable.from_columns([f'restaurant {i}' for i in range(n)], features.astype(np.float64), locations)
+
+
+def random_filter(rng: random.Random) -> RestaurantFilter:
+    """Return a filter with each condition present at random."""
+    ratings = sorted(rng.choice([rng.randint(0, 50) / 10.0, rng.uniform(0.0, 5.0)]) for _ in range(2))
+    conditions = {'categories': frozenset(rng.sample(range(1, 14), rng.randint(0, 4))),
+                  'min_price': rng.randint(1, 4), 'max_price': rng.randint(1, 4),
+                  'min_rating': ratings[0], 'max_rating': ratings[1]}
+    return RestaurantFilter(**{field: value for field, value in conditions.items() if rng.random() < 0.5})
+
+
+def scan(table: RestaurantTable, query: RestaurantFilter) -> list[int]:
+    """Return the rows of table matching query, by checking every row."""
+    rows = []
+    for row, (category, price, rating) in enumerate(table.features.tolist()):
+        if ((query.categories is None or int(category) in query.categories)
+                and (query.min_price is None or price >= query.min_price)
+                and (query.max_price is None or price <= query.max_price)
+                and (query.min_rating is None or rating >= query.min_rating)
+                and (query.max_rating is None or rating <= query.max_rating)):
+            rows.append(row)
+    return rows
+
+
+def test_filters_equal_scan() -> None:
+    """Random filters find the rows of a scan, before and after the index is patched."""
+    table = make_table(2000)
+    index = FilterIndex(table)
+    rng = random.Random(0)
+    for _ in range(200):
+        query = random_filter(rng)
+        assert index.rows(query).tolist() == scan(table, query)
+
+    for row in rng.sample(range(len(table)), 100):
+        rating = rng.choice([rng.randint(0, 50) / 10.0, rng.uniform(0.0, 5.0)])
+        table.set_review_rate(table.names[row], rating)
+        index.update_rating(row, rating)
+    changed = rng.sample(range(len(table)), 30)
+    index.discard(changed)
+    for row in changed:
+        table.update_row(row, np.array([rng.randint(1, 13), rng.randint(1, 4), rng.randint(0, 50) / 10.0]),
+                         (43.7, -79.4))
+    added = make_table(300, seed=1)
+    table.append_rows([f'new {i}' for i in range(len(added))], added.features, added.locations)
+    index.add(changed + list(range(2000, len(table))))
+
+    for _ in range(200):
+        query = random_filter(rng)
+        assert index.rows(query).tolist() == scan(table, query)
+    assert index.rows(RestaurantFilter()).tolist() == list(range(len(table)))
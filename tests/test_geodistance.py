@@ -0,0 +1,50 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for geodistance: the vectorized distances are within a fraction of a percent of the
+haversine distance of each pair of points, and the single, pairwise and paired forms agree
+with them.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import numpy as np
+
+import geodistance
+
+
+def random_points(n: int, rng: np.random.Generator, spread: float) -> np.ndarray:
+    """Return n random points around Toronto, spread up to the given number of degrees away."""
+    return np.column_stack([43.7 + rng.uniform(-spread, spread, n), -79.4 + rng.uniform(-spread, spread, n)])
+
+
+def test_distances_near_haversine() -> None:
+    """Distances are within 0.5% of the haversine ones nearby, and equal to them far away."""
+    rng = np.random.default_rng(0)
+    for lat, lon in random_points(20, rng, 1.0).tolist():
+        locations = np.concatenate([random_points(500, rng, 0.2), random_points(500, rng, 5.0)])
+        distances = geodistance.distances_km(lat, lon, locations)
+        exact = np.array([geodistance.haversine_km(lat, lon, *location) for location in locations.tolist()])
+        near = exact < geodistance.EQUIRECTANGULAR_LIMIT_KM * 0.99
+        assert np.all(np.abs(distances[near] - exact[near]) <= 0.005 * exact[near] + 1e-9)
+        far = distances > geodistance.EQUIRECTANGULAR_LIMIT_KM
+        assert np.allclose(distances[far], exact[far])
+        assert np.allclose(geodistance.haversine_many(lat, lon, locations), exact)
+        for i in rng.integers(len(locations), size=20).tolist():
+            assert np.isclose(geodistance.distance_km(lat, lon, *locations[i].tolist()), distances[i])
+
+
+def test_pairwise_and_paired_agree() -> None:
+    """Every entry of the pairwise and paired distances is the distance from its point."""
+    rng = np.random.default_rng(1)
+    points = random_points(30, rng, 2.0)
+    locations = random_points(400, rng, 2.0)
+    pairwise = geodistance.pairwise_distances_km(points, locations)
+    for i, (lat, lon) in enumerate(points.tolist()):
+        assert np.allclose(pairwise[i], geodistance.distances_km(lat, lon, locations))
+    paired = geodistance.paired_distances_km(points, locations[:30])
+    assert np.allclose(paired, pairwise[np.arange(30), np.arange(30)])
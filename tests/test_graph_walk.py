@@ -0,0 +1,68 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for graph_walk: the ranks push_pagerank approximates are within its tolerance of the
+ones the power iteration converges to, and walk_recommendations never returns the seeds or
+the excluded restaurants.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from graph_walk import PUSH_TOLERANCE, personalized_pagerank, push_pagerank
+from recommender_4d_ver import CategoryGraph
+
+
+@pytest.fixture(scope='module')
+def graph() -> CategoryGraph:
+    """Return a graph of 1000 random restaurants around Toronto, with their 5 nearest
+    neighbours as edges.
+    """
+    rng = random.Random(0)
+    built = CategoryGraph()
+    for i in range(1000):
+        built.add_vertex(rng.randint(1, 12), f'{i} Bloor Street', f'restaurant {i}', rng.randint(1, 4),
+                         round(rng.uniform(0.0, 5.0), 1), (rng.uniform(43.6, 43.8), rng.uniform(-79.5, -79.3)))
+    built.build_knn_edges(5)
+    return built
+
+
+def test_push_within_tolerance(graph: CategoryGraph) -> None:
+    """Every approximate rank is at most the exact one, and below it by at most the
+    tolerance times the number of edges of its row.
+    """
+    walk = graph.get_walk_graph()
+    degrees = np.maximum(np.diff(walk.indptr), 1)
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        rows = rng.choice(len(walk), 23, replace=False)
+        seeds, exclude = rows[:3], rows[3:]
+        exact, _ = personalized_pagerank(walk, seeds, exclude, tolerance=1e-13, max_iterations=1000)
+        approximate = np.zeros(len(walk))
+        for row, rank in push_pagerank(walk, seeds, exclude).items():
+            approximate[row] = rank
+        assert np.all(approximate <= exact + 1e-12)
+        assert np.all(exact - approximate <= PUSH_TOLERANCE * degrees + 1e-12)
+        assert not approximate[exclude].any()
+
+
+@pytest.mark.parametrize('exact', [False, True])
+def test_walk_skips_seeds_and_excluded(graph: CategoryGraph, exact: bool) -> None:
+    """The restaurants recommended are neither seeds nor excluded."""
+    names = graph.get_table().names
+    rng = random.Random(1)
+    for _ in range(10):
+        chosen = rng.sample(names, 8)
+        seeds, exclude = chosen[:3], chosen[3:]
+        recommended = graph.walk_recommendations(seeds, 10, exclude, exact)
+        assert len(recommended) == 10
+        assert not set(recommended) & set(chosen)
+    assert graph.walk_recommendations(['not a restaurant'], 5) == []
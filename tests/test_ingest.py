@@ -0,0 +1,109 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for ingest: the bundled restaurant CSV file, read in chunks of any size, gzipped or by
+several processes, gives the columns of a plain read with the csv module, and delta files
+keep the last change of each name and reject changes that cannot be parsed.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import csv
+import gzip
+import io
+import os
+
+import numpy as np
+import pytest
+
+import ingest
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'filtered_restaurant_dt_4d.csv')
+
+
+@pytest.fixture(scope='module')
+def data() -> bytes:
+    """Return the contents of the bundled restaurant CSV file."""
+    with open(DATA_FILE, 'rb') as file:
+        return file.read()
+
+
+@pytest.fixture(scope='module')
+def expected(data: bytes) -> ingest.RestaurantColumns:
+    """Return the restaurants of the bundled CSV file, read in one piece by the csv module."""
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8'))))[1:]
+    return ingest.parse_records([row for row in rows if row])
+
+
+def assert_same(columns: ingest.RestaurantColumns, expected: ingest.RestaurantColumns) -> None:
+    """Assert that columns holds the same restaurants as expected, in the same order."""
+    assert columns.names == expected.names
+    assert columns.addresses == expected.addresses
+    for field in ('categories', 'price_ranges', 'review_rates', 'locations'):
+        assert np.array_equal(getattr(columns, field), getattr(expected, field))
+
+
+def pieces(data: bytes, size: int) -> list[bytes]:
+    """Return data cut into pieces of the given size."""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 500, 5000])
+def test_chunks_are_whole_records(data: bytes, expected: ingest.RestaurantColumns, chunk_size: int) -> None:
+    """Chunks of any size, read from blocks of any size, hold whole records and every byte."""
+    chunks = list(ingest.read_chunks(pieces(data, 37), chunk_size))
+    assert b''.join(chunks) == data
+    for chunk in chunks[:-1]:
+        assert chunk.endswith(b'\n') and chunk.count(b'"') % 2 == 0
+    columns = ingest.RestaurantColumns.concatenate(
+        [ingest.parse_chunk(chunk, i == 0) for i, chunk in enumerate(chunks)])
+    assert_same(columns, expected)
+
+
+def test_record_boundary() -> None:
+    """A line break inside quotes never ends a record."""
+    assert ingest._record_boundary(bytearray(b'1,"a\nb",c\n2,"d\ne')) == len(b'1,"a\nb",c\n')
+    assert ingest._record_boundary(bytearray(b'1,"a\nb')) == 0
+    assert ingest._record_boundary(bytearray(b'1,"a ""quoted"" b"\n2')) == len(b'1,"a ""quoted"" b"\n')
+
+
+def test_gzip_and_processes(data: bytes, expected: ingest.RestaurantColumns) -> None:
+    """Gzipped input, as a file or in blocks, and parsing in 2 processes give the plain read."""
+    compressed = gzip.compress(data)
+    sources = [io.BytesIO(compressed), pieces(compressed, 1000), io.StringIO(data.decode('utf-8'))]
+    for source in sources:
+        assert_same(ingest.RestaurantColumns.concatenate(list(ingest.iter_columns(source, 5000))), expected)
+    assert_same(ingest.RestaurantColumns.concatenate(list(ingest.iter_columns(DATA_FILE, 20000, processes=2))),
+                expected)
+    assert_same(ingest.read_restaurants(DATA_FILE, 20000, processes=2), expected.deduplicated())
+
+
+def test_delta_keeps_last_change() -> None:
+    """When a name has several changes, only its last one is kept, in the order of the last
+    changes.
+    """
+    delta = ('Change,Category,Address,Name,Price,Rate,Location\n'
+             'upsert,1,"1 A St",a,2,4.0,"43.7, -79.4"\n'
+             'remove,,,b,,,\n'
+             'upsert,3,"3 C St",c,1,NA,"43.6, -79.3"\n'
+             'upsert,2,"2 A St",a,3,3.5,"43.8, -79.5"\n'
+             'upsert,4,"4 B St",b,4,2.0,"43.7, -79.2"\n'
+             'remove,,,c,,,\n')
+    upserts, removals = ingest.read_delta(io.StringIO(delta))
+    assert upserts.names == ['a', 'b']
+    assert upserts.addresses == ['2 A St', '4 B St']
+    assert upserts.categories.tolist() == [2, 4]
+    assert upserts.review_rates.tolist() == [3.5, 2.0]
+    assert upserts.locations.tolist() == [[43.8, -79.5], [43.7, -79.2]]
+    assert removals == ['c']
+
+
+@pytest.mark.parametrize('row', ['rename,1,"1 A St",a,2,4.0,"43.7, -79.4"', 'remove,,', 'upsert,1,"1 A St",a,2'])
+def test_delta_rejects_bad_changes(row: str) -> None:
+    """An unknown action, or a row too short to hold a restaurant, is a ValueError."""
+    with pytest.raises(ValueError):
+        ingest.read_delta(io.StringIO(f'Change,Category,Address,Name,Price,Rate,Location\n{row}\n'))
@@ -0,0 +1,106 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for leaderboard: the best rows Leaderboards returns for each partition, and near a
+location, are the ones sorting every row of the partition returns, including after scores
+change and rows are removed, added and renumbered.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+
+import numpy as np
+
+from leaderboard import RANKINGS, Leaderboards
+from restaurant_table import RestaurantTable
+
+
+def make_table(n: int, seed: int = 0) -> RestaurantTable:
+    """Return a table of n random restaurants, with review rates on a grid of 0.5 so that
+    many are tied.
+    """
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([rng.integers(1, 6, n), rng.integers(1, 5, n), rng.integers(0, 11, n) / 2.0])
+    locations = np.column_stack([rng.uniform(43.6, 43.7, n), rng.uniform(-79.5, -79.4, n)])
+    return RestaurantTable.from_columns([f'restaurant {i}' for i in range(n)], features.astype(np.float64), locations)
+
+
+def sorted_rows(scores: np.ndarray, rows: list[int], k: int, exclude: set[int]) -> list[int]:
+    """Return the k best of rows by scores, best first and ties broken by row, skipping exclude."""
+    return sorted((row for row in rows if row not in exclude), key=lambda row: (-scores[row], row))[:k]
+
+
+def assert_matches(leaderboards: Leaderboards, scores: dict[str, np.ndarray], rng: random.Random) -> None:
+    """Assert that every leaderboard, and the ones near random locations, give the rows that
+    sorting by scores gives.
+    """
+    table = leaderboards.table
+    partitions = {}
+    for row in range(len(table)):
+        for board in leaderboards.boards_of(row):
+            partitions.setdefault(board, []).append(row)
+    for ranking in RANKINGS:
+        for board, rows in partitions.items():
+            for k in (1, 10, 150):
+                exclude = set(rng.sample(rows, min(3, len(rows))))
+                assert leaderboards.top(ranking, board, k, exclude) == \
+                    sorted_rows(scores[ranking], rows, k, exclude)
+        for _ in range(20):
+            lat, lon = rng.uniform(43.6, 43.7), rng.uniform(-79.5, -79.4)
+            i, j = leaderboards.cell_of(lat, lon)
+            near = [row for row in range(len(table))
+                    if abs(leaderboards.cell_of(*table.locations[row].tolist())[0] - i) <= 1
+                    and abs(leaderboards.cell_of(*table.locations[row].tolist())[1] - j) <= 1]
+            assert leaderboards.near(ranking, lat, lon, 15) == sorted_rows(scores[ranking], near, 15, set())
+
+
+def test_leaderboards_equal_sort() -> None:
+    """Leaderboards built, updated and patched give the rows of a full sort."""
+    table = make_table(3000)
+    rng = random.Random(0)
+    scores = {'rating': table.features[:, 2].copy(), 'feedback': np.zeros(len(table))}
+    leaderboards = Leaderboards(table, scores['feedback'].copy(), size=20)
+    assert_matches(leaderboards, scores, rng)
+
+    for _ in range(500):
+        row = rng.randrange(len(table))
+        ranking = rng.choice(RANKINGS)
+        score = rng.randint(0, 10) / 2.0 if ranking == 'rating' else float(rng.randint(0, 5))
+        scores[ranking][row] = score
+        if ranking == 'rating':
+            table.set_review_rate(table.names[row], score)
+        leaderboards.update(ranking, row, score)
+    assert_matches(leaderboards, scores, rng)
+
+    # Remove the last 100 rows, change 50 and add 200, as CategoryGraph.apply_changes does.
+    changed = rng.sample(range(2900), 50)
+    leaderboards.discard(changed + list(range(2900, 3000)))
+    table.delete_rows(np.arange(2900, 3000))
+    leaderboards.truncate(2900)
+    for row in changed:
+        table.update_row(row, np.array([rng.randint(1, 5), rng.randint(1, 4), rng.randint(0, 10) / 2.0]),
+                         (rng.uniform(43.6, 43.7), rng.uniform(-79.5, -79.4)))
+    added = make_table(200, seed=1)
+    table.append_rows([f'new {i}' for i in range(200)], added.features, added.locations)
+    rows = changed + list(range(2900, 3100))
+    volumes = [float(rng.randint(0, 5)) for _ in rows]
+    leaderboards.add(rows, volumes)
+    feedback = np.zeros(len(table))
+    feedback[:2900] = scores['feedback'][:2900]
+    feedback[rows] = volumes
+    scores = {'rating': table.features[:, 2].copy(), 'feedback': feedback}
+    assert_matches(leaderboards, scores, rng)
+
+    # Remove 300 rows keeping the order of the others, as CompactCategoryGraph does.
+    removed = np.array(sorted(rng.sample(range(len(table)), 300)))
+    leaderboards.discard(removed.tolist())
+    new_rows = table.delete_rows(removed)
+    leaderboards.renumber(new_rows)
+    kept = new_rows >= 0
+    scores = {ranking: ranking_scores[kept] for ranking, ranking_scores in scores.items()}
+    assert_matches(leaderboards, scores, rng)
@@ -0,0 +1,97 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for sampling: FenwickTree finds the row a value falls in as a scan of the cumulative
+weights does, through updates, appends and truncations, and the samples of FenwickTree and
+sample_rows are distinct rows that are not excluded.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+
+import numpy as np
+
+from sampling import FenwickTree, sample_rows
+
+
+def scan_find(weights: list[float], value: float) -> int:
+    """Return the row whose weight covers value, by scanning the cumulative weights."""
+    total = 0.0
+    for row, weight in enumerate(weights):
+        total += weight
+        if value < total:
+            return row
+    raise AssertionError('value past the total weight')
+
+
+def assert_matches(tree: FenwickTree, weights: list[float], rng: random.Random) -> None:
+    """Assert that tree holds the given weights, and finds rows as scan_find does."""
+    assert tree.weights == weights
+    assert abs(tree.total() - sum(weights)) < 1e-9
+    assert tree.has_weight() == any(weight > 0 for weight in weights)
+    if not tree.has_weight():
+        return
+    cumulative = np.cumsum(weights).tolist()
+    # Values just inside the ends of each row, and random ones.
+    values = [end - 1e-6 for end, weight in zip(cumulative, weights) if weight > 1e-5]
+    values += [rng.random() * tree.total() for _ in range(50)]
+    for value in values:
+        assert tree.find(value) == scan_find(weights, value)
+
+
+def test_tree_equals_scan() -> None:
+    """Building, updating, appending and truncating keep the tree equal to a scan."""
+    rng = random.Random(0)
+    weights = [rng.choice([0.0, rng.uniform(0.0, 5.0)]) for _ in range(100)]
+    tree = FenwickTree(np.array(weights))
+    assert_matches(tree, weights, rng)
+    for _ in range(200):
+        operation = rng.random()
+        if operation < 0.5 and weights:
+            row = rng.randrange(len(weights))
+            weights[row] = rng.choice([0.0, rng.uniform(0.0, 5.0)])
+            tree.update(row, weights[row])
+        elif operation < 0.85:
+            weights.append(rng.choice([0.0, rng.uniform(0.0, 5.0)]))
+            tree.append(weights[-1])
+        else:
+            n = rng.randrange(len(weights) + 1)
+            del weights[n:]
+            tree.truncate(n)
+        assert_matches(tree, weights, rng)
+
+
+def test_tree_samples_by_weight() -> None:
+    """Rows are sampled about in proportion to their weight, and never without weight."""
+    weights = np.array([0.0, 1.0, 2.0, 0.0, 3.0, 4.0])
+    tree = FenwickTree(weights)
+    rng = random.Random(1)
+    counts = np.bincount([tree.sample(rng) for _ in range(20000)], minlength=len(weights))
+    assert counts[weights == 0.0].sum() == 0
+    assert np.allclose(counts / counts.sum(), weights / weights.sum(), atol=0.02)
+
+
+def test_distinct_samples() -> None:
+    """Distinct samples are distinct rows with weight that are not excluded, and as many as
+    there are such rows when fewer than asked for.
+    """
+    rng = random.Random(2)
+    weights = np.array([rng.choice([0.0, rng.uniform(0.0, 5.0)]) for _ in range(50)])
+    tree = FenwickTree(weights)
+    positive = set(np.flatnonzero(weights > 0).tolist())
+    for k in (1, 5, 20, 100):
+        excluded = set(rng.sample(range(50), 15))
+        chosen = tree.sample_distinct(k, excluded, rng)
+        assert len(chosen) == len(set(chosen)) == min(k, len(positive - excluded))
+        assert set(chosen) <= positive - excluded
+
+    for k in (0, 3, 30, 60):
+        excluded = set(rng.sample(range(50), 10))
+        rows = sample_rows(50, k, excluded, rng)
+        assert len(rows) == len(set(rows)) == min(k, 40)
+        assert not set(rows) & excluded and all(0 <= row < 50 for row in rows)
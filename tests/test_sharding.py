@@ -0,0 +1,81 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for sharding: the restaurants most similar to a restaurant, found by the worker
+processes of a ShardedCatalog, are the ones the exact scan of the whole table finds, for
+both partitions, for queries sent from several threads at once, and after the catalog changes.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from restaurant_table import RestaurantTable
+from sharding import PARTITIONS, ShardedCatalog
+
+
+def make_table(n: int, seed: int = 0) -> RestaurantTable:
+    """Return a table of n random restaurants around Toronto."""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([rng.integers(1, 13, n), rng.integers(1, 5, n), rng.uniform(0.0, 5.0, n)])
+    locations = np.column_stack([rng.uniform(43.58, 43.85, n), rng.uniform(-79.6, -79.2, n)])
+    return RestaurantTable.from_columns([f'restaurant {i}' for i in range(n)], features.astype(np.float64), locations)
+
+
+def make_queries(table: RestaurantTable, count: int, seed: int = 1) -> list[tuple[int, tuple[float, float]]]:
+    """Return count random queries: half by users anywhere around the city, and half by users
+    next to the restaurant they ask about.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(len(table), size=count).tolist()
+    queries = [(row, (float(rng.uniform(43.5, 43.9)), float(rng.uniform(-79.7, -79.1)))) for row in rows[::2]]
+    queries += [(row, (float(table.locations[row, 0]) + 0.001, float(table.locations[row, 1]))) for row in rows[1::2]]
+    return queries
+
+
+def exact(table: RestaurantTable, row: int, ip: tuple[float, float], k: int) -> np.ndarray:
+    """Return the k restaurants most similar to row found by scanning the whole table."""
+    return table.top_k(table.similarity_scores(row, ip), k, exclude=row)
+
+
+@pytest.mark.parametrize('partition', PARTITIONS)
+def test_sharded_results_equal_exact_scan(partition: str) -> None:
+    """Every query gets the results of the exact scan, alone, in a batch or from many threads."""
+    table = make_table(3000)
+    queries = make_queries(table, 100)
+    with ShardedCatalog(table, 3, partition) as catalog:
+        for k in (1, 5, 40):
+            for (row, ip), rows in zip(queries, catalog.most_similar_batch(queries, k)):
+                assert rows.tolist() == exact(table, row, ip, k).tolist()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda query: catalog.most_similar(*query, 5), queries))
+        for (row, ip), rows in zip(queries, results):
+            assert rows.tolist() == exact(table, row, ip, 5).tolist()
+
+
+@pytest.mark.parametrize('partition', PARTITIONS)
+def test_workers_survive_catalog_changes(partition: str) -> None:
+    """Adding, changing and removing restaurants keeps the workers, and their results exact."""
+    table = make_table(3000)
+    with ShardedCatalog(table, 3, partition) as catalog:
+        workers = [worker.pid for worker in catalog._workers]
+        table.append_rows(['new 1', 'new 2'], np.array([[3.0, 2.0, 4.0], [5.0, 1.0, 1.0]]),
+                          np.array([[43.7, -79.4], [43.6, -79.3]]))
+        table.update_row(5, np.array([1.0, 1.0, 1.0]), (43.8, -79.5))
+        table.swap_remove('restaurant 7')
+        catalog.refresh(table)
+        catalog.set_review_rate(9, 0.5)
+        table.set_review_rate('restaurant 9', 0.5)
+
+        assert [worker.pid for worker in catalog._workers] == workers
+        assert sum(catalog.shard_sizes()) == len(table)
+        for row, ip in make_queries(table, 60) + [(len(table) - 1, (43.7, -79.4))]:
+            assert catalog.most_similar(row, ip, 5).tolist() == exact(table, row, ip, 5).tolist()
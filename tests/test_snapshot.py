@@ -0,0 +1,65 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for graph snapshots: a graph saved, loaded, saved again over the snapshot it was loaded
+from (whose columns it still maps) and loaded again keeps its restaurants and edges.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from compact_graph import CompactCategoryGraph
+from recommender_4d_ver import CategoryGraph
+
+
+def make_graph(n: int, seed: int = 0) -> CategoryGraph:
+    """Return a graph of n random restaurants around Toronto, with their 5 nearest neighbours
+    as edges.
+    """
+    rng = random.Random(seed)
+    graph = CategoryGraph()
+    for i in range(n):
+        graph.add_vertex(rng.randint(1, 12), f'{i} Queen Street', f'restaurant {i}', rng.randint(1, 4),
+                         round(rng.uniform(0.0, 5.0), 1), (rng.uniform(43.6, 43.8), rng.uniform(-79.5, -79.3)))
+    graph.build_knn_edges(5)
+    return graph
+
+
+def contents(graph: CategoryGraph) -> dict:
+    """Return the restaurants and edges of graph, as plain lists."""
+    table = graph.get_table()
+    edges = graph._edge_columns()
+    return {'names': list(table.names), 'features': table.base_features().tolist(),
+            'locations': table.locations.tolist(),
+            'addresses': [graph.get_vertex(name).address for name in table.names],
+            'edges': {key: column.tolist() for key, column in edges.items()}}
+
+
+@pytest.mark.parametrize('kind', [CategoryGraph, CompactCategoryGraph])
+def test_save_over_loaded_snapshot(kind: type, tmp_path) -> None:
+    """Saving a loaded graph over its own snapshot, then loading it again, keeps the graph."""
+    graph = make_graph(500)
+    if kind is CompactCategoryGraph:
+        graph = CompactCategoryGraph.from_graph(graph)
+    expected = contents(graph)
+    path = str(tmp_path / 'snapshot')
+    graph.save_snapshot(path, 'hash')
+
+    for _ in range(2):
+        loaded = kind.load_snapshot(path, 'hash')
+        assert loaded is not None
+        assert contents(loaded) == expected
+        loaded.save_snapshot(path, 'hash')
+
+    loaded = kind.load_snapshot(path, 'hash')
+    assert loaded is not None
+    assert contents(loaded) == expected
+    assert np.array_equal(loaded.get_table().features, graph.get_table().features)
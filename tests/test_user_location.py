@@ -0,0 +1,79 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for user_location, run without the network: every web request fails.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+import pytest
+import requests
+
+import user_location
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Make every web request fail, and keep the location cache out of the project directory."""
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError('no network in tests')
+
+    monkeypatch.setattr(requests, 'get', fail)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(user_location.LOCATION_ENV_VAR, raising=False)
+
+
+class StubProvider(user_location.LocationProvider):
+    """A provider that records the IP addresses it was asked about."""
+    needs_ip = False
+
+    def __init__(self) -> None:
+        self.asked = []
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        self.asked.append(ip)
+        return 43.7, -79.4
+
+
+def test_startup_with_stub_provider() -> None:
+    """The location resolved in the background at startup is the stub's."""
+    provider = StubProvider()
+    assert user_location.resolve_location_async(provider).result(timeout=5) == (43.7, -79.4)
+    assert provider.asked == [None]
+
+
+def test_startup_without_network_falls_back() -> None:
+    """Without the network, the default provider cannot locate the user."""
+    assert user_location.resolve_location_async().result(timeout=5) == user_location.DEFAULT_LOCATION
+
+
+def test_location_override(monkeypatch: pytest.MonkeyPatch) -> None:
+    """FOODER_LOCATION sets the location without asking the network."""
+    monkeypatch.setenv(user_location.LOCATION_ENV_VAR, '43.66,-79.39')
+    assert user_location.resolve_location() == (43.66, -79.39)
+
+
+@pytest.mark.parametrize('override', ['abc', '43.66', '43.66,-79.39,1', '91,0', 'nan,0'])
+def test_malformed_override_is_ignored(monkeypatch: pytest.MonkeyPatch, override: str) -> None:
+    """A malformed FOODER_LOCATION is ignored with a warning."""
+    monkeypatch.setenv(user_location.LOCATION_ENV_VAR, override)
+    with pytest.warns(UserWarning, match=user_location.LOCATION_ENV_VAR):
+        assert user_location.resolve_location() == user_location.DEFAULT_LOCATION
+
+
+def test_provider_is_abstract() -> None:
+    """A provider must implement locate."""
+    with pytest.raises(TypeError):
+        user_location.LocationProvider()
+
+
+def test_offline_table_private_ranges() -> None:
+    """The bundled table locates private addresses only."""
+    table = user_location.OfflineIpTable()
+    assert table.locate('192.168.1.20') == user_location.DEFAULT_LOCATION
+    assert table.locate('8.8.8.8') is None
+    assert table.locate(None) is None
@@ -0,0 +1,75 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+Tests for user_store: users saved to a UserStore are the same after it is closed and opened
+again, and a user changed while the cache evicts it is still one object.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from recommender_4d_ver import CategoryGraph, User
+from user_store import UserStore
+
+
+def make_graph() -> CategoryGraph:
+    """Return a graph of 10 restaurants, without edges."""
+    graph = CategoryGraph()
+    for i in range(10):
+        graph.add_vertex(i % 3 + 1, f'{i} King Street', f'restaurant {i}', i % 4 + 1, 3.5, (43.7, -79.4 + i / 100))
+    return graph
+
+
+def state(user: User) -> tuple:
+    """Return the names of the last visited, liked and disliked restaurants of user."""
+    last = user.last_visited_restaurant
+    return (None if last is None else last.name, [v.name for v in user.liked_restaurants],
+            sorted(v.name for v in user.disliked_restaurants))
+
+
+def test_users_persist(tmp_path) -> None:
+    """Users saved before the store is closed are read back with the same history."""
+    graph = make_graph()
+    path = str(tmp_path / 'users.db')
+    store = UserStore(path, graph, batch_size=2)
+    expected = {}
+    for i in range(5):
+        user = User(f'user {i}')
+        for j in range(i + 1):
+            user.like(graph.get_vertex(f'restaurant {(i + j) % 10}'))
+        user.dislike(graph.get_vertex(f'restaurant {(i + 7) % 10}'))
+        store[user.name] = user
+        expected[user.name] = state(user)
+    store.close()
+
+    store = UserStore(path, graph)
+    assert sorted(store) == sorted(expected)
+    for name, user_state in expected.items():
+        assert state(store[name]) == user_state
+    store.close()
+
+
+def test_user_changed_across_eviction(tmp_path) -> None:
+    """A user changed before being saved, while a cache of one user evicts it, is the object
+    returned again, and its changes are kept.
+    """
+    graph = make_graph()
+    path = str(tmp_path / 'users.db')
+    store = UserStore(path, graph, cache_size=1, batch_size=1)
+    for name in ('alice', 'bob'):
+        store[name] = User(name)
+
+    alice = store['alice']
+    alice.dislike(graph.get_vertex('restaurant 2'))
+    alice.like(graph.get_vertex('restaurant 1'))
+    store['bob'].like(graph.get_vertex('restaurant 3'))
+    assert store['alice'] is alice
+    store.save(alice)
+    store.close()
+
+    store = UserStore(path, graph)
+    assert state(store['alice']) == ('restaurant 1', ['restaurant 1'], ['restaurant 2'])
+    store.close()
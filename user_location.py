@@ -0,0 +1,284 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module finds the user's location (latitude, longitude). The location comes from
+a LocationProvider, and the providers can be combined:
+
+    - FixedLocationProvider: an explicit location (also handy as a stub in tests).
+    - IpInfoProvider: the ipinfo.io web service, with a timeout.
+    - OfflineIpTable: a table of IP address ranges, searched with bisect. The bundled table
+      only holds the private and reserved ranges (clients on the same network as the service).
+    - CachedLocationProvider: an on-disk cache of another provider's answers, keyed by IP.
+    - ChainLocationProvider: the first answer from a list of providers.
+
+resolve_location_async resolves the location in a background thread, so that it overlaps
+with loading the restaurant graph.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+import abc
+from bisect import bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+import csv
+import ipaddress
+import json
+import math
+import os
+import time
+import warnings
+
+import requests
+
+# The location used when no provider can locate the user: downtown Toronto, where all the
+# restaurants in our dataset are.
+DEFAULT_LOCATION = (43.6532, -79.3832)
+
+# The environment variable that overrides the user's location, as "latitude,longitude".
+LOCATION_ENV_VAR = 'FOODER_LOCATION'
+
+# The number of seconds to wait for a web service before giving up.
+REQUEST_TIMEOUT = 2.0
+
+OFFLINE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ip_locations.csv')
+CACHE_FILE = '.fooder_location_cache.json'
+
+
+class LocationProvider(abc.ABC):
+    """An abstract source of user locations.
+
+    Instance Attributes:
+        - needs_ip: Whether this provider needs the user's IP address to locate them.
+    """
+    needs_ip: bool = True
+
+    @abc.abstractmethod
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the (latitude, longitude) of the user with the given IP address, or None if
+        this provider cannot locate them.
+        """
+
+
+class FixedLocationProvider(LocationProvider):
+    """A provider that always returns the same location."""
+    needs_ip = False
+    # Private Instance Attributes:
+    #     - _location: The location returned for every user.
+    _location: tuple[float, float]
+
+    def __init__(self, lat: float, lon: float) -> None:
+        """Initialize a provider that always returns (lat, lon)."""
+        self._location = (lat, lon)
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the fixed location."""
+        return self._location
+
+
+class IpInfoProvider(LocationProvider):
+    """A provider that asks the ipinfo.io web service."""
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the location ipinfo.io reports for the given IP address, or None if the
+        request fails or times out.
+        """
+        if ip is None:
+            return None
+        try:
+            response = requests.get(f'https://ipinfo.io/{ip}/json', timeout=REQUEST_TIMEOUT).json()
+            lat, lon = map(float, response['loc'].split(','))
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+        return lat, lon
+
+
+class OfflineIpTable(LocationProvider):
+    """A provider that looks IP addresses up in a local table of address ranges.
+
+    The table is a CSV file with the columns 'start', 'end', 'latitude' and 'longitude', where
+    start and end are the first and last IPv4 addresses of a range. The ranges must not overlap.
+    """
+    # Private Instance Attributes:
+    #     - _starts: The first address of every range, as integers, in increasing order.
+    #     - _ends: _ends[i] is the last address of the range starting at _starts[i].
+    #     - _locations: _locations[i] is the location of the range starting at _starts[i].
+    _starts: list[int]
+    _ends: list[int]
+    _locations: list[tuple[float, float]]
+
+    def __init__(self, table_file: str = OFFLINE_TABLE_FILE) -> None:
+        """Initialize the provider with the ranges in the given CSV file."""
+        ranges = []
+        with open(table_file, 'r') as file:
+            for row in csv.DictReader(file):
+                ranges.append((int(ipaddress.IPv4Address(row['start'])), int(ipaddress.IPv4Address(row['end'])),
+                               (float(row['latitude']), float(row['longitude']))))
+        ranges.sort()
+        self._starts = [r[0] for r in ranges]
+        self._ends = [r[1] for r in ranges]
+        self._locations = [r[2] for r in ranges]
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the location of the range containing the given IP address, or None if no
+        range contains it.
+        """
+        try:
+            address = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        i = bisect_right(self._starts, address) - 1
+        if i >= 0 and address <= self._ends[i]:
+            return self._locations[i]
+        return None
+
+
+class CachedLocationProvider(LocationProvider):
+    """A provider that remembers the answers of another provider in a JSON file, so that the
+    same IP address is only looked up once per ttl seconds.
+    """
+    # Private Instance Attributes:
+    #     - _provider: The provider whose answers are cached.
+    #     - _path: The path of the cache file.
+    #     - _ttl: The number of seconds an answer stays valid.
+    #     - _entries: Maps an IP address to its [latitude, longitude, time looked up].
+    _provider: LocationProvider
+    _path: str
+    _ttl: float
+    _entries: dict[str, list[float]]
+
+    def __init__(self, provider: LocationProvider, path: str = CACHE_FILE, ttl: float = 24 * 60 * 60) -> None:
+        """Initialize a cache of the given provider stored at path."""
+        self._provider = provider
+        self._path = path
+        self._ttl = ttl
+        try:
+            with open(path, 'r') as file:
+                self._entries = json.load(file)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the cached location of the given IP address if it has not expired, and
+        otherwise ask the wrapped provider and cache its answer.
+        """
+        if ip is None:
+            return None
+        entry = self._entries.get(ip)
+        if entry is not None and time.time() - entry[2] < self._ttl:
+            return entry[0], entry[1]
+
+        location = self._provider.locate(ip)
+        if location is not None:
+            self._entries[ip] = [location[0], location[1], time.time()]
+            self._save()
+        return location
+
+    def _save(self) -> None:
+        """Write the cache to its file. The file is replaced in one step, so a concurrent
+        reader never sees a half-written cache.
+        """
+        temp_path = self._path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(self._entries, file)
+            os.replace(temp_path, self._path)
+        except OSError:
+            pass
+
+
+class ChainLocationProvider(LocationProvider):
+    """A provider that asks each of a list of providers in turn, and returns the first answer."""
+    # Private Instance Attributes:
+    #     - _providers: The providers to ask, in order.
+    _providers: list[LocationProvider]
+
+    def __init__(self, providers: list[LocationProvider]) -> None:
+        """Initialize a chain of the given providers."""
+        self._providers = providers
+        self.needs_ip = any(p.needs_ip for p in providers)
+
+    def locate(self, ip: str | None) -> tuple[float, float] | None:
+        """Return the first location found by the providers, or None if none finds one."""
+        for provider in self._providers:
+            location = provider.locate(ip)
+            if location is not None:
+                return location
+        return None
+
+
+def get_public_ip() -> str | None:
+    """Return the public IP address of this machine, or None if it cannot be found."""
+    try:
+        return requests.get('https://api64.ipify.org?format=json', timeout=REQUEST_TIMEOUT).json()['ip']
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+
+def parse_location(text: str) -> tuple[float, float] | None:
+    """Return the location written as "latitude,longitude" in text, or None if text is not a
+    valid location.
+
+    >>> parse_location('43.65, -79.38')
+    (43.65, -79.38)
+    >>> parse_location('43.65') is None
+    True
+    """
+    parts = text.split(',')
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def default_provider() -> LocationProvider:
+    """Return the provider used when none is given.
+
+    The location in the FOODER_LOCATION environment variable wins if it is set; a malformed
+    one is ignored with a warning. Otherwise, the user is located by the (cached) ipinfo.io
+    answer for their public IP address.
+
+    The bundled offline table is not used here: it only holds private and reserved address
+    ranges, and the public IP address is never in them.
+    """
+    override = os.environ.get(LOCATION_ENV_VAR)
+    if override:
+        location = parse_location(override)
+        if location is not None:
+            return FixedLocationProvider(*location)
+        warnings.warn(f'Ignoring {LOCATION_ENV_VAR}={override!r}: expected "latitude,longitude".')
+    return CachedLocationProvider(IpInfoProvider())
+
+
+def resolve_location(provider: LocationProvider | None = None, ip: str | None = None) -> tuple[float, float]:
+    """Return the user's location according to the given provider (or default_provider()).
+
+    If ip is None and the provider needs it, the public IP address of this machine is used.
+    Return DEFAULT_LOCATION if the provider cannot locate the user.
+    """
+    if provider is None:
+        provider = default_provider()
+    if ip is None and provider.needs_ip:
+        ip = get_public_ip()
+    location = provider.locate(ip)
+    return DEFAULT_LOCATION if location is None else location
+
+
+def resolve_location_async(provider: LocationProvider | None = None, ip: str | None = None) \
+        -> Future[tuple[float, float]]:
+    """Start resolving the user's location in a background thread, and return a Future whose
+    result is the location (see resolve_location).
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(resolve_location, provider, ip)
+    executor.shutdown(wait=False)
+    return future
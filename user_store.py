@@ -0,0 +1,274 @@
+"""
+CSC111 Project 2: Restaurant Recommender - FOODER
+
+Module Description
+==================
+This Python module contains UserStore, which keeps FOODER's users in a local SQLite database
+so that they survive between rounds and between runs.
+
+    - Users are looked up by name through the database's index on the name column, so
+      starting up never loads every user.
+    - A user's disliked restaurants and history of liked restaurants are only read from the
+      database when first used.
+    - Recently used users stay in an in-memory LRU cache. A user still in use elsewhere is
+      found again even after the cache evicts it, so each name has a single User object.
+    - Changes are written in batches, in one transaction each.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) Kathleen Wang, Jiner Zhang, Kimberly Fu, and Yanting Fan.
+"""
+from __future__ import annotations
+from collections import deque
+import sqlite3
+import threading
+from typing import Iterator
+import weakref
+
+from caching import LRUCache
+from recommender_4d_ver import USER_HISTORY_SIZE, CategoryGraph, User, _CategoryVertex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    last_visited TEXT
+);
+CREATE TABLE IF NOT EXISTS disliked (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    restaurant TEXT NOT NULL,
+    PRIMARY KEY (user_id, restaurant)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS liked (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    position INTEGER NOT NULL,
+    restaurant TEXT NOT NULL,
+    PRIMARY KEY (user_id, position)
+) WITHOUT ROWID;
+"""
+
+
+class _StoredUser(User):
+    """A user loaded from a UserStore, whose disliked and liked restaurants are read from the
+    store the first time they are used.
+    """
+    # Private Instance Attributes:
+    #     - _store: The store this user was loaded from.
+    #     - _disliked: The user's disliked restaurants, or None if they have not been read yet.
+    #     - _liked: The user's history of liked restaurants, or None if it has not been read yet.
+    _store: UserStore
+    _disliked: set[_CategoryVertex] | None
+    _liked: deque[_CategoryVertex] | None
+
+    def __init__(self, name: str, store: UserStore, last_visited: _CategoryVertex | None) -> None:
+        """Initialize a user loaded from the given store."""
+        User.__init__(self, name)
+        self._store = store
+        self._disliked = None
+        self._liked = None
+        self.last_visited_restaurant = last_visited
+
+    @property
+    def disliked_restaurants(self) -> set[_CategoryVertex]:
+        """The restaurants this user did not like."""
+        if self._disliked is None:
+            self._disliked = self._store.load_disliked(self.name)
+        return self._disliked
+
+    @disliked_restaurants.setter
+    def disliked_restaurants(self, value: set[_CategoryVertex]) -> None:
+        """Replace the restaurants this user did not like."""
+        self._disliked = value
+
+    def disliked_loaded(self) -> bool:
+        """Return whether this user's disliked restaurants have been read from the store."""
+        return self._disliked is not None
+
+    @property
+    def liked_restaurants(self) -> deque[_CategoryVertex]:
+        """The restaurants this user liked, from the least to the most recent."""
+        if self._liked is None:
+            self._liked = self._store.load_liked(self.name)
+        return self._liked
+
+    @liked_restaurants.setter
+    def liked_restaurants(self, value: deque[_CategoryVertex]) -> None:
+        """Replace the restaurants this user liked."""
+        self._liked = value
+
+    def liked_loaded(self) -> bool:
+        """Return whether this user's history of liked restaurants has been read from the store."""
+        return self._liked is not None
+
+
+class UserStore:
+    """A SQLite database of users, with an LRU cache of recently used users in front of it.
+
+    A UserStore can be used like the dictionary AllUsers.list_of_users: `name in store`,
+    `store[name]` and `store[name] = user` all work. Changes made to a user are only written
+    once the user is passed to save (or stored with store[name] = user).
+
+    Instance Attributes:
+        - graph: The graph used to turn stored restaurant names back into vertices.
+        - batch_size: The number of saved users that triggers a write to the database.
+    """
+    graph: CategoryGraph
+    batch_size: int
+    # Private Instance Attributes:
+    #     - _connection: The connection to the database.
+    #     - _cache: The most recently used users, by name.
+    #     - _dirty: The users saved since the last write to the database, by name.
+    #     - _live: Every user returned or saved that is still referenced anywhere, by name, so
+    #       that a user changed by a caller after the cache evicted it is not loaded again as
+    #       a second object.
+    #     - _lock: A lock held while using the connection, so the store can be shared by threads.
+    _connection: sqlite3.Connection
+    _cache: LRUCache
+    _dirty: dict[str, User]
+    _live: weakref.WeakValueDictionary[str, User]
+    _lock: threading.RLock
+
+    def __init__(self, path: str, graph: CategoryGraph, cache_size: int = 1024, batch_size: int = 64) -> None:
+        """Initialize a store backed by the SQLite database at path, creating it if needed.
+
+        Preconditions:
+            - cache_size >= 1
+            - batch_size >= 1
+        """
+        self.graph = graph
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        self._cache = LRUCache(cache_size, 'users')
+        self._dirty = {}
+        self._live = weakref.WeakValueDictionary()
+        self._lock = threading.RLock()
+
+    def _vertex(self, name: str | None) -> _CategoryVertex | None:
+        """Return the vertex of the restaurant with the given name, or None if there is no
+        such restaurant in the graph (any more).
+        """
+        if name is None or not self.graph.has_vertex(name):
+            return None
+        return self.graph.get_vertex(name)
+
+    def get(self, name: str) -> User | None:
+        """Return the user with the given name, or None if there is no such user."""
+        with self._lock:
+            user = self._cache.get(name)
+            if user is None:
+                user = self._dirty.get(name)
+            if user is None:
+                user = self._live.get(name)
+            if user is None:
+                row = self._connection.execute('SELECT last_visited FROM users WHERE name = ?',
+                                               (name,)).fetchone()
+                if row is None:
+                    return None
+                user = _StoredUser(name, self, self._vertex(row[0]))
+                self._live[name] = user
+            self._cache.put(name, user)
+            return user
+
+    def load_disliked(self, name: str) -> set[_CategoryVertex]:
+        """Return the disliked restaurants of the user with the given name, read from the database."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT restaurant FROM disliked JOIN users ON users.id = disliked.user_id WHERE users.name = ?',
+                (name,)).fetchall()
+        vertices = (self._vertex(row[0]) for row in rows)
+        return {v for v in vertices if v is not None}
+
+    def load_liked(self, name: str) -> deque[_CategoryVertex]:
+        """Return the history of liked restaurants of the user with the given name, read from
+        the database, leaving out the restaurants no longer in the graph.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT restaurant FROM liked JOIN users ON users.id = liked.user_id WHERE users.name = ? '
+                'ORDER BY position', (name,)).fetchall()
+        vertices = (self._vertex(row[0]) for row in rows)
+        return deque((v for v in vertices if v is not None), maxlen=USER_HISTORY_SIZE)
+
+    def save(self, user: User) -> None:
+        """Queue the given user to be written to the database, and write every queued user if
+        there are batch_size of them.
+        """
+        with self._lock:
+            self._dirty[user.name] = user
+            self._live[user.name] = user
+            self._cache.put(user.name, user)
+            if len(self._dirty) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write every queued user to the database, in one transaction."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with self._connection:
+                for user in self._dirty.values():
+                    last = user.last_visited_restaurant
+                    self._connection.execute(
+                        'INSERT INTO users (name, last_visited) VALUES (?, ?) '
+                        'ON CONFLICT (name) DO UPDATE SET last_visited = excluded.last_visited',
+                        (user.name, None if last is None else last.name))
+                    # Dislikes and likes that were never read have not changed.
+                    write_disliked = not isinstance(user, _StoredUser) or user.disliked_loaded()
+                    write_liked = not isinstance(user, _StoredUser) or user.liked_loaded()
+                    if not write_disliked and not write_liked:
+                        continue
+                    user_id = self._connection.execute('SELECT id FROM users WHERE name = ?',
+                                                       (user.name,)).fetchone()[0]
+                    if write_disliked:
+                        self._connection.execute('DELETE FROM disliked WHERE user_id = ?', (user_id,))
+                        self._connection.executemany(
+                            'INSERT INTO disliked (user_id, restaurant) VALUES (?, ?)',
+                            [(user_id, r.name) for r in user.disliked_restaurants])
+                    if write_liked:
+                        self._connection.execute('DELETE FROM liked WHERE user_id = ?', (user_id,))
+                        self._connection.executemany(
+                            'INSERT INTO liked (user_id, position, restaurant) VALUES (?, ?, ?)',
+                            [(user_id, i, r.name) for i, r in enumerate(user.liked_restaurants)])
+            self._dirty.clear()
+
+    def close(self) -> None:
+        """Write every queued user and close the database."""
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def __contains__(self, name: str) -> bool:
+        """Return whether there is a user with the given name."""
+        return self.get(name) is not None
+
+    def __getitem__(self, name: str) -> User:
+        """Return the user with the given name. Raise a KeyError if there is no such user."""
+        user = self.get(name)
+        if user is None:
+            raise KeyError(name)
+        return user
+
+    def __setitem__(self, name: str, user: User) -> None:
+        """Save the given user.
+
+        Preconditions:
+            - name == user.name
+        """
+        self.save(user)
+
+    def __len__(self) -> int:
+        """Return the number of users, including the ones not yet written."""
+        with self._lock:
+            self.flush()
+            return self._connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        """Return an iterator over the names of all users."""
+        with self._lock:
+            self.flush()
+            names = [row[0] for row in self._connection.execute('SELECT name FROM users')]
+        return iter(names)